@@ -1,15 +1,38 @@
-from fastapi import FastAPI, Query
-import psycopg2
+import asyncio
+import base64
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
+import psycopg
+from psycopg_pool import AsyncConnectionPool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("[WARNING] Chưa cài orjson (pip install orjson), API mã hóa JSON bằng module json")
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+from columnar import COLUMNAR_FORMATS, build_series, encode_columnar, negotiate_format
+from data_versions import DataVersions, http_date, is_not_modified
+from history import HISTORY_METHODS, HISTORY_METRICS, LTTB_OVERSAMPLE, bucket_query, downsample_series, plan_buckets
+from latest_cache import LatestReadingsCache
+
 # Define the Location model to match your mobile app's needs
+# (chỉ dùng cho tài liệu OpenAPI, response không được validate lại theo model)
 class Location(BaseModel):
     id: str
     name: str
 
-app = FastAPI()
-
 # Cấu hình kết nối đến PostgreSQL
 DB_USER = "user"
 DB_PASSWORD = "pass"
@@ -17,263 +40,483 @@ DB_HOST = "192.168.1.100"
 DB_PORT = "5432"
 DB_NAME = "air_quality"
 
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
+# Cấu hình connection pool dùng chung cho toàn bộ process
+DB_POOL_MIN_SIZE = 2
+DB_POOL_MAX_SIZE = 10
 
-@app.get("/latest_air_quality_data")
-def get_latest_air_quality_data(location: Optional[str] = Query(None, description="Filter by location")):
-    """Lấy dòng dữ liệu gần nhất từ air_quality_data với temperature làm tròn 2 chữ số thập phân"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = """
-        SELECT timestamp, location, ROUND(temperature::numeric, 2) AS temperature, 
-               humidity, pm25, pm10, no2, so2, co, air_quality  
+DB_CONNINFO = f"dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD} host={DB_HOST} port={DB_PORT}"
+
+db_pool = AsyncConnectionPool(
+    conninfo=DB_CONNINFO,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    open=False,
+)
+
+# Cấu hình cache dữ liệu mới nhất theo location
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SECONDS = 300  # Giới hạn an toàn nếu bỏ lỡ thông báo từ subscriber
+
+# Kênh NOTIFY do mqtt_subscriber_v3.py gửi khi có dữ liệu cảm biến / dự báo mới (payload là location)
+NOTIFY_CHANNEL_INGEST = "air_quality_ingest"
+NOTIFY_CHANNEL_FORECAST = "air_quality_forecast"
+NOTIFY_RECONNECT_DELAY = 5
+
+latest_cache = LatestReadingsCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+
+# Phiên bản dữ liệu theo location cho ETag / Last-Modified (conditional GET trả về 304 không cần truy vấn DB)
+ETAG_MAX_AGE_SECONDS = 3600  # ETag đổi ít nhất một lần mỗi khoảng này, phòng dữ liệu đổi mà không có NOTIFY
+NOTIFY_VERSION_KINDS = {NOTIFY_CHANNEL_INGEST: "ingest", NOTIFY_CHANNEL_FORECAST: "forecast"}
+
+data_versions = DataVersions(max_age_seconds=ETAG_MAX_AGE_SECONDS)
+
+# Cấu hình phân trang / streaming của /all_air_quality_predict_data
+PREDICT_PAGE_DEFAULT_SIZE = 1000
+PREDICT_PAGE_MAX_SIZE = 10000
+STREAM_FETCH_SIZE = 2000  # Số dòng mỗi lần đọc từ server-side cursor
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+# Nén response (brotli nếu đã cài brotli-asgi, nếu không thì gzip) khi lớn hơn ngưỡng
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 4
+GZIP_COMPRESS_LEVEL = 6
+
+# Cấu hình /history
+HISTORY_DEFAULT_POINTS = 500
+HISTORY_MAX_POINTS = 2000
+HISTORY_DEFAULT_RANGE = timedelta(days=7)  # Khi không có start
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mở pool khi khởi động và đóng khi tắt ứng dụng
+    await db_pool.open()
+    listener = asyncio.create_task(listen_for_updates())
+    yield
+    listener.cancel()
+    await db_pool.close()
+
+def json_default(value):
+    """datetime/date -> isoformat như jsonable_encoder của FastAPI (chỉ dùng khi không có orjson)"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Không mã hóa được kiểu {type(value).__name__} sang JSON")
+
+def dump_json(content):
+    """
+    Bytes JSON giống JSONResponse của FastAPI sau jsonable_encoder: không khoảng trắng, giữ Unicode,
+    datetime -> isoformat, tuple -> mảng. Dùng orjson nếu có.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=json_default).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    Response JSON mã hóa thẳng các dòng từ DB bằng dump_json. Endpoint trả về trực tiếp
+    FastJSONResponse để bỏ qua jsonable_encoder và validate response_model.
+    """
+    def render(self, content):
+        return dump_json(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+if BrotliMiddleware is not None:
+    # Client không hỗ trợ br vẫn nhận gzip
+    app.add_middleware(BrotliMiddleware, quality=BROTLI_QUALITY, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+
+def conditional_get(request, kinds, location=None):
+    """
+    ETag / Last-Modified của dữ liệu loại kinds ("ingest", "forecast") mà endpoint đọc.
+
+    Phải gọi trước khi đọc dữ liệu: nếu dữ liệu đổi giữa chừng, client nhận dữ liệu mới với ETag
+    cũ và sẽ tải lại ở lần sau, thay vì giữ dữ liệu cũ với ETag mới.
+
+    Returns:
+        (headers, response): header validator cho response; response là 304 khi If-None-Match /
+        If-Modified-Since của request còn khớp, ngược lại None.
+    """
+    fmt = negotiate_format(request.headers.get("accept"))
+    etag, last_modified = data_versions.validators(kinds, location or None, variant=fmt)
+    headers = {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": "no-cache", "Vary": "Accept"}
+    if is_not_modified(request.headers, etag, last_modified):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+def negotiated_response(request, content, series, meta=None, headers=None):
+    """
+    JSON như trước, hoặc payload dạng cột (columnar.py) khi header Accept chọn msgpack / arrow.
+
+    Parameters:
+        content: Nội dung JSON của endpoint.
+        series: Hàm trả về danh sách Series, chỉ được gọi khi client chọn định dạng dạng cột.
+        meta: Các trường vô hướng đi kèm payload dạng cột.
+    """
+    headers = {"Vary": "Accept", **(headers or {})}
+    fmt = negotiate_format(request.headers.get("accept"))
+    if fmt == "json":
+        return FastJSONResponse(content, headers=headers)
+    return Response(encode_columnar(series(), fmt, meta), media_type=COLUMNAR_FORMATS[fmt], headers=headers)
+
+async def fetch_all(query, params=None):
+    """Chạy truy vấn trên một kết nối mượn từ pool và trả về tất cả các dòng"""
+    async with db_pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+async def fetch_one(query, params=None):
+    """Chạy truy vấn trên một kết nối mượn từ pool và trả về dòng đầu tiên"""
+    async with db_pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchone()
+
+def rounded(column):
+    """
+    Làm tròn 2 chữ số thập phân như trước (ROUND numeric, làm tròn nửa lên theo giá trị thập phân)
+    nhưng trả về float8: psycopg đọc thành float thay vì Decimal, cùng giá trị khi mã hóa JSON.
+    """
+    return f"ROUND({column}::numeric, 2)::float8"
+
+# Các truy vấn nạp cache; mỗi loại dữ liệu được lưu theo khóa (kind, location)
+READING_METRICS = ["humidity", "pm25", "pm10", "no2", "so2", "co"]
+READING_METRIC_INDEX = {name: 10 + i for i, name in enumerate(READING_METRICS)}
+
+async def load_latest_readings(location):
+    """12 dòng gần nhất của air_quality_data: 10 cột của /latest_air_quality_data + các thông số làm tròn"""
+    metrics = ", ".join(rounded(name) for name in READING_METRICS)
+    query = f"""
+        SELECT timestamp, location, {rounded("temperature")} AS temperature, 
+               humidity, pm25, pm10, no2, so2, co, air_quality, {metrics}
         FROM air_quality_data 
     """
-    
-    # Thêm điều kiện location nếu được cung cấp
     params = []
     if location:
         query += " WHERE location = %s"
         params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 1"
-    
-    cursor.execute(query, params)
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
-    # Trả về mảng giá trị
-    return [list(row)] if row else []
+    query += " ORDER BY timestamp DESC LIMIT 12"
+    return await fetch_all(query, params)
 
-@app.get("/all_air_quality_predict_data")
-def get_all_air_quality_predict_data(location: Optional[str] = Query(None, description="Filter by location")):
-    """Lấy tất cả dữ liệu timestamp, location, temperature từ air_quality_predict_data với temperature làm tròn 2 chữ số thập phân"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(temperature::numeric, 2) FROM air_quality_predict_data"
-    
+async def load_latest_predict(location):
+    query = f"SELECT timestamp, location, {rounded('temperature')} FROM air_quality_predict"
     params = []
     if location:
         query += " WHERE location = %s"
         params.append(location)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    # Trả về mảng các giá trị
-    return [list(row) for row in rows]
+    query += " ORDER BY timestamp DESC LIMIT 12"
+    return [list(row) for row in await fetch_all(query, params)]
 
-@app.get("/latest_12_air_quality_predict")
-def get_latest_12_air_quality_predict(location: Optional[str] = Query(None, description="Filter by location")):
-    """Lấy 12 dòng gần nhất từ air_quality_predict với temperature làm tròn 2 chữ số thập phân"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(temperature::numeric, 2) FROM air_quality_predict"
-    
+async def load_forecast(location):
+    query = f"SELECT timestamp, location, {rounded('temperature')} FROM air_quality_predict_data"
     params = []
     if location:
         query += " WHERE location = %s"
         params.append(location)
+    return [list(row) for row in await fetch_all(query, params)]
+
+async def load_locations(location=None):
+    return [row[0] for row in await fetch_all("SELECT DISTINCT location FROM air_quality_data ORDER BY location;")]
+
+CACHE_LOADERS = {
+    "readings": load_latest_readings,
+    "predict": load_latest_predict,
+    "forecast": load_forecast,
+    "locations": load_locations,
+}
+INGEST_CACHE_KINDS = ("readings", "predict", "locations")
+FORECAST_CACHE_KINDS = ("forecast",)
+
+async def cached(kind, location=None):
+    """Đọc từ cache; khi miss thì truy vấn DB và lưu lại"""
+    location = location or None
+    return await latest_cache.get_or_load((kind, location), lambda: CACHE_LOADERS[kind](location))
+
+_refresh_tasks = set()
+
+async def listen_for_updates():
+    """Nhận NOTIFY từ subscriber, xóa các mục cache liên quan và nạp lại chúng ở nền"""
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DB_CONNINFO, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {NOTIFY_CHANNEL_INGEST}")
+                await conn.execute(f"LISTEN {NOTIFY_CHANNEL_FORECAST}")
+                # Có thể đã bỏ lỡ thông báo trong lúc chưa kết nối
+                latest_cache.clear()
+                data_versions.reset()
+                async for notify in conn.notifies():
+                    data_versions.bump(NOTIFY_VERSION_KINDS[notify.channel], notify.payload)
+                    kinds = INGEST_CACHE_KINDS if notify.channel == NOTIFY_CHANNEL_INGEST else FORECAST_CACHE_KINDS
+                    for kind, location in latest_cache.invalidate(notify.payload, kinds):
+                        task = asyncio.create_task(cached(kind, location))
+                        _refresh_tasks.add(task)
+                        task.add_done_callback(_refresh_tasks.discard)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Mất kết nối LISTEN/NOTIFY: {e}")
+            latest_cache.clear()
+            data_versions.reset()
+            await asyncio.sleep(NOTIFY_RECONNECT_DELAY)
+
+@app.get("/latest_air_quality_data")
+async def get_latest_air_quality_data(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
+    """Lấy dòng dữ liệu gần nhất từ air_quality_data với temperature làm tròn 2 chữ số thập phân"""
+    headers, not_modified = conditional_get(request, ("ingest",), location)
+    if not_modified:
+        return not_modified
+    rows = await cached("readings", location)
     
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    # Trả về mảng các giá trị
-    return [list(row) for row in rows]
+    # Trả về mảng giá trị
+    return FastJSONResponse([rows[0][:10]] if rows else [], headers=headers)
+
+def encode_cursor(location, timestamp):
+    raw = json.dumps([location, timestamp.isoformat()], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        location, timestamp = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return location, datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"cursor không hợp lệ: {e}")
+
+def predict_data_query(location, after=None, limit=None):
+    """Truy vấn air_quality_predict_data theo thứ tự (location, timestamp), dùng được index unique của bảng"""
+    query = f"SELECT timestamp, location, {rounded('temperature')} FROM air_quality_predict_data"
+    conditions, params = [], []
+    if location:
+        conditions.append("location = %s")
+        params.append(location)
+    if after:
+        conditions.append("(location, timestamp) > (%s, %s)")
+        params.extend(after)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY location, timestamp"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+async def stream_rows(query, params, fmt):
+    """
+    Đọc kết quả bằng server-side cursor theo từng STREAM_FETCH_SIZE dòng và trả về dần
+    dưới dạng NDJSON (mỗi dòng một mảng) hoặc một mảng JSON; bộ nhớ không phụ thuộc số dòng.
+    """
+    async with db_pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor(name="stream_rows") as cursor:
+                await cursor.execute(query, params)
+                if fmt == "json":
+                    yield b"["
+                first = True
+                while True:
+                    rows = await cursor.fetchmany(STREAM_FETCH_SIZE)
+                    if not rows:
+                        break
+                    if fmt == "ndjson":
+                        yield b"".join(dump_json(row) + b"\n" for row in rows)
+                    else:
+                        yield (b"" if first else b",") + dump_json(rows)[1:-1]
+                    first = False
+                if fmt == "json":
+                    yield b"]"
+
+@app.get("/all_air_quality_predict_data")
+async def get_all_air_quality_predict_data(
+    request: Request,
+    location: Optional[str] = Query(None, description="Filter by location"),
+    limit: Optional[int] = Query(None, ge=1, le=PREDICT_PAGE_MAX_SIZE, description="Số dòng mỗi trang (phân trang keyset)"),
+    cursor: Optional[str] = Query(None, description="Giá trị header X-Next-Cursor của trang trước"),
+    stream: Optional[str] = Query(None, description="ndjson hoặc json: trả về dần bằng server-side cursor"),
+):
+    """
+    Lấy dữ liệu timestamp, location, temperature từ air_quality_predict_data với temperature làm tròn 2 chữ số thập phân.
+
+    - limit/cursor: một trang theo thứ tự (location, timestamp); header X-Next-Cursor có khi còn trang sau.
+    - stream: toàn bộ kết quả, đọc và gửi dần từng phần.
+    - Không có tham số: như trước; khi không lọc location, toàn bộ bảng được stream dưới dạng mảng JSON
+      (cùng nội dung) thay vì nạp hết vào bộ nhớ.
+    - Accept msgpack / arrow: payload dạng cột cho trang hoặc location; khi stream toàn bộ bảng vẫn trả JSON.
+    """
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"stream không hợp lệ: {stream}; chọn trong {list(STREAM_FORMATS)}")
+
+    headers, not_modified = conditional_get(request, ("forecast",), location)
+    if not_modified:
+        return not_modified
+
+    if limit is not None or cursor is not None:
+        limit = limit or PREDICT_PAGE_DEFAULT_SIZE
+        after = decode_cursor(cursor) if cursor else None
+        rows = await fetch_all(*predict_data_query(location, after, limit))
+        if len(rows) == limit:
+            last_timestamp, last_location, _ = rows[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last_location, last_timestamp)
+        return negotiated_response(request, rows, lambda: build_series(rows), headers=headers)
+
+    if stream is None and location:
+        rows = await cached("forecast", location)
+        return negotiated_response(request, rows, lambda: build_series(rows), headers=headers)
+
+    fmt = stream or "json"
+    return StreamingResponse(stream_rows(*predict_data_query(location), fmt), media_type=STREAM_FORMATS[fmt],
+                             headers=headers)
+
+@app.get("/latest_12_air_quality_predict")
+async def get_latest_12_air_quality_predict(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
+    """Lấy 12 dòng gần nhất từ air_quality_predict với temperature làm tròn 2 chữ số thập phân"""
+    # air_quality_predict được ghi cùng lúc với dữ liệu cảm biến
+    headers, not_modified = conditional_get(request, ("ingest",), location)
+    if not_modified:
+        return not_modified
+    rows = await cached("predict", location)
+    return negotiated_response(request, rows, lambda: build_series(rows), headers=headers)
+
+async def latest_12_metric(request, name, location):
+    """12 điểm dữ liệu cuối cùng của một thông số dưới dạng [timestamp, location, value]"""
+    index = READING_METRIC_INDEX[name]
+    headers, not_modified = conditional_get(request, ("ingest",), location)
+    if not_modified:
+        return not_modified
+    rows = await cached("readings", location)
+    return negotiated_response(request, [[row[0], row[1], row[index]] for row in rows],
+                               lambda: build_series(rows, name, value_index=index), headers=headers)
 
 # Cập nhật tất cả các API để thêm location
 @app.get("/latest_12_humidity")
-def get_latest_12_humidity(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_humidity(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của humidity"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(humidity::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "humidity", location)
 
 @app.get("/latest_12_pm25")
-def get_latest_12_pm25(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_pm25(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của PM2.5"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(pm25::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "pm25", location)
 
 @app.get("/latest_12_pm10")
-def get_latest_12_pm10(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_pm10(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của PM10"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(pm10::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "pm10", location)
 
 @app.get("/latest_12_no2")
-def get_latest_12_no2(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_no2(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của NO2"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(no2::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "no2", location)
 
 @app.get("/latest_12_so2")
-def get_latest_12_so2(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_so2(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của SO2"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(so2::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "so2", location)
 
 @app.get("/latest_12_co")
-def get_latest_12_co(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_co(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của CO"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT timestamp, location, ROUND(co::numeric, 2) FROM air_quality_data"
-    
-    params = []
-    if location:
-        query += " WHERE location = %s"
-        params.append(location)
-    
-    query += " ORDER BY timestamp DESC LIMIT 12"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [list(row) for row in rows]
+    return await latest_12_metric(request, "co", location)
 
 # API để lấy tất cả dữ liệu thông số trong một lần gọi
 @app.get("/latest_12_all_parameters")
-def get_latest_12_all_parameters(location: Optional[str] = Query(None, description="Filter by location")):
+async def get_latest_12_all_parameters(request: Request, location: Optional[str] = Query(None, description="Filter by location")):
     """Lấy 12 điểm dữ liệu cuối cùng của tất cả các thông số"""
-    # Truyền location parameter vào các hàm gọi 
+    # Cùng một tập 12 dòng gần nhất (một truy vấn khi cache miss) được tách ra từng thông số,
+    # theo đúng thứ tự của ParametersResponse
+    headers, not_modified = conditional_get(request, ("ingest",), location)
+    if not_modified:
+        return not_modified
+    rows = await cached("readings", location)
+    
     result = {
-        "humidity": get_latest_12_humidity(location),
-        "pm25": get_latest_12_pm25(location),
-        "pm10": get_latest_12_pm10(location), 
-        "no2": get_latest_12_no2(location),
-        "so2": get_latest_12_so2(location),
-        "co": get_latest_12_co(location)
+        name: [[row[0], row[1], row[READING_METRIC_INDEX[name]]] for row in rows]
+        for name in READING_METRICS
     }
     
-    return result
+    return negotiated_response(request, result, lambda: [
+        series for name in READING_METRICS
+        for series in build_series(rows, name, value_index=READING_METRIC_INDEX[name])
+    ], headers=headers)
+
+# Lịch sử theo khoảng thời gian cho biểu đồ, rút gọn về tối đa `points` điểm mỗi thông số
+@app.get("/history")
+async def get_history(
+    request: Request,
+    location: str = Query(..., description="Location cần lấy dữ liệu"),
+    metrics: List[str] = Query(["temperature"], description="Thông số, lặp lại hoặc phân tách bằng dấu phẩy"),
+    start: Optional[datetime] = Query(None, description="Mặc định: end - 7 ngày"),
+    end: Optional[datetime] = Query(None, description="Mặc định: thời điểm dữ liệu mới nhất của location"),
+    points: int = Query(HISTORY_DEFAULT_POINTS, ge=2, le=HISTORY_MAX_POINTS, description="Số điểm tối đa mỗi thông số"),
+    method: str = Query("bucket", description="bucket (trung bình theo ô) hoặc lttb"),
+):
+    """Dữ liệu air_quality_data của một location trong [start, end], rút gọn trong DB theo ô thời gian"""
+    metrics = list(dict.fromkeys(m.strip() for item in metrics for m in item.split(",") if m.strip()))
+    unknown = [m for m in metrics if m not in HISTORY_METRICS]
+    if not metrics or unknown:
+        raise HTTPException(status_code=400, detail=f"metrics không hợp lệ: {unknown or metrics}; chọn trong {list(HISTORY_METRICS)}")
+    if method not in HISTORY_METHODS:
+        raise HTTPException(status_code=400, detail=f"method không hợp lệ: {method}; chọn trong {list(HISTORY_METHODS)}")
+
+    if end is None:
+        row = await fetch_one("SELECT max(timestamp) FROM air_quality_data WHERE location = %s", [location])
+        end = row[0] if row and row[0] is not None else datetime.utcnow()
+    if start is None:
+        start = end - HISTORY_DEFAULT_RANGE
+    # Cột timestamp không có múi giờ: timestamp có múi giờ được đổi về UTC
+    start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t for t in (start, end))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start phải nhỏ hơn end")
+
+    n_buckets = points * LTTB_OVERSAMPLE if method == "lttb" else points
+    source, bucket_seconds = plan_buckets(start, end, n_buckets)
+    rows = await fetch_all(bucket_query(metrics, source), {
+        "location": location, "start": start, "end": end, "width": bucket_seconds,
+    })
+
+    timestamps = [row[0] for row in rows]
+    series = {
+        name: downsample_series(timestamps, [row[i + 1] for row in rows], points, method)
+        for i, name in enumerate(metrics)
+    }
+    content = {
+        "location": location,
+        "start": start,
+        "end": end,
+        "method": method,
+        "bucket_seconds": bucket_seconds,
+        "source": source or "air_quality_data",
+        "series": series,
+    }
+    # Payload dạng cột: các trường trên (thời gian dạng chuỗi ISO) + một series cho mỗi thông số
+    meta = {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in content.items() if key != "series"}
+    return negotiated_response(request, content, lambda: [
+        item for name, data in series.items()
+        for item in build_series([(ts, location, value) for ts, value in data], name)
+    ], meta=meta)
+
+# Thống kê cache (hit/miss, số mục, số lần invalidate)
+@app.get("/cache_stats")
+async def get_cache_stats():
+    return latest_cache.stats()
 
 # Thêm API mới để lấy danh sách các location có trong hệ thống
 @app.get("/locations")
-def get_locations():
+async def get_locations(request: Request):
     """Lấy danh sách tất cả các location có trong hệ thống"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT location FROM air_quality_data ORDER BY location;")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
+    headers, not_modified = conditional_get(request, ("ingest",))
+    if not_modified:
+        return not_modified
     # Trả về danh sách các location
-    return [row[0] for row in rows]
+    return FastJSONResponse(await cached("locations"), headers=headers)
     
     
 # Add the new endpoint to match your mobile app's API request
 @app.get("/available_locations", response_model=List[Location])
-def get_available_locations():
+async def get_available_locations(request: Request):
     """Lấy danh sách tất cả các location có trong hệ thống dưới dạng objects"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT location FROM air_quality_data ORDER BY location;")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    # Convert to Location objects with id and name
-    locations = []
-    for row in rows:
-        location_name = row[0]
-        # Using the location name as both id and name, but you can modify this if needed
-        locations.append(Location(id=location_name, name=location_name))
-    
-    return locations
+    headers, not_modified = conditional_get(request, ("ingest",))
+    if not_modified:
+        return not_modified
+    # Dict cùng dạng Location (id, name) thay vì tạo và validate model cho từng dòng
+    # Using the location name as both id and name, but you can modify this if needed
+    return FastJSONResponse([{"id": name, "name": name} for name in await cached("locations")], headers=headers)
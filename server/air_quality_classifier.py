@@ -0,0 +1,48 @@
+import numpy as np
+
+from inference_backends import as_backend
+from scaler_utils import scaler_affine
+
+# Thứ tự đặc trưng đầu vào của modelDNN.keras / scalerDNN.pkl
+FEATURE_NAMES = ("temperature", "humidity", "pm25", "pm10", "no2", "so2", "co")
+
+
+class AirQualityClassifier:
+    """
+    Phân loại chất lượng không khí bằng mô hình DNN cho cả một batch.
+
+    Chuẩn hóa bằng phép tính affine vector hóa (không gọi scaler.transform) và
+    gọi mô hình qua một backend suy luận (Keras qua tf.function, TFLite hoặc ONNX);
+    không bao giờ clear_session.
+    """
+
+    def __init__(self, model, scaler):
+        """
+        Parameters:
+            model: Mô hình Keras hoặc một InferenceBackend (inference_backends.py).
+            scaler: Scaler của modelDNN.
+        """
+        self.backend = as_backend(model)
+        scale, offset = scaler_affine(scaler)
+        self.scale = scale.astype(np.float32)
+        self.offset = offset.astype(np.float32)
+
+    @staticmethod
+    def features_from_payloads(payloads):
+        """Chuyển danh sách payload (dict) thành ma trận (N, 7) float32"""
+        return np.array([[payload[name] for name in FEATURE_NAMES] for payload in payloads], dtype=np.float32)
+
+    def classify(self, features):
+        """
+        Parameters:
+            features: Mảng (N, 7) giá trị cảm biến chưa chuẩn hóa.
+
+        Returns:
+            Mảng int (N,) nhãn chất lượng không khí.
+        """
+        features_scaled = np.asarray(features, dtype=np.float32) * self.scale + self.offset
+        probabilities = self.backend(features_scaled)
+        return np.argmax(probabilities, axis=1)
+
+    def classify_payloads(self, payloads):
+        return [int(label) for label in self.classify(self.features_from_payloads(payloads))]
@@ -0,0 +1,1246 @@
+"""
+Benchmark hiệu năng cho các thành phần của server.
+
+Chạy từ thư mục server:
+    python benchmark.py lstm --runs 3 --legacy-runs 1
+    python benchmark.py dnn --batch-sizes 1 32 256
+    python benchmark.py api --base-url http://127.0.0.1:8000 --location default
+    python benchmark.py api-serialisation --runs 2000
+    python benchmark.py api-columnar --location default --formats json msgpack arrow
+    python benchmark.py api-conditional --location default
+    python benchmark.py api-history --location default --days 1 7 30 365
+    python benchmark.py predict-stream --dsn "dbname=bench user=postgres host=127.0.0.1" --rows 100000 1000000
+    python benchmark.py db-indexes --dsn "dbname=bench user=postgres host=127.0.0.1" --rows 5000000
+    python benchmark.py forecast-hourly
+    python benchmark.py time-features --locations 1 64
+    python benchmark.py forecast-eval --direct-model modelLSTM_direct.keras
+    python benchmark.py startup --modes import models
+    python benchmark.py inference-backends --backends keras tflite numpy
+    python benchmark.py write-amplification --dsn "dbname=bench user=postgres host=127.0.0.1"
+"""
+import argparse
+import os
+import pickle
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(SERVER_DIR, "..", "Dataset", "temperature")
+
+
+def load_model(name):
+    import tensorflow as tf
+    return tf.keras.models.load_model(os.path.join(SERVER_DIR, name))
+
+
+def load_scaler(name):
+    with open(os.path.join(SERVER_DIR, name), "rb") as f:
+        return pickle.load(f)
+
+
+def read_temperature_csv(name):
+    """Đọc CSV nhiệt độ (header Timestamp,Value hoặc timestamp,value), sắp xếp theo thời gian."""
+    df = pd.read_csv(os.path.join(DATASET_DIR, name))
+    df.columns = [c.strip().lower() for c in df.columns]
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="%m/%d/%Y %H:%M")
+    return df.sort_values("timestamp").reset_index(drop=True)
+
+
+def sample_lstm_window(offset=0):
+    """Lấy 6 điểm liên tiếp từ temperature_data_test.csv theo định dạng của air_quality_predict."""
+    from time_features import sin_cos_features
+
+    df = read_temperature_csv("temperature_data_test.csv").iloc[offset:offset + 6]
+    features = sin_cos_features(df["timestamp"].to_numpy()).tolist()
+    data = []
+    for ts, temperature, (day_sin, day_cos, year_sin, year_cos) in zip(df["timestamp"], df["value"], features):
+        data.append({
+            'timestamp': ts.to_pydatetime(),
+            'temperature': float(temperature),
+            'day_sin': float(day_sin),
+            'day_cos': float(day_cos),
+            'year_sin': float(year_sin),
+            'year_cos': float(year_cos),
+        })
+    return data
+
+
+def legacy_calculate_sin_cos_features(timestamp):
+    """Bản sao hàm tính đặc trưng thời gian cũ (một timestamp mỗi lần gọi) để làm mốc so sánh."""
+    day = 60 * 60 * 24
+    year = 365.2425 * day
+    seconds = timestamp.timestamp()
+
+    day_sin = np.sin(seconds * (2 * np.pi / day))
+    day_cos = np.cos(seconds * (2 * np.pi / day))
+    year_sin = np.sin(seconds * (2 * np.pi / year))
+    year_cos = np.cos(seconds * (2 * np.pi / year))
+
+    return day_sin, day_cos, year_sin, year_cos
+
+
+def legacy_predict_temperature_lstm(model_lstm, data, scaler_lstm, n_days=7, time_step=15*60):
+    """Bản sao vòng lặp dự báo cũ (một lần model.predict cho mỗi bước) để làm mốc so sánh."""
+    import gc
+    import tensorflow as tf
+
+    input_data = np.array([
+        [scaler_lstm.transform(np.array([[e['temperature']]]))[0][0],
+         e['day_sin'], e['day_cos'], e['year_sin'], e['year_cos']] for e in data
+    ])
+    current_input = np.reshape(input_data, (1, 6, -1))
+    predictions = []
+    current_timestamp = data[-1]['timestamp']
+    for i in range(n_days * 24 * 4):
+        with tf.device('/CPU:0'):
+            predicted_temperature = float(model_lstm.predict(current_input, verbose=0)[0][0])
+        if i % 10 == 0:
+            tf.keras.backend.clear_session()
+        predictions.append(predicted_temperature)
+        current_timestamp += timedelta(seconds=time_step)
+        features = legacy_calculate_sin_cos_features(pd.to_datetime(current_timestamp))
+        predicted_temperature_scaler = scaler_lstm.transform(np.array([[predicted_temperature]]))[0][0]
+        new_input = np.array([predicted_temperature_scaler, *features])
+        input_data = np.vstack([input_data[1:], new_input])
+        current_input = np.reshape(input_data, (1, 6, -1))
+        if i % 50 == 0 and i > 0:
+            gc.collect()
+    return predictions
+
+
+def read_pollution_features():
+    """Đọc updated_pollution_dataset.csv thành ma trận (N, 7) theo thứ tự đặc trưng của modelDNN"""
+    df = pd.read_csv(os.path.join(DATASET_DIR, "updated_pollution_dataset.csv"))
+    columns = ["Temperature", "Humidity", "PM2.5", "PM10", "NO2", "SO2", "CO"]
+    return df[columns].to_numpy(dtype=np.float32)
+
+
+def timed(fn, runs):
+    durations = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+
+def report(label, durations, unit="s/forecast"):
+    print(f"{label:<28} mean={np.mean(durations):.3f} {unit}  min={np.min(durations):.3f}  runs={len(durations)}")
+
+
+def bench_lstm(args):
+    import sys
+    from inference_backends import NumpyBackend
+    from lstm_forecast import LSTMForecastEngine
+
+    model_lstm = load_model("modelLSTM.keras")
+    scaler_lstm = load_scaler("scalerLSTM.pkl")
+    data = sample_lstm_window()
+    n_steps = args.days * 24 * 4
+    print(f"[BENCH] LSTM forecast {args.days} ngày = {n_steps} bước")
+
+    engine = LSTMForecastEngine(model_lstm, scaler_lstm)
+    window = np.array([
+        [engine.scale_temperature(e['temperature']), e['day_sin'], e['day_cos'], e['year_sin'], e['year_cos']]
+        for e in data
+    ])
+    engine.forecast(window, data[-1]['timestamp'], 4)  # warm-up (trace tf.function)
+    new_predictions, new_durations = timed(
+        lambda: engine.forecast(window, data[-1]['timestamp'], n_steps), args.runs)
+    report("engine (tf.function)", new_durations)
+
+    numpy_engine = LSTMForecastEngine(NumpyBackend.load(os.path.join(SERVER_DIR, "modelLSTM.keras")), scaler_lstm)
+    numpy_predictions, numpy_durations = timed(
+        lambda: numpy_engine.forecast(window, data[-1]['timestamp'], n_steps), args.runs)
+    report("engine (numpy)", numpy_durations)
+    diff = np.max(np.abs(np.asarray(numpy_predictions) - np.asarray(new_predictions)))
+    print(f"[BENCH] numpy so với tf.function: x{np.mean(new_durations) / np.mean(numpy_durations):.1f}, "
+          f"max |diff| = {diff:.2e} °C")
+    diffs = {"numpy": diff}
+
+    # Nhiều location trong một batch: cùng cửa sổ lặp lại, lệch timestamp để đặc trưng thời gian khác nhau
+    for batch_size in args.batch_sizes:
+        windows = np.repeat(window[None], batch_size, axis=0)
+        timestamps = [data[-1]['timestamp'] + timedelta(minutes=15 * i) for i in range(batch_size)]
+        _, keras_durations = timed(lambda: engine.forecast_batch(windows, timestamps, n_steps), args.runs)
+        _, batch_durations = timed(lambda: numpy_engine.forecast_batch(windows, timestamps, n_steps), args.runs)
+        print(f"[BENCH] batch {batch_size:>4}: tf.function {np.mean(keras_durations):.3f} s, "
+              f"numpy {np.mean(batch_durations):.3f} s ({np.mean(batch_durations) / batch_size * 1000:.2f} ms/location)")
+
+    if args.legacy_runs > 0:
+        old_predictions, old_durations = timed(
+            lambda: legacy_predict_temperature_lstm(model_lstm, data, scaler_lstm, n_days=args.days),
+            args.legacy_runs)
+        report("legacy (model.predict)", old_durations)
+        diff = np.max(np.abs(np.asarray(old_predictions) - np.asarray(new_predictions)))
+        print(f"[BENCH] speedup x{np.mean(old_durations) / np.mean(new_durations):.1f}, max |diff| = {diff:.2e} °C")
+        diffs["legacy"] = diff
+
+    failed = [name for name, value in diffs.items() if not value <= args.atol]
+    if failed:
+        print(f"[BENCH] {', '.join(failed)}: lệch so với engine tf.function vượt sai số cho phép (atol={args.atol} °C)")
+        sys.exit(1)
+
+
+def bench_dnn(args):
+    import tensorflow as tf
+    from air_quality_classifier import AirQualityClassifier
+
+    model = load_model("modelDNN.keras")
+    scaler = load_scaler("scalerDNN.pkl")
+    features = read_pollution_features()
+    classifier = AirQualityClassifier(model, scaler)
+    classifier.classify(features[:1])  # warm-up (trace tf.function)
+    print(f"[BENCH] DNN classification trên {len(features)} dòng updated_pollution_dataset.csv")
+
+    for batch_size in args.batch_sizes:
+        def run():
+            for start in range(0, len(features), batch_size):
+                classifier.classify(features[start:start + batch_size])
+        _, durations = timed(run, args.runs)
+        print(f"batch_size={batch_size:<5} {len(features) / np.mean(durations):>12.1f} rows/s")
+
+    if args.legacy_rows > 0:
+        # Cách cũ: scaler.transform + model.predict + clear_session cho từng dòng
+        def run_legacy():
+            for row in features[:args.legacy_rows]:
+                np.argmax(model.predict(scaler.transform(row[None].astype(np.float64)), verbose=0))
+                tf.keras.backend.clear_session()
+        _, durations = timed(run_legacy, 1)
+        print(f"legacy (per row)  {args.legacy_rows / np.mean(durations):>12.1f} rows/s")
+
+
+API_ENDPOINTS = [
+    "/latest_air_quality_data",
+    "/all_air_quality_predict_data",
+    "/latest_12_air_quality_predict",
+    "/latest_12_humidity",
+    "/latest_12_all_parameters",
+    "/locations",
+    "/available_locations",
+]
+
+
+async def load_test_endpoint(client, url, params, total_requests, concurrency, headers=None):
+    """Gửi total_requests request với concurrency kết nối song song; trả về latency từng request và tổng thời gian"""
+    import asyncio
+
+    latencies = []
+    remaining = iter(range(total_requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(url, params=params, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def bench_api(args):
+    """Load test API đang chạy (chạy một lần với bản cũ và một lần với bản mới để so sánh)"""
+    import asyncio
+    import httpx
+
+    async def run():
+        params = {"location": args.location} if args.location else None
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+            print(f"[BENCH] {args.base_url}: {args.requests} request/endpoint, concurrency={args.concurrency}")
+            print(f"{'endpoint':<34}{'p50 (ms)':>10}{'p99 (ms)':>10}{'req/s':>10}")
+            for endpoint in args.endpoints:
+                await load_test_endpoint(client, endpoint, params, args.concurrency, args.concurrency)  # warm-up
+                latencies, elapsed = await load_test_endpoint(client, endpoint, params, args.requests, args.concurrency)
+                p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+                print(f"{endpoint:<34}{p50:>10.2f}{p99:>10.2f}{len(latencies) / elapsed:>10.1f}")
+
+    asyncio.run(run())
+
+
+def bench_api_conditional(args):
+    """
+    GET thường so với GET có If-None-Match (ETag của lần trước) trên API đang chạy: latency,
+    req/s và số byte mỗi response khi dữ liệu của location không đổi (304, không truy vấn DB).
+    """
+    import asyncio
+    import httpx
+
+    async def run():
+        params = {"location": args.location}
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+            print(f"[BENCH] {args.base_url}: {args.requests} request/endpoint, concurrency={args.concurrency}")
+            print(f"{'endpoint':<34}{'request':>14}{'status':>8}{'KB':>8}{'p50 (ms)':>10}{'p99 (ms)':>10}{'req/s':>10}")
+            for endpoint in args.endpoints:
+                first = await client.get(endpoint, params=params)
+                first.raise_for_status()
+                etag = first.headers.get("etag")
+                if etag is None:
+                    print(f"{endpoint:<34}  không có ETag")
+                    continue
+                for label, headers in (("thường", None), ("If-None-Match", {"If-None-Match": etag})):
+                    response = await client.get(endpoint, params=params, headers=headers)
+                    await load_test_endpoint(client, endpoint, params, args.concurrency, args.concurrency, headers)
+                    latencies, elapsed = await load_test_endpoint(client, endpoint, params, args.requests,
+                                                                  args.concurrency, headers)
+                    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+                    print(f"{endpoint:<34}{label:>14}{response.status_code:>8}{response.num_bytes_downloaded / 1024:>8.1f}"
+                          f"{p50:>10.2f}{p99:>10.2f}{len(latencies) / elapsed:>10.1f}")
+
+    asyncio.run(run())
+
+
+def bench_api_history(args):
+    """/history với các khoảng thời gian khác nhau: kích thước response và latency phải gần như không đổi"""
+    import asyncio
+    import httpx
+
+    async def run():
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            latest = (await client.get("/history", params={"location": args.location})).json()
+            end = pd.Timestamp(latest["end"])
+            print(f"[BENCH] /history {args.location}, end={end}, points={args.points}, {args.requests} request/khoảng")
+            print(f"{'khoảng':>8}{'method':>8}{'nguồn':>20}{'ô (s)':>9}{'điểm':>7}{'KB':>8}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+            for days in args.days:
+                for method in args.methods:
+                    params = {"location": args.location, "metrics": ",".join(args.metrics), "points": args.points,
+                              "method": method, "start": (end - pd.Timedelta(days=days)).isoformat(),
+                              "end": end.isoformat()}
+                    response = await client.get("/history", params=params)
+                    response.raise_for_status()
+                    body = response.json()
+                    n_points = max(len(series) for series in body["series"].values())
+                    latencies, _ = await load_test_endpoint(client, "/history", params, args.requests, args.concurrency)
+                    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+                    print(f"{days:>7}d{method:>8}{body['source']:>20}{body['bucket_seconds']:>9}{n_points:>7}"
+                          f"{len(response.content) / 1024:>8.1f}{p50:>10.2f}{p99:>10.2f}")
+
+    asyncio.run(run())
+
+
+def seed_predict_data(conn, n_rows, n_locations):
+    """air_quality_predict_data với n_rows dòng dự báo theo giờ, chia đều cho n_locations location"""
+    per_location = max(n_rows // n_locations, 1)
+    conn.execute("DROP TABLE IF EXISTS air_quality_predict_data")
+    conn.execute("""
+        CREATE TABLE air_quality_predict_data (
+            id SERIAL PRIMARY KEY, timestamp TIMESTAMP, location VARCHAR(255), temperature FLOAT,
+            day_sin FLOAT, day_cos FLOAT, year_sin FLOAT, year_cos FLOAT)""")
+    conn.execute("""
+        INSERT INTO air_quality_predict_data (timestamp, location, temperature, day_sin, day_cos, year_sin, year_cos)
+        SELECT timestamp '2025-01-01' + (i %% %(per)s) * interval '1 hour',
+               'station_' || lpad((i / %(per)s)::text, 5, '0'),
+               25 + 5 * sin(i / 24.0), 0, 0, 0, 0
+        FROM generate_series(0, %(n)s - 1) i""", {"per": per_location, "n": n_rows})
+    conn.execute("CREATE UNIQUE INDEX ux_air_quality_predict_data_location_timestamp "
+                 "ON air_quality_predict_data (location, timestamp)")
+    conn.execute("ANALYZE air_quality_predict_data")
+    conn.commit()
+
+
+def bench_predict_stream(args):
+    """
+    /all_air_quality_predict_data không lọc location: fetchall + một response, stream mảng JSON,
+    và đọc lần lượt các trang keyset. Đo trong process (API_v2 dùng pool tới --dsn), bộ nhớ đỉnh
+    của Python bằng tracemalloc; nội dung stream được so sánh với response fetchall.
+    """
+    import asyncio
+    import hashlib
+    import tracemalloc
+    import psycopg
+    from psycopg_pool import AsyncConnectionPool
+    import API_v2
+
+    async def measure(label, fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        digest, n_bytes = await fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<16}{elapsed:>9.2f} s{peak / 2**20:>10.1f} MB{n_bytes / 2**20:>10.1f} MB")
+        return digest
+
+    async def fetchall_response():
+        rows = await API_v2.fetch_all(*API_v2.predict_data_query(None))
+        body = API_v2.dump_json(rows)
+        return hashlib.sha256(body).hexdigest(), len(body)
+
+    async def streamed():
+        digest, n_bytes = hashlib.sha256(), 0
+        async for chunk in API_v2.stream_rows(*API_v2.predict_data_query(None), "json"):
+            digest.update(chunk)
+            n_bytes += len(chunk)
+        return digest.hexdigest(), n_bytes
+
+    async def pages():
+        after, n_bytes = None, 0
+        while True:
+            rows = await API_v2.fetch_all(*API_v2.predict_data_query(None, after, args.page_size))
+            n_bytes += len(API_v2.dump_json(rows))
+            if len(rows) < args.page_size:
+                return None, n_bytes
+            after = (rows[-1][1], rows[-1][0])
+
+    async def run():
+        API_v2.db_pool = AsyncConnectionPool(conninfo=args.dsn, min_size=1, max_size=2, open=False)
+        await API_v2.db_pool.open()
+        try:
+            for n_rows in args.rows:
+                with psycopg.connect(args.dsn) as conn:
+                    seed_predict_data(conn, n_rows, args.locations)
+                print(f"[BENCH] {n_rows} dòng, {args.locations} location")
+                print(f"  {'cách đọc':<16}{'thời gian':>11}{'bộ nhớ đỉnh':>13}{'dữ liệu':>13}")
+                expected = await measure("fetchall", fetchall_response)
+                actual = await measure("stream json", streamed)
+                await measure(f"trang {args.page_size}", pages)
+                print(f"  stream khớp response fetchall: {actual == expected}")
+        finally:
+            await API_v2.db_pool.close()
+
+    asyncio.run(run())
+
+
+def postgres_round(value):
+    """ROUND(value::numeric, 2) của PostgreSQL: float8 -> numeric 15 chữ số, làm tròn nửa xa 0"""
+    from decimal import ROUND_HALF_UP, Decimal
+    return Decimal(f"{value:.15g}").quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def serialisation_payloads(n_locations, n_forecast, page_size, history_points):
+    """
+    Nội dung response của từng endpoint theo hai cách: (cũ, mới). Bản cũ có giá trị Decimal như
+    ROUND(x::numeric, 2) và Location Pydantic; bản mới là float (ROUND(...)::float8) và dict.
+    """
+    from datetime import datetime
+
+    rng = np.random.default_rng(0)
+    base = datetime(2025, 3, 1, 10, 0, 0)
+    locations = [f"station_{i:04d}" for i in range(n_locations)]
+
+    def rows(n, location="station_0000"):
+        values = rng.uniform(-10, 60, n) + rng.uniform(0, 1e-3, n)
+        timestamps = [base + timedelta(minutes=15 * i, microseconds=int(rng.integers(0, 2)) * 250_000)
+                      for i in range(n)]
+        old = [[ts, location, postgres_round(v)] for ts, v in zip(timestamps, values)]
+        new = [(ts, location, float(value)) for ts, _, value in old]
+        return old, new
+
+    metrics = ["humidity", "pm25", "pm10", "no2", "so2", "co"]
+    all_parameters = {name: rows(12) for name in metrics}
+    reading = [base, "station_0000", postgres_round(25.456), 61.2, 12.5, 20.25, 8.0, 3.1, 0.45, "Good"]
+    history_old, history_new = rows(history_points)
+    page_rows = [rows(page_size // n_locations + 1, location) for location in locations]
+
+    return {
+        "/latest_air_quality_data": ([reading], [tuple(reading[:2]) + (float(reading[2]),) + tuple(reading[3:])]),
+        "/latest_12_air_quality_predict": rows(12),
+        "/latest_12_humidity": rows(12),
+        "/latest_12_all_parameters": ({name: old for name, (old, _) in all_parameters.items()},
+                                      {name: new for name, (_, new) in all_parameters.items()}),
+        "/all_air_quality_predict_data?location": rows(n_forecast),
+        "/all_air_quality_predict_data?limit": ([row for old, _ in page_rows for row in old][:page_size],
+                                                [row for _, new in page_rows for row in new][:page_size]),
+        "/locations": (list(locations), list(locations)),
+        "/available_locations": (locations, [{"id": name, "name": name} for name in locations]),
+        "/history": tuple({
+            "location": "station_0000", "start": base, "end": base + timedelta(days=7), "method": "bucket",
+            "bucket_seconds": 1210, "source": "air_quality_data",
+            "series": {"temperature": [[ts, float(value)] for ts, _, value in series]},
+        } for series in (history_old, history_new)),
+    }
+
+
+def bench_api_serialisation(args):
+    """
+    Thời gian mã hóa response của từng endpoint: jsonable_encoder + JSONResponse (Decimal,
+    Location Pydantic + response_model) so với FastJSONResponse của API_v2; body phải giống hệt nhau.
+    """
+    from typing import List
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    import API_v2
+
+    locations_adapter = TypeAdapter(List[API_v2.Location])
+
+    def legacy_body(endpoint, content):
+        if endpoint == "/available_locations":
+            # Tạo Location cho từng dòng, rồi validate lại theo response_model=List[Location]
+            content = locations_adapter.validate_python([API_v2.Location(id=name, name=name) for name in content])
+        return JSONResponse(jsonable_encoder(content)).body
+
+    payloads = serialisation_payloads(args.locations, args.forecast_rows, args.page_size, args.history_points)
+    print(f"[BENCH] mã hóa response, {args.runs} lần/endpoint, orjson={'có' if API_v2.orjson else 'không'}")
+    print(f"{'endpoint':<40}{'cũ (µs)':>10}{'mới (µs)':>10}{'nhanh hơn':>11}{'KB':>8}  giống hệt")
+    for endpoint, (old, new) in payloads.items():
+        expected, old_durations = timed(lambda: legacy_body(endpoint, old), args.runs)
+        actual, new_durations = timed(lambda: API_v2.FastJSONResponse(new).body, args.runs)
+        old_us, new_us = np.mean(old_durations) * 1e6, np.mean(new_durations) * 1e6
+        print(f"{endpoint:<40}{old_us:>10.1f}{new_us:>10.1f}{old_us / new_us:>10.1f}x"
+              f"{len(actual) / 1024:>8.1f}  {actual == expected}")
+
+
+COLUMNAR_ACCEPT = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def parse_json_rows(body):
+    """Như app: JSON -> danh sách [timestamp, location, value], parse timestamp ISO của từng dòng"""
+    import json
+    from datetime import datetime
+
+    content = json.loads(body)
+    if isinstance(content, dict) and "series" in content:  # /history: {metric: [[timestamp, value]]}
+        return sum(len([(datetime.fromisoformat(ts), float(v)) for ts, v in points])
+                   for points in content["series"].values())
+    groups = content.values() if isinstance(content, dict) else [content]
+    return sum(len([(datetime.fromisoformat(ts), location, float(v)) for ts, location, v in rows]) for rows in groups)
+
+
+def parse_msgpack_series(body):
+    """msgpack -> mảng timestamp (ms, đã giải delta) và giá trị của từng series; trả về số điểm"""
+    import msgpack
+
+    series = msgpack.unpackb(body, raw=False)["series"]
+    decoded = [(np.cumsum(np.frombuffer(item["timestamps"], dtype="<i8")), np.frombuffer(item["values"], dtype="<f4"))
+               for item in series]
+    return sum(len(values) for _, values in decoded)
+
+
+def parse_arrow_series(body):
+    """Arrow IPC -> mảng timestamp (ms, giải delta trong từng series) và giá trị; trả về số điểm"""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(body).read_all()
+    deltas = table.column("timestamp").to_numpy()
+    values = table.column("value").to_numpy()
+    # Series mới bắt đầu khi location hoặc metric đổi
+    boundaries = np.zeros(table.num_rows, dtype=bool)
+    boundaries[:1] = True
+    for name in ("location", "metric"):
+        if name in table.column_names:
+            indices = table.column(name).combine_chunks().indices.to_numpy()
+            boundaries[1:] |= indices[1:] != indices[:-1]
+    starts = np.append(np.flatnonzero(boundaries), table.num_rows)
+    timestamps = np.concatenate([np.cumsum(deltas[a:b]) for a, b in zip(starts[:-1], starts[1:])] or [deltas])
+    return min(len(timestamps), len(values))
+
+
+COLUMNAR_PARSERS = {"json": parse_json_rows, "msgpack": parse_msgpack_series, "arrow": parse_arrow_series}
+
+
+def bench_api_columnar(args):
+    """
+    Endpoint dự báo / lịch sử theo từng định dạng (Accept) và nén (Accept-Encoding): số byte
+    trên đường truyền và thời gian client parse thành (timestamp, giá trị).
+    """
+    import httpx
+
+    with httpx.Client(base_url=args.base_url, timeout=60) as client:
+        end = pd.Timestamp(client.get("/history", params={"location": args.location}).json()["end"])
+        endpoints = [
+            ("/all_air_quality_predict_data", {"location": args.location}),
+            ("/all_air_quality_predict_data", {"limit": args.page_size}),
+            ("/latest_12_all_parameters", {"location": args.location}),
+        ] + [
+            ("/history", {"location": args.location, "metrics": ",".join(args.metrics), "points": args.points,
+                          "start": (end - pd.Timedelta(days=days)).isoformat(), "end": end.isoformat()})
+            for days in args.days
+        ]
+        print(f"[BENCH] {args.base_url}, location={args.location}, parse {args.runs} lần")
+        print(f"{'endpoint':<34}{'định dạng':>10}{'nén':>10}{'KB':>9}{'điểm':>8}{'parse (ms)':>12}")
+        for url, params in endpoints:
+            label = url + ("?limit" if "limit" in params else "") + (
+                f" {(end - pd.Timestamp(params['start'])).days}d" if "start" in params else "")
+            for fmt in args.formats:
+                for encoding in args.encodings:
+                    headers = {"Accept": COLUMNAR_ACCEPT[fmt], "Accept-Encoding": encoding}
+                    response = client.get(url, params=params, headers=headers)
+                    response.raise_for_status()
+                    if not response.headers["content-type"].startswith(COLUMNAR_ACCEPT[fmt]):
+                        print(f"{label:<34}{fmt:>10}{encoding:>10}  server trả về {response.headers['content-type']}")
+                        continue
+                    body = response.content
+                    n_points, durations = timed(lambda: COLUMNAR_PARSERS[fmt](body), args.runs)
+                    print(f"{label:<34}{fmt:>10}{encoding:>10}{response.num_bytes_downloaded / 1024:>9.1f}"
+                          f"{n_points:>8}{np.mean(durations) * 1000:>12.3f}")
+
+
+INDEXED_QUERIES = {
+    "latest_12 (air_quality_data)":
+        "SELECT timestamp, location, ROUND(humidity::numeric, 2) FROM air_quality_data "
+        "WHERE location = %s ORDER BY timestamp DESC LIMIT 12",
+    "latest_1 (air_quality_data)":
+        "SELECT * FROM air_quality_data WHERE location = %s ORDER BY timestamp DESC LIMIT 1",
+    "last_6 (air_quality_predict)":
+        "SELECT * FROM air_quality_predict WHERE location = %s ORDER BY timestamp DESC LIMIT 6",
+}
+
+
+def seed_sensor_history(conn, n_rows, n_locations):
+    """
+    Tạo air_quality_data và air_quality_predict với n_rows dòng mỗi bảng từ các CSV trong Dataset/.
+
+    Chuỗi nhiệt độ (temperature_data*.csv) được lặp lại và dịch thời gian cho từng location
+    giả lập; các thông số khác lấy xoay vòng từ updated_pollution_dataset.csv.
+    """
+    import io
+    from time_features import sin_cos_features
+
+    temperatures = pd.concat([
+        read_temperature_csv(name) for name in
+        ["temperature_data.csv", "temperature_data_2025.csv", "temperature_data_train.csv", "temperature_data_test.csv"]
+    ])["value"].to_numpy()
+    pollution = read_pollution_features()
+
+    rows_per_location = n_rows // n_locations
+    start = np.datetime64("2020-01-01T00:00:00")
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS air_quality_data, air_quality_predict")
+        cursor.execute("""
+            CREATE TABLE air_quality_data (
+                id SERIAL PRIMARY KEY, timestamp TIMESTAMP, location VARCHAR(255),
+                temperature FLOAT, humidity FLOAT, pm25 FLOAT, pm10 FLOAT,
+                no2 FLOAT, so2 FLOAT, co FLOAT, air_quality INTEGER)""")
+        cursor.execute("""
+            CREATE TABLE air_quality_predict (
+                id SERIAL PRIMARY KEY, timestamp TIMESTAMP, location VARCHAR(255), temperature FLOAT,
+                day_sin FLOAT, day_cos FLOAT, year_sin FLOAT, year_cos FLOAT)""")
+
+        for loc in range(n_locations):
+            idx = (np.arange(rows_per_location) + loc * 997) % len(temperatures)
+            timestamps = start + np.arange(rows_per_location).astype("timedelta64[m]") * 15
+            features = sin_cos_features(timestamps)
+            metrics = pollution[idx % len(pollution)]
+            ts_text = np.datetime_as_string(timestamps, unit="s")
+            location = f"station_{loc:03d}"
+
+            data_buffer, predict_buffer = io.StringIO(), io.StringIO()
+            for i in range(rows_per_location):
+                m = metrics[i]
+                data_buffer.write(f"{ts_text[i]},{location},{temperatures[idx[i]]},{m[1]},{m[2]},{m[3]},{m[4]},{m[5]},{m[6]},{i % 4}\n")
+                f = features[i]
+                predict_buffer.write(f"{ts_text[i]},{location},{temperatures[idx[i]]},{f[0]},{f[1]},{f[2]},{f[3]}\n")
+            data_buffer.seek(0)
+            predict_buffer.seek(0)
+            cursor.copy_expert("COPY air_quality_data (timestamp, location, temperature, humidity, pm25, pm10, "
+                               "no2, so2, co, air_quality) FROM STDIN WITH (FORMAT csv)", data_buffer)
+            cursor.copy_expert("COPY air_quality_predict (timestamp, location, temperature, day_sin, day_cos, "
+                               "year_sin, year_cos) FROM STDIN WITH (FORMAT csv)", predict_buffer)
+        cursor.execute("ANALYZE air_quality_data")
+        cursor.execute("ANALYZE air_quality_predict")
+    conn.commit()
+
+
+def measure_queries(conn, locations, repeats):
+    results = {}
+    with conn.cursor() as cursor:
+        for label, query in INDEXED_QUERIES.items():
+            durations = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                cursor.execute(query, (locations[i % len(locations)],))
+                cursor.fetchall()
+                durations.append(time.perf_counter() - start)
+            results[label] = np.percentile(np.asarray(durations) * 1000, [50, 99])
+    return results
+
+
+def bench_db_indexes(args):
+    """So sánh latency truy vấn theo (location, timestamp) trước và sau khi có index tổng hợp"""
+    import psycopg2
+
+    conn = psycopg2.connect(args.dsn)
+    if not args.skip_seed:
+        print(f"[BENCH] Seed {args.rows} dòng x 2 bảng cho {args.locations} location...")
+        seed_start = time.perf_counter()
+        seed_sensor_history(conn, args.rows, args.locations)
+        print(f"[BENCH] Seed xong trong {time.perf_counter() - seed_start:.1f}s")
+
+    locations = [f"station_{i:03d}" for i in range(args.locations)]
+    with conn.cursor() as cursor:
+        for table in ("air_quality_data", "air_quality_predict"):
+            cursor.execute(f"DROP INDEX IF EXISTS ix_{table}_location_timestamp")
+    conn.commit()
+    before = measure_queries(conn, locations, args.repeats)
+
+    with conn.cursor() as cursor:
+        for table in ("air_quality_data", "air_quality_predict"):
+            cursor.execute(f"CREATE INDEX ix_{table}_location_timestamp ON {table} (location, timestamp DESC)")
+            cursor.execute(f"ANALYZE {table}")
+    conn.commit()
+    after = measure_queries(conn, locations, args.repeats)
+    conn.close()
+
+    print(f"{'query':<32}{'p50 trước':>12}{'p99 trước':>12}{'p50 sau':>12}{'p99 sau':>12}  (ms)")
+    for label in INDEXED_QUERIES:
+        print(f"{label:<32}{before[label][0]:>12.2f}{before[label][1]:>12.2f}{after[label][0]:>12.2f}{after[label][1]:>12.2f}")
+
+
+def bench_forecast_hourly(args):
+    """Trung bình theo giờ của 7 ngày dự báo: pandas resample + iterrows cũ vs hourly_means (NumPy)"""
+    from lstm_forecast import hourly_means
+    from time_features import sin_cos_features
+
+    rng = np.random.default_rng(0)
+    n_steps = args.days * 24 * 4
+    predictions = 25 + rng.standard_normal(n_steps)
+    base_timestamp = pd.Timestamp("2025-03-01 10:07:00")
+
+    def legacy():
+        times = [base_timestamp + timedelta(minutes=(i + 1) * 15) for i in range(n_steps)]
+        df_hourly = pd.DataFrame({"timestamp": times, "temperature": predictions}).set_index("timestamp").resample("H").mean().reset_index()
+        rows = []
+        for _, row in df_hourly.iterrows():
+            features = legacy_calculate_sin_cos_features(row["timestamp"])
+            rows.append((row["timestamp"], float(row["temperature"]), *map(float, features)))
+        return rows
+
+    def vectorized():
+        hours, means = hourly_means(base_timestamp, predictions)
+        return hours, means, sin_cos_features(hours)
+
+    legacy_rows, legacy_durations = timed(legacy, args.runs)
+    (hours, means, _), durations = timed(vectorized, args.runs)
+
+    np.testing.assert_array_equal(np.array([r[0] for r in legacy_rows], dtype="datetime64[s]"), hours)
+    np.testing.assert_allclose(np.array([r[1] for r in legacy_rows]), means, rtol=1e-12)
+    print(f"[BENCH] {len(hours)} giờ, kết quả khớp với resample('H').mean()")
+    report("resample + iterrows", legacy_durations, "s")
+    report("hourly_means", durations, "s")
+
+
+def bench_time_features(args):
+    """
+    Đặc trưng thời gian cho chân trời 672 bước (7 ngày, 15 phút): hàm cũ gọi từng bước với
+    pd.to_datetime, sin_cos_features trên cả mảng, và horizon_features với bảng lưới đã cache.
+    """
+    from time_features import horizon_features, offset_tables, sin_cos_features
+
+    n_steps = args.days * 24 * 4
+    base = pd.Timestamp("2025-03-01 10:07:33")
+    step = timedelta(minutes=15)
+
+    def legacy(bases):
+        rows = []
+        for base_timestamp in bases:
+            current = base_timestamp
+            for _ in range(n_steps):
+                current += step
+                rows.append(legacy_calculate_sin_cos_features(pd.to_datetime(current)))
+        return np.array(rows).reshape(len(bases), n_steps, 4)
+
+    def array(bases):
+        seconds = np.array([b.timestamp() for b in bases])[:, None] + np.arange(1, n_steps + 1) * step.total_seconds()
+        return sin_cos_features(seconds)
+
+    offset_tables(n_steps)  # bảng lưới được tính ở lần gọi đầu tiên
+    print(f"[BENCH] Đặc trưng thời gian {n_steps} bước")
+    for n_bases in args.locations:
+        bases = [base + timedelta(minutes=7 * i) for i in range(n_bases)]
+        expected, legacy_durations = timed(lambda: legacy(bases), max(1, args.runs // 10))
+        array_result, array_durations = timed(lambda: array(bases), args.runs)
+        grid_result, grid_durations = timed(lambda: horizon_features(bases, n_steps), args.runs)
+        diff = max(np.max(np.abs(array_result - expected)), np.max(np.abs(grid_result - expected)))
+        print(f"[BENCH] {n_bases} location, max |diff| so với hàm cũ = {diff:.2e}")
+        report("  từng bước (cũ)", np.array(legacy_durations) * 1000, "ms")
+        report("  sin_cos_features", np.array(array_durations) * 1000, "ms")
+        report("  horizon_features", np.array(grid_durations) * 1000, "ms")
+
+
+def lstm_test_windows():
+    """Tất cả cửa sổ 6 điểm liên tiếp của temperature_data_test.csv (nhiệt độ chưa chuẩn hóa) và timestamp cuối"""
+    from time_features import sin_cos_features
+
+    df = read_temperature_csv("temperature_data_test.csv")
+    rows = np.column_stack([df["value"].to_numpy(dtype=np.float64), sin_cos_features(df["timestamp"].to_numpy())])
+    index = np.arange(len(rows) - 5)[:, None] + np.arange(6)
+    return rows[index], df["timestamp"].to_numpy()[5:]
+
+
+def backend_latency(backend, inputs, runs):
+    """Median thời gian một lần gọi backend (ms)"""
+    backend(inputs)  # warm-up
+    _, durations = timed(lambda: backend(inputs), runs)
+    return np.median(durations) * 1000
+
+
+# Chạy trong một process mới cho mỗi backend để RSS không bị lẫn TensorFlow của backend khác
+FOOTPRINT_SCRIPT = """
+import json, resource, sys, time
+import numpy as np
+from inference_backends import load_backend
+dnn = load_backend("{backend}", "modelDNN.keras")
+lstm = load_backend("{backend}", "modelLSTM.keras")
+x_dnn = np.zeros((1, *dnn.input_shape), dtype=np.float32)
+x_lstm = np.zeros((1, *lstm.input_shape), dtype=np.float32)
+for _ in range(10):
+    dnn(x_dnn); lstm(x_lstm)
+start = time.perf_counter()
+for _ in range({calls}):
+    dnn(x_dnn)
+dnn_ms = (time.perf_counter() - start) / {calls} * 1000
+start = time.perf_counter()
+for _ in range({calls}):
+    lstm(x_lstm)
+lstm_ms = (time.perf_counter() - start) / {calls} * 1000
+print(json.dumps({{"rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "tensorflow": "tensorflow" in sys.modules, "dnn_ms": dnn_ms, "lstm_ms": lstm_ms}}))
+"""
+
+
+def bench_inference_backends(args):
+    """
+    Parity của các backend tflite/onnx so với mô hình Keras gốc, latency mỗi lần gọi và RSS.
+
+    DNN: xác suất trên toàn bộ updated_pollution_dataset.csv. LSTM: một bước trên mọi cửa sổ
+    của temperature_data_test.csv, và dự báo 7 ngày cho vài cửa sổ. Thoát với mã 1 nếu vượt sai số.
+    """
+    import json
+    import subprocess
+    import sys
+    from air_quality_classifier import AirQualityClassifier
+    from inference_backends import KerasBackend, load_backend
+    from lstm_forecast import LSTMForecastEngine
+
+    scaler = load_scaler("scalerDNN.pkl")
+    scaler_lstm = load_scaler("scalerLSTM.pkl")
+    reference_dnn = KerasBackend(load_model("modelDNN.keras"))
+    reference_lstm = KerasBackend(load_model("modelLSTM.keras"))
+
+    classifier = AirQualityClassifier(reference_dnn, scaler)
+    dnn_inputs = read_pollution_features() * classifier.scale + classifier.offset
+    reference_engine = LSTMForecastEngine(reference_lstm, scaler_lstm)
+    windows, last_timestamps = lstm_test_windows()
+    windows[..., 0] = reference_engine.scale_temperature(windows[..., 0])
+    lstm_inputs = windows.astype(np.float32)
+    rollout = slice(0, args.rollout_windows)
+    n_steps = args.days * 24 * 4
+
+    expected_dnn = reference_dnn(dnn_inputs)
+    expected_lstm = reference_lstm(lstm_inputs)
+    expected_rollout = reference_engine.forecast_batch(lstm_inputs[rollout], last_timestamps[rollout], n_steps)
+    print(f"[BENCH] DNN {len(dnn_inputs)} dòng, LSTM {len(lstm_inputs)} cửa sổ, rollout {n_steps} bước x {args.rollout_windows}")
+
+    failed = False
+    print(f"{'backend':<8}{'DNN max|Δp|':>13}{'nhãn khớp':>11}{'LSTM max|Δ|':>13}{'rollout max|Δ|':>16}"
+          f"{'DNN ms (1/256)':>18}{'LSTM ms (1/64)':>18}")
+    for name in args.backends:
+        try:
+            dnn = reference_dnn if name == "keras" else load_backend(name, os.path.join(SERVER_DIR, "modelDNN.keras"))
+            lstm = reference_lstm if name == "keras" else load_backend(name, os.path.join(SERVER_DIR, "modelLSTM.keras"))
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{name:<8}bỏ qua: {e}")
+            continue
+
+        dnn_diff = np.max(np.abs(dnn(dnn_inputs) - expected_dnn))
+        labels_match = np.mean(np.argmax(dnn(dnn_inputs), axis=1) == np.argmax(expected_dnn, axis=1))
+        lstm_diff = np.max(np.abs(lstm(lstm_inputs) - expected_lstm))
+        engine = LSTMForecastEngine(lstm, scaler_lstm)
+        rollout_diff = np.max(np.abs(engine.forecast_batch(lstm_inputs[rollout], last_timestamps[rollout], n_steps)
+                                     - expected_rollout))
+        dnn_ms = [backend_latency(dnn, dnn_inputs[:size], args.runs) for size in (1, 256)]
+        lstm_ms = [backend_latency(lstm, lstm_inputs[:size], args.runs) for size in (1, 64)]
+        print(f"{name:<8}{dnn_diff:>13.2e}{labels_match:>11.2%}{lstm_diff:>13.2e}{rollout_diff:>16.2e}"
+              f"{dnn_ms[0]:>9.3f}/{dnn_ms[1]:<8.3f}{lstm_ms[0]:>9.3f}/{lstm_ms[1]:<8.3f}")
+        if dnn_diff > args.atol or lstm_diff > args.atol or rollout_diff > args.rollout_atol:
+            print(f"[BENCH] {name}: vượt sai số cho phép (atol={args.atol}, rollout_atol={args.rollout_atol})")
+            failed = True
+
+    print(f"\n{'backend':<8}{'RSS MB':>10}{'TensorFlow':>12}{'DNN ms':>10}{'LSTM ms':>10}  (process riêng, batch 1)")
+    for name in args.backends:
+        script = FOOTPRINT_SCRIPT.format(backend=name, calls=args.runs * 10)
+        output = subprocess.run([sys.executable, "-c", script], cwd=SERVER_DIR, capture_output=True, text=True)
+        lines = output.stdout.strip().splitlines()
+        if output.returncode != 0 or not lines:
+            print(f"{name:<8}lỗi: {output.stderr.strip().splitlines()[-1] if output.stderr.strip() else ''}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"{name:<8}{r['rss_mb']:>10.1f}{str(r['tensorflow']):>12}{r['dnn_ms']:>10.3f}{r['lstm_ms']:>10.3f}")
+
+    if failed:
+        sys.exit(1)
+
+
+FORECAST_EVAL_LEAD_HOURS = [1, 6, 24, 72, 168]
+
+
+def bench_forecast_eval(args):
+    """
+    So sánh dự báo autoregressive (modelLSTM.keras) và direct trên temperature_data_test.csv.
+
+    Chỉ mô hình có manifest (training_pipeline.py) cho thấy dữ liệu train kết thúc trước giai
+    đoạn test mới được đánh giá; mô hình không rõ nguồn gốc bị bỏ qua trừ khi có --allow-unverified
+    (kết quả khi đó được đánh dấu, không dùng để so sánh).
+
+    Dữ liệu test được resample về lưới 15 phút; mỗi mốc dự báo (cách nhau --stride bước) có
+    cửa sổ 6 điểm đầu vào và --days ngày giá trị thật phía sau. Báo cáo MAE/RMSE theo thời
+    gian dự báo và thời gian chạy cả batch các mốc lẫn một mốc đơn lẻ.
+    """
+    from inference_backends import load_backend
+    from lstm_forecast import FORECAST_ENGINES
+    from training_pipeline import find_manifest, load_temperature_series, make_direct_samples
+
+    scaler_lstm = load_scaler("scalerLSTM.pkl")
+    n_steps = args.days * 24 * 4
+    series = load_temperature_series([os.path.join(DATASET_DIR, "temperature_data_test.csv")])
+    windows, targets, last_timestamps = make_direct_samples(series, scaler_lstm, horizon_steps=n_steps,
+                                                            stride=args.stride)
+    if len(windows) == 0:
+        print(f"[BENCH] temperature_data_test.csv không đủ dữ liệu liên tục cho {args.days} ngày")
+        return
+    lead_hours = [h for h in FORECAST_EVAL_LEAD_HOURS if h * 4 <= n_steps]
+    print(f"[BENCH] {len(windows)} mốc dự báo, {n_steps} bước mỗi mốc, backend {args.backend}")
+
+    header = f"{'mode':<16}{'batch s':>9}{'1 mốc s':>9}{'MAE':>8}{'RMSE':>8}"
+    header += "".join(f"{f'MAE@{h}h':>10}" for h in lead_hours)
+    print(header)
+    for mode, model_name in (("autoregressive", "modelLSTM.keras"), ("direct", args.direct_model)):
+        model_path = os.path.join(SERVER_DIR, model_name)
+        label = mode
+        manifest = find_manifest(model_path) if os.path.isfile(model_path) else None
+        train_end = (manifest or {}).get("temperature_series", {}).get("end")
+        if train_end is not None and pd.Timestamp(train_end) >= series.index[0]:
+            print(f"{mode:<16}bỏ qua: dữ liệu train (đến {train_end}) chồng lên giai đoạn test (từ {series.index[0]})")
+            continue
+        if train_end is None:
+            if not args.allow_unverified:
+                print(f"{mode:<16}bỏ qua: không có manifest chứng minh {model_name} không được train trên "
+                      f"giai đoạn test (huấn luyện lại bằng training_pipeline.py hoặc dùng --allow-unverified)")
+                continue
+            label = f"{mode}*"
+        try:
+            engine = FORECAST_ENGINES[mode](load_backend(args.backend, model_path), scaler_lstm)
+        except (ImportError, FileNotFoundError, OSError) as e:
+            print(f"{mode:<16}bỏ qua: {e}")
+            continue
+
+        engine.forecast_batch(windows[:1], last_timestamps[:1], 4)  # warm-up
+        predictions, batch_durations = timed(
+            lambda: engine.forecast_batch(windows, last_timestamps, n_steps), args.runs)
+        _, single_durations = timed(
+            lambda: engine.forecast_batch(windows[:1], last_timestamps[:1], n_steps), args.runs)
+
+        errors = predictions - targets
+        row = (f"{label:<16}{np.mean(batch_durations):>9.3f}{np.mean(single_durations):>9.3f}"
+               f"{np.mean(np.abs(errors)):>8.3f}{np.sqrt(np.mean(errors ** 2)):>8.3f}")
+        row += "".join(f"{np.mean(np.abs(errors[:, h * 4 - 1])):>10.3f}" for h in lead_hours)
+        print(row)
+        if args.per_step_csv:
+            path = f"{os.path.splitext(args.per_step_csv)[0]}_{mode}.csv"
+            pd.DataFrame({
+                "step": np.arange(1, n_steps + 1),
+                "mae": np.mean(np.abs(errors), axis=0),
+                "rmse": np.sqrt(np.mean(errors ** 2, axis=0)),
+            }).to_csv(path, index=False)
+            print(f"[BENCH] MAE/RMSE theo từng bước của {mode} -> {path}")
+    if args.allow_unverified:
+        print("* không xác minh được dữ liệu train: metric có thể đã thấy giai đoạn test")
+
+
+# Chạy trong một process mới để đo từ lúc import mqtt_subscriber_v3
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import mqtt_subscriber_v3 as subscriber
+imported = time.perf_counter()
+tensorflow_on_import = "tensorflow" in sys.modules
+ok = {action}
+done = time.perf_counter()
+print(json.dumps({{"import": imported - started, "ready": done - started, "ok": bool(ok),
+                  "tensorflow_on_import": tensorflow_on_import,
+                  "timings": subscriber.service.timings}}))
+"""
+STARTUP_ACTIONS = {
+    "import": "True",
+    "models": "subscriber.service.load_models()",
+    "full": "subscriber.service.start()",  # Cần PostgreSQL và MQTT broker
+}
+
+
+def bench_startup(args):
+    """Thời gian import mqtt_subscriber_v3 và thời gian đến khi sẵn sàng, mỗi lần chạy trong process mới"""
+    import json
+    import subprocess
+    import sys
+
+    for mode in args.modes:
+        results = []
+        for _ in range(args.runs):
+            script = STARTUP_SCRIPT.format(action=STARTUP_ACTIONS[mode])
+            output = subprocess.run([sys.executable, "-c", script], cwd=SERVER_DIR, capture_output=True,
+                                    text=True, timeout=args.timeout)
+            lines = output.stdout.strip().splitlines()
+            if output.returncode != 0 or not lines:
+                print(f"[BENCH] {mode}: lỗi\n{output.stderr[-2000:]}")
+                break
+            results.append(json.loads(lines[-1]))
+        if not results:
+            continue
+        report(f"{mode}: import", [r["import"] for r in results], "s")
+        report(f"{mode}: import -> xong", [r["ready"] for r in results], "s")
+        print(f"{'':<28} TensorFlow đã được import khi import module: {results[0]['tensorflow_on_import']}")
+        for name, duration in sorted(results[-1]["timings"].items()):
+            print(f"{'':<28} {name:<28} {duration:.3f}s")
+
+
+# Các bảng riêng (tên bảng, cột trong air_quality_data) giống INDIVIDUAL_SENSOR_TABLES của subscriber
+PER_METRIC_TABLES = [
+    ("temperature_data", "temperature"), ("humidity_data", "humidity"), ("pm25_data", "pm25"),
+    ("pm10_data", "pm10"), ("no2_data", "no2"), ("so2_data", "so2"), ("co_data", "co"),
+]
+WRITE_AMPLIFICATION_SCHEMA = "bench_write_amplification"
+
+
+def create_ingest_schema(cursor, mode):
+    """Tạo schema riêng với air_quality_data và các bảng riêng dạng bảng ("table") hoặc view ("view")"""
+    from metric_views import per_metric_view_sql
+
+    cursor.execute(f"DROP SCHEMA IF EXISTS {WRITE_AMPLIFICATION_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {WRITE_AMPLIFICATION_SCHEMA}")
+    cursor.execute(f"SET search_path TO {WRITE_AMPLIFICATION_SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE air_quality_data (
+            id SERIAL, timestamp TIMESTAMP NOT NULL, location VARCHAR(255),
+            temperature FLOAT, humidity FLOAT, pm25 FLOAT, pm10 FLOAT,
+            no2 FLOAT, so2 FLOAT, co FLOAT, air_quality INTEGER, PRIMARY KEY (id, timestamp))""")
+    tables = ["air_quality_data"]
+    for table, column in PER_METRIC_TABLES:
+        if mode == "view":
+            cursor.execute(per_metric_view_sql(table, column))
+        else:
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    id SERIAL, timestamp TIMESTAMP NOT NULL, location VARCHAR(255), value FLOAT,
+                    PRIMARY KEY (id, timestamp))""")
+            tables.append(table)
+    for table in tables:
+        cursor.execute(f"CREATE INDEX ix_{table}_id ON {table} (id)")
+        cursor.execute(f"CREATE INDEX ix_{table}_location_timestamp ON {table} (location, timestamp DESC)")
+    return tables
+
+
+def ingest_messages(conn, mode, n_messages, batch_size):
+    """Ghi n_messages bản tin theo lô bằng COPY như BulkIngestWriter; trả về số đo cho mỗi bản tin"""
+    import io
+
+    pollution = read_pollution_features()
+    start = np.datetime64("2025-01-01T00:00:00")
+    with conn.cursor() as cursor:
+        tables = create_ingest_schema(cursor, mode)
+        conn.commit()
+
+        cursor.execute("SELECT pg_current_wal_insert_lsn()")
+        wal_start = cursor.fetchone()[0]
+        start_time = time.perf_counter()
+        for batch_start in range(0, n_messages, batch_size):
+            buffers = {table: io.StringIO() for table in tables}
+            for i in range(batch_start, min(batch_start + batch_size, n_messages)):
+                m = pollution[i % len(pollution)]
+                timestamp = np.datetime_as_string(start + np.timedelta64(15 * i, "m"), unit="s")
+                location = f"station_{i % 10:03d}"
+                buffers["air_quality_data"].write(
+                    f"{timestamp},{location},{m[0]},{m[1]},{m[2]},{m[3]},{m[4]},{m[5]},{m[6]},{i % 4}\n")
+                for j, (table, _) in enumerate(PER_METRIC_TABLES):
+                    if table in buffers:
+                        buffers[table].write(f"{timestamp},{location},{m[j]}\n")
+            for table, buffer in buffers.items():
+                buffer.seek(0)
+                columns = ("timestamp, location, temperature, humidity, pm25, pm10, no2, so2, co, air_quality"
+                           if table == "air_quality_data" else "timestamp, location, value")
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            conn.commit()
+        duration = time.perf_counter() - start_time
+
+        cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)", (wal_start,))
+        wal_bytes = float(cursor.fetchone()[0])
+        cursor.execute("SELECT count(*) FROM pg_indexes WHERE schemaname = %s", (WRITE_AMPLIFICATION_SCHEMA,))
+        n_indexes = cursor.fetchone()[0]
+        cursor.execute("SELECT sum(pg_total_relation_size(c.oid)) FROM pg_class c "
+                       "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = %s AND c.relkind = 'r'",
+                       (WRITE_AMPLIFICATION_SCHEMA,))
+        storage_bytes = float(cursor.fetchone()[0])
+
+        # Kiểm tra các bảng riêng (bảng hoặc view) đọc ra cùng dữ liệu
+        cursor.execute("SELECT count(*) FROM temperature_data")
+        assert cursor.fetchone()[0] == n_messages
+
+        cursor.execute(f"DROP SCHEMA {WRITE_AMPLIFICATION_SCHEMA} CASCADE")
+        conn.commit()
+
+    return {
+        "rows": len(tables),
+        "index_updates": n_indexes,
+        "wal_bytes": wal_bytes / n_messages,
+        "storage_bytes": storage_bytes / n_messages,
+        "us": duration / n_messages * 1e6,
+    }
+
+
+def bench_write_amplification(args):
+    """So sánh số dòng, số lần cập nhật index, WAL và thời gian ghi mỗi bản tin: bảng riêng vs view"""
+    import psycopg2
+
+    conn = psycopg2.connect(args.dsn)
+    results = {mode: ingest_messages(conn, mode, args.messages, args.batch_size) for mode in ("table", "view")}
+    conn.close()
+
+    print(f"{'mode':<8}{'rows/msg':>10}{'index/msg':>11}{'WAL B/msg':>12}{'disk B/msg':>12}{'us/msg':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['rows']:>10}{r['index_updates']:>11}{r['wal_bytes']:>12.0f}"
+              f"{r['storage_bytes']:>12.0f}{r['us']:>10.1f}")
+    print(f"[BENCH] WAL giảm {results['table']['wal_bytes'] / results['view']['wal_bytes']:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hiệu năng server AirQuality")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    lstm_parser = subparsers.add_parser("lstm", help="Thời gian dự báo LSTM 7 ngày: vòng lặp cũ vs engine mới")
+    lstm_parser.add_argument("--days", type=int, default=7)
+    lstm_parser.add_argument("--runs", type=int, default=3)
+    lstm_parser.add_argument("--legacy-runs", type=int, default=1)
+    lstm_parser.add_argument("--atol", type=float, default=1e-3,
+                             help="Sai số cho phép (°C) giữa engine và vòng lặp cũ / backend numpy")
+    lstm_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64],
+                             help="Số location dự báo cùng lúc")
+    lstm_parser.set_defaults(func=bench_lstm)
+
+    dnn_parser = subparsers.add_parser("dnn", help="Thông lượng phân loại DNN theo kích thước batch")
+    dnn_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256])
+    dnn_parser.add_argument("--runs", type=int, default=3)
+    dnn_parser.add_argument("--legacy-rows", type=int, default=200)
+    dnn_parser.set_defaults(func=bench_dnn)
+
+    api_parser = subparsers.add_parser("api", help="Load test các endpoint FastAPI: p50/p99 latency và req/s")
+    api_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    api_parser.add_argument("--location", default=None)
+    api_parser.add_argument("--requests", type=int, default=500)
+    api_parser.add_argument("--concurrency", type=int, default=20)
+    api_parser.add_argument("--endpoints", nargs="+", default=API_ENDPOINTS)
+    api_parser.set_defaults(func=bench_api)
+
+    serialisation_parser = subparsers.add_parser("api-serialisation",
+                                                 help="Thời gian mã hóa JSON từng endpoint: jsonable_encoder vs orjson")
+    serialisation_parser.add_argument("--runs", type=int, default=2000)
+    serialisation_parser.add_argument("--locations", type=int, default=50)
+    serialisation_parser.add_argument("--forecast-rows", type=int, default=672)
+    serialisation_parser.add_argument("--page-size", type=int, default=1000)
+    serialisation_parser.add_argument("--history-points", type=int, default=500)
+    serialisation_parser.set_defaults(func=bench_api_serialisation)
+
+    columnar_parser = subparsers.add_parser("api-columnar",
+                                            help="JSON / msgpack / Arrow, có và không nén: KB truyền và thời gian parse")
+    columnar_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    columnar_parser.add_argument("--location", required=True)
+    columnar_parser.add_argument("--formats", nargs="+", choices=list(COLUMNAR_ACCEPT), default=list(COLUMNAR_ACCEPT))
+    columnar_parser.add_argument("--encodings", nargs="+", default=["identity", "gzip"])
+    columnar_parser.add_argument("--metrics", nargs="+", default=["temperature", "pm25"])
+    columnar_parser.add_argument("--days", type=int, nargs="+", default=[7, 365])
+    columnar_parser.add_argument("--points", type=int, default=2000)
+    columnar_parser.add_argument("--page-size", type=int, default=10000)
+    columnar_parser.add_argument("--runs", type=int, default=50)
+    columnar_parser.set_defaults(func=bench_api_columnar)
+
+    conditional_parser = subparsers.add_parser("api-conditional",
+                                               help="GET thường vs If-None-Match (304) khi dữ liệu không đổi")
+    conditional_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    conditional_parser.add_argument("--location", required=True)
+    conditional_parser.add_argument("--requests", type=int, default=500)
+    conditional_parser.add_argument("--concurrency", type=int, default=20)
+    conditional_parser.add_argument("--endpoints", nargs="+",
+                                    default=["/latest_12_all_parameters", "/all_air_quality_predict_data",
+                                             "/latest_12_air_quality_predict", "/latest_air_quality_data"])
+    conditional_parser.set_defaults(func=bench_api_conditional)
+
+    history_parser = subparsers.add_parser("api-history", help="/history: kích thước và latency theo độ rộng khoảng thời gian")
+    history_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    history_parser.add_argument("--location", required=True)
+    history_parser.add_argument("--metrics", nargs="+", default=["temperature", "pm25"])
+    history_parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 365])
+    history_parser.add_argument("--methods", nargs="+", choices=["bucket", "lttb"], default=["bucket", "lttb"])
+    history_parser.add_argument("--points", type=int, default=500)
+    history_parser.add_argument("--requests", type=int, default=100)
+    history_parser.add_argument("--concurrency", type=int, default=10)
+    history_parser.set_defaults(func=bench_api_history)
+
+    stream_parser = subparsers.add_parser("predict-stream",
+                                          help="/all_air_quality_predict_data: fetchall vs stream vs keyset, bộ nhớ đỉnh")
+    stream_parser.add_argument("--dsn", required=True, help="Chuỗi kết nối tới PostgreSQL dùng riêng cho benchmark")
+    stream_parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    stream_parser.add_argument("--locations", type=int, default=500)
+    stream_parser.add_argument("--page-size", type=int, default=1000)
+    stream_parser.set_defaults(func=bench_predict_stream)
+
+    db_parser = subparsers.add_parser("db-indexes", help="Latency truy vấn (location, timestamp) trước/sau index, dữ liệu lớn")
+    db_parser.add_argument("--dsn", required=True, help="Chuỗi kết nối tới PostgreSQL dùng riêng cho benchmark")
+    db_parser.add_argument("--rows", type=int, default=5_000_000)
+    db_parser.add_argument("--locations", type=int, default=50)
+    db_parser.add_argument("--repeats", type=int, default=200)
+    db_parser.add_argument("--skip-seed", action="store_true")
+    db_parser.set_defaults(func=bench_db_indexes)
+
+    hourly_parser = subparsers.add_parser("forecast-hourly", help="Gộp dự báo theo giờ: pandas cũ vs NumPy")
+    hourly_parser.add_argument("--days", type=int, default=7)
+    hourly_parser.add_argument("--runs", type=int, default=20)
+    hourly_parser.set_defaults(func=bench_forecast_hourly)
+
+    tf_parser = subparsers.add_parser("time-features", help="Đặc trưng thời gian 672 bước: từng bước vs vector hóa")
+    tf_parser.add_argument("--days", type=int, default=7)
+    tf_parser.add_argument("--locations", type=int, nargs="+", default=[1, 64])
+    tf_parser.add_argument("--runs", type=int, default=100)
+    tf_parser.set_defaults(func=bench_time_features)
+
+    backends_parser = subparsers.add_parser("inference-backends",
+                                            help="Parity, latency và RSS của backend keras/tflite/onnx/numpy")
+    backends_parser.add_argument("--backends", nargs="+", choices=["keras", "tflite", "onnx", "numpy"],
+                                 default=["keras", "tflite", "onnx", "numpy"])
+    backends_parser.add_argument("--atol", type=float, default=1e-4)
+    backends_parser.add_argument("--rollout-atol", type=float, default=1e-2, help="Sai số cho phép (°C) sau 7 ngày dự báo")
+    backends_parser.add_argument("--rollout-windows", type=int, default=8)
+    backends_parser.add_argument("--days", type=int, default=7)
+    backends_parser.add_argument("--runs", type=int, default=50)
+    backends_parser.set_defaults(func=bench_inference_backends)
+
+    eval_parser = subparsers.add_parser("forecast-eval",
+                                        help="Dự báo autoregressive vs direct: MAE/RMSE theo thời gian dự báo và latency")
+    eval_parser.add_argument("--direct-model", default="modelLSTM_direct.keras")
+    eval_parser.add_argument("--backend", choices=["keras", "tflite", "onnx", "numpy"], default="keras")
+    eval_parser.add_argument("--days", type=int, default=7)
+    eval_parser.add_argument("--stride", type=int, default=96, help="Khoảng cách (số bước 15 phút) giữa hai mốc dự báo")
+    eval_parser.add_argument("--runs", type=int, default=3)
+    eval_parser.add_argument("--per-step-csv", default=None, help="Ghi MAE/RMSE theo từng bước ra CSV")
+    eval_parser.add_argument("--allow-unverified", action="store_true",
+                             help="Vẫn đánh giá mô hình không có manifest (kết quả được đánh dấu *)")
+    eval_parser.set_defaults(func=bench_forecast_eval)
+
+    startup_parser = subparsers.add_parser("startup", help="Thời gian import và khởi động mqtt_subscriber_v3")
+    startup_parser.add_argument("--modes", nargs="+", choices=list(STARTUP_ACTIONS), default=["import", "models"])
+    startup_parser.add_argument("--runs", type=int, default=3)
+    startup_parser.add_argument("--timeout", type=float, default=600)
+    startup_parser.set_defaults(func=bench_startup)
+
+    wa_parser = subparsers.add_parser("write-amplification",
+                                      help="Số dòng/index/WAL mỗi bản tin: bảng riêng vs view trên air_quality_data")
+    wa_parser.add_argument("--dsn", required=True, help="Chuỗi kết nối tới PostgreSQL dùng riêng cho benchmark")
+    wa_parser.add_argument("--messages", type=int, default=20000)
+    wa_parser.add_argument("--batch-size", type=int, default=100)
+    wa_parser.set_defaults(func=bench_write_amplification)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
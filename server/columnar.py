@@ -0,0 +1,155 @@
+"""
+Định dạng response dạng cột cho app di động / dashboard, chọn theo header Accept.
+
+Các dòng [timestamp, location, value] của một location được gom thành một series:
+location ghi một lần, timestamp là mảng int64 mili giây epoch (UTC, timestamp không có múi
+giờ được coi là UTC) mã hóa delta (phần tử đầu là giá trị tuyệt đối, giải mã bằng tổng
+tích lũy), value là mảng float32 (NaN khi không có dữ liệu).
+
+- msgpack (application/msgpack): {"timestamp_unit": "ms", ..., "series": [{"location",
+  "metric" (nếu có), "timestamps": bytes int64 little-endian, "values": bytes float32
+  little-endian}]}.
+- arrow (application/vnd.apache.arrow.stream): một record batch IPC với các cột location và
+  metric (dictionary), timestamp (int64, delta trong từng series), value (float32); các
+  trường khác nằm trong metadata của schema.
+
+msgpack / pyarrow là tùy chọn: định dạng nào chưa cài thì không được chọn khi thương lượng.
+"""
+import importlib.util
+from collections import namedtuple
+
+import numpy as np
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_FORMATS = {
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/vnd.apache.arrow.file": "arrow",
+}
+FORMAT_MODULES = {"msgpack": "msgpack", "arrow": "pyarrow"}
+AVAILABLE_FORMATS = {fmt for fmt, module in FORMAT_MODULES.items() if importlib.util.find_spec(module)}
+
+Series = namedtuple("Series", ["location", "metric", "timestamps", "values"])
+
+
+def negotiate_format(accept):
+    """
+    Chọn "json", "msgpack" hoặc "arrow" theo header Accept (trọng số q, cùng q thì loại
+    được liệt kê cụ thể và đứng trước thắng). Không có Accept hoặc chỉ có */* -> "json".
+    """
+    if not accept:
+        return "json"
+    best, best_rank = "json", None
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        media_type = media_type.lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        if media_type == JSON_MEDIA_TYPE:
+            fmt, specific = "json", True
+        elif media_type in ("*/*", "application/*"):
+            fmt, specific = "json", False
+        else:
+            fmt = MEDIA_TYPE_ALIASES.get(media_type) or next(
+                (name for name, value in COLUMNAR_FORMATS.items() if value == media_type), None)
+            if fmt not in AVAILABLE_FORMATS:
+                continue
+            specific = True
+        rank = (q, specific, -position)
+        if best_rank is None or rank > best_rank:
+            best, best_rank = fmt, rank
+    return best
+
+
+def epoch_milliseconds(timestamps):
+    """Danh sách datetime không có múi giờ (coi là UTC) -> mảng int64 mili giây epoch"""
+    return np.asarray(timestamps, dtype="datetime64[ms]").astype(np.int64)
+
+
+def delta_encode(values):
+    deltas = np.empty_like(values)
+    if len(values):
+        deltas[0] = values[0]
+        np.subtract(values[1:], values[:-1], out=deltas[1:])
+    return deltas
+
+
+def build_series(rows, metric=None, value_index=2):
+    """
+    Gom các dòng [timestamp, location, ..., value] liên tiếp cùng location thành Series
+    (giữ nguyên thứ tự dòng trong mỗi series).
+    """
+    series = []
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i][1] != rows[start][1]:
+            chunk = rows[start:i]
+            timestamps = epoch_milliseconds([row[0] for row in chunk])
+            values = np.array([row[value_index] for row in chunk], dtype=np.float64)  # None -> NaN
+            series.append(Series(rows[start][1], metric, delta_encode(timestamps), values.astype(np.float32)))
+            start = i
+    return series
+
+
+def encode_msgpack(series, meta):
+    import msgpack
+
+    payload = {"timestamp_unit": "ms", **(meta or {}), "series": []}
+    for item in series:
+        entry = {"location": item.location}
+        if item.metric is not None:
+            entry["metric"] = item.metric
+        entry["timestamps"] = item.timestamps.astype("<i8").tobytes()
+        entry["values"] = item.values.astype("<f4").tobytes()
+        payload["series"].append(entry)
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def dictionary_column(labels, counts):
+    """Cột dictionary của Arrow: mỗi nhãn lưu một lần, mỗi dòng chỉ là chỉ số int32"""
+    import pyarrow as pa
+
+    index = {label: i for i, label in enumerate(dict.fromkeys(labels))}
+    indices = np.repeat(np.array([index[label] for label in labels], dtype=np.int32), counts)
+    return pa.DictionaryArray.from_arrays(pa.array(indices), pa.array(list(index), type=pa.string()))
+
+
+def encode_arrow(series, meta):
+    import pyarrow as pa
+
+    counts = [len(item.values) for item in series]
+    columns = {"location": dictionary_column([item.location for item in series], counts)}
+    if any(item.metric is not None for item in series):
+        columns["metric"] = dictionary_column([item.metric or "" for item in series], counts)
+    columns["timestamp"] = pa.array(np.concatenate([item.timestamps for item in series]) if series
+                                    else np.empty(0, dtype=np.int64))
+    columns["value"] = pa.array(np.concatenate([item.values for item in series]) if series
+                                else np.empty(0, dtype=np.float32))
+
+    metadata = {"timestamp_unit": "ms", "timestamp_encoding": "delta_per_series",
+                **{key: str(value) for key, value in (meta or {}).items()}}
+    batch = pa.record_batch(list(columns.values()), names=list(columns)).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {"msgpack": encode_msgpack, "arrow": encode_arrow}
+
+
+def encode_columnar(series, fmt, meta=None):
+    """Bytes của danh sách Series theo định dạng fmt; meta là các trường vô hướng kèm theo"""
+    return ENCODERS[fmt](series, meta)
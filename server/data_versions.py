@@ -0,0 +1,85 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+VERSION_KINDS = ("ingest", "forecast")
+
+
+class DataVersions:
+    """
+    Phiên bản dữ liệu theo location trong bộ nhớ, dùng làm ETag / Last-Modified cho conditional GET.
+
+    Mỗi location có số lần ingest và số thế hệ dự báo (tăng theo NOTIFY của subscriber) cùng thời
+    điểm thay đổi gần nhất; location None (truy vấn không lọc) tăng theo mọi location. Khi có thể
+    đã bỏ lỡ thông báo (mất kết nối LISTEN), reset() đổi mã phiên nên mọi ETag cũ đều hết hiệu lực.
+    ETag còn chứa chỉ số khoảng max_age_seconds để dữ liệu thay đổi mà không có NOTIFY vẫn được
+    tải lại sau tối đa max_age_seconds. Mỗi process API có mã phiên riêng.
+    """
+
+    def __init__(self, max_age_seconds=3600):
+        self.max_age_seconds = max_age_seconds
+        self.versions = {}  # (kind, location) -> (số lần thay đổi, thời điểm thay đổi)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.session = secrets.token_hex(4)
+            self.reset_at = datetime.now(timezone.utc).replace(microsecond=0)
+            self.versions.clear()
+
+    def bump(self, kind, location):
+        """Ghi nhận dữ liệu mới loại kind ("ingest" / "forecast") của location"""
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self.lock:
+            for loc in {location, None}:
+                count, _ = self.versions.get((kind, loc), (0, None))
+                self.versions[(kind, loc)] = (count + 1, now)
+
+    def validators(self, kinds, location, variant=""):
+        """
+        Returns:
+            (etag, last_modified): ETag yếu (chấp nhận cả bản nén) và thời điểm UTC thay đổi gần nhất
+            của các kind cho location; variant phân biệt các biểu diễn khác nhau (định dạng response).
+        """
+        with self.lock:
+            entries = [self.versions.get((kind, location), (0, None)) for kind in kinds]
+            session = self.session
+            last_modified = max([changed for _, changed in entries if changed] + [self.reset_at])
+        period = int(time.time() // self.max_age_seconds)
+        counts = ".".join(str(count) for count, _ in entries)
+        return f'W/"{session}-{period}-{counts}{"-" + variant if variant else ""}"', last_modified
+
+
+def etag_matches(if_none_match, etag):
+    """So sánh yếu theo RFC 9110: bỏ tiền tố W/ ở cả hai phía; "*" khớp mọi ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def is_not_modified(headers, etag, last_modified):
+    """
+    True khi request (headers) có validator khớp với phiên bản hiện tại: If-None-Match được ưu
+    tiên; chỉ khi không có mới xét If-Modified-Since.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def http_date(value):
+    return format_datetime(value, usegmt=True)
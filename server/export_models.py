@@ -0,0 +1,87 @@
+"""
+Chuyển modelDNN.keras và modelLSTM.keras sang TFLite / ONNX cho inference_backends.py.
+
+Chạy từ thư mục server:
+    python export_models.py                       # TFLite
+    python export_models.py --formats tflite onnx # cần thêm tf2onnx
+
+Kết quả được ghi vào exported_models/<tên mô hình>.<định dạng>; chọn backend trong
+mqtt_subscriber_v3.py bằng INFERENCE_BACKEND.
+"""
+import argparse
+import os
+
+from inference_backends import EXPORT_DIR, exported_model_path
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS = ["modelDNN.keras", "modelLSTM.keras"]
+
+
+def inference_function(model, batch_size=None):
+    """tf.function suy luận (mặc định với chiều batch động), dùng chung cho cả hai định dạng"""
+    import tensorflow as tf
+
+    input_shape = tuple(int(d) for d in model.input_shape[1:])
+    return tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec(shape=(batch_size, *input_shape), dtype=tf.float32, name="input")],
+    )
+
+
+def convert_tflite(model, batch_size=None):
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    # Trọng số phải được đóng băng thành hằng số; nếu không, file .tflite đọc biến Keras qua
+    # READ_VARIABLE chưa được khởi tạo và mọi đầu ra là NaN
+    concrete = convert_variables_to_constants_v2(inference_function(model, batch_size).get_concrete_function())
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete])
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+def export_tflite(model, path):
+    try:
+        content = convert_tflite(model)
+    except Exception as e:
+        # LSTM chỉ hạ được về op builtin (UNIDIRECTIONAL_SEQUENCE_LSTM) khi batch cố định; khi đó
+        # TFLiteBackend chạy từng dòng. SELECT_TF_OPS không dùng được vì tflite_runtime không có Flex delegate
+        print(f"[WARNING] Không chuyển được với batch động ({str(e).splitlines()[0]}), dùng batch cố định 1")
+        content = convert_tflite(model, batch_size=1)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def export_onnx(model, path, opset=13):
+    import tf2onnx
+
+    function = inference_function(model)
+    tf2onnx.convert.from_function(function, input_signature=function.input_signature, opset=opset,
+                                  output_path=path)
+
+
+EXPORTERS = {
+    "tflite": export_tflite,
+    "onnx": export_onnx,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export mô hình Keras sang TFLite / ONNX")
+    parser.add_argument("--formats", nargs="+", choices=list(EXPORTERS), default=["tflite"])
+    parser.add_argument("--models", nargs="+", default=MODELS)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    os.makedirs(os.path.join(SERVER_DIR, EXPORT_DIR), exist_ok=True)
+    for name in args.models:
+        model = tf.keras.models.load_model(os.path.join(SERVER_DIR, name))
+        for backend in args.formats:
+            path = exported_model_path(os.path.join(SERVER_DIR, name), backend)
+            EXPORTERS[backend](model, path)
+            print(f"[INFO] {name} -> {os.path.relpath(path, SERVER_DIR)} ({os.path.getsize(path) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
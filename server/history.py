@@ -0,0 +1,121 @@
+"""
+Truy vấn lịch sử theo khoảng thời gian cho biểu đồ, được rút gọn về số điểm cố định.
+
+- bucket: chia [start, end] thành tối đa `points` ô bằng nhau và lấy trung bình mỗi ô
+  trong PostgreSQL. Ô từ một giờ trở lên đọc bảng tổng hợp air_quality_hourly /
+  air_quality_daily (partitioning.refresh_rollups) thay vì dữ liệu thô, cộng với dữ
+  liệu thô sau bucket tổng hợp mới nhất (có thể chưa đủ) của location.
+- lttb: lấy các ô nhỏ hơn (LTTB_OVERSAMPLE lần số điểm) theo cách trên rồi chọn
+  `points` điểm bằng Largest-Triangle-Three-Buckets để giữ hình dạng (đỉnh, đáy).
+
+Số dòng đọc từ DB bị chặn theo độ rộng khoảng chia cho độ phân giải của bảng nguồn,
+nên thời gian trả lời không tăng tuyến tính theo số dòng thô.
+"""
+import numpy as np
+
+HISTORY_METRICS = ("temperature", "humidity", "pm25", "pm10", "no2", "so2", "co")
+HISTORY_METHODS = ("bucket", "lttb")
+LTTB_OVERSAMPLE = 8
+
+# Bảng tổng hợp (tên, độ phân giải giây), từ thô nhất đến mịn nhất
+ROLLUP_SOURCES = [("air_quality_daily", 86400), ("air_quality_hourly", 3600)]
+RAW_SOURCE = "air_quality_data"
+
+
+def plan_buckets(start, end, points):
+    """
+    Chọn bảng nguồn và độ rộng ô cho khoảng [start, end] với tối đa `points` ô.
+
+    Returns:
+        (source, bucket_seconds): source là tên bảng tổng hợp hoặc None (dữ liệu thô);
+        bucket_seconds là số nguyên, bội số của độ phân giải bảng nguồn.
+    """
+    range_seconds = max(int((end - start).total_seconds()), 0)
+    # range / bucket_seconds < points nên chỉ số ô luôn nhỏ hơn points, kể cả khi timestamp = end
+    bucket_seconds = range_seconds // points + 1
+    for table, resolution in ROLLUP_SOURCES:
+        if bucket_seconds >= resolution:
+            return table, -(-bucket_seconds // resolution) * resolution
+    return None, bucket_seconds
+
+
+def bucket_query(metrics, source):
+    """
+    Câu SQL (tham số psycopg location, start, end, width) trả về các dòng
+    (bucket_start, giá trị trung bình của từng metric) theo thứ tự thời gian.
+    """
+    columns = ", ".join(metrics)
+    if source is None:
+        rows = f"""
+            SELECT timestamp AS ts, 1 AS n, {columns} FROM {RAW_SOURCE}
+            WHERE location = %(location)s AND timestamp >= %(start)s AND timestamp <= %(end)s
+        """
+    else:
+        # Bucket tổng hợp mới nhất có thể chưa đủ dữ liệu: từ đó trở đi đọc dữ liệu thô
+        cutoff = f"(SELECT COALESCE(max(bucket), '-infinity') FROM {source} WHERE location = %(location)s)"
+        rows = f"""
+            SELECT bucket AS ts, samples AS n, {columns} FROM {source}
+            WHERE location = %(location)s AND bucket >= %(start)s AND bucket <= %(end)s AND bucket < {cutoff}
+            UNION ALL
+            SELECT timestamp, 1, {columns} FROM {RAW_SOURCE}
+            WHERE location = %(location)s AND timestamp >= GREATEST(%(start)s, {cutoff}) AND timestamp <= %(end)s
+        """
+    averages = ", ".join(
+        f"sum({m} * n) / NULLIF(sum(CASE WHEN {m} IS NOT NULL THEN n END), 0)" for m in metrics
+    )
+    return f"""
+        SELECT %(start)s + b * make_interval(secs => %(width)s::float8) AS bucket, {averages}
+        FROM (
+            SELECT floor(extract(epoch FROM ts - %(start)s) / %(width)s)::bigint AS b, n, {columns}
+            FROM ({rows}) s
+        ) r
+        GROUP BY b
+        ORDER BY b
+    """
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: chỉ số của n_out điểm giữ hình dạng chuỗi (x tăng dần).
+
+    Điểm đầu và cuối luôn được giữ; mỗi ô ở giữa chọn điểm tạo tam giác lớn nhất với
+    điểm đã chọn ở ô trước và điểm trung bình của ô sau.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n < 3:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:n_out]
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(timestamps, values, points, method):
+    """
+    Danh sách [timestamp, giá trị làm tròn 2 chữ số] của một metric, bỏ các ô không có dữ liệu.
+
+    Parameters:
+        timestamps: Danh sách datetime đầu mỗi ô.
+        values: Giá trị trung bình của metric (None nếu ô không có dữ liệu).
+    """
+    keep = [i for i, value in enumerate(values) if value is not None]
+    if method == "lttb" and len(keep) > points:
+        x = np.array([timestamps[i].timestamp() for i in keep])
+        y = np.array([values[i] for i in keep], dtype=np.float64)
+        keep = [keep[i] for i in lttb(x, y, points)]
+    return [[timestamps[i], round(float(values[i]), 2)] for i in keep]
@@ -0,0 +1,172 @@
+"""
+Các backend suy luận cho modelDNN / modelLSTM.
+
+    keras:  mô hình .keras gốc, gọi qua tf.function (cần TensorFlow đầy đủ)
+    tflite: mô hình .tflite do export_models.py tạo, chạy bằng tflite_runtime
+            (hoặc tf.lite nếu không có tflite_runtime)
+    onnx:   mô hình .onnx do export_models.py tạo, chạy bằng onnxruntime
+    numpy:  trọng số đọc từ file .keras gốc, chạy bằng NumPy (numpy_inference.py, cần h5py)
+
+Mỗi backend là một callable nhận mảng float32 (batch, *input_shape) và trả về
+mảng numpy (batch, số đầu ra).
+"""
+import os
+import threading
+
+import numpy as np
+
+INFERENCE_BACKENDS = ("keras", "tflite", "onnx", "numpy")
+EXPORT_DIR = "exported_models"
+
+
+class InferenceBackend:
+    name = None
+    input_shape = None  # Kích thước đầu vào không gồm chiều batch
+
+    def __call__(self, x):
+        raise NotImplementedError
+
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, model, device="/CPU:0"):
+        import tensorflow as tf
+
+        self.model = model
+        self.device = device
+        self.input_shape = tuple(int(d) for d in model.input_shape[1:])
+        self._tf = tf
+        self._infer = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None, *self.input_shape), dtype=tf.float32)],
+        )
+
+    @classmethod
+    def load(cls, path):
+        import tensorflow as tf
+        return cls(tf.keras.models.load_model(path))
+
+    def __call__(self, x):
+        with self._tf.device(self.device):
+            return self._infer(np.asarray(x, dtype=np.float32)).numpy()
+
+
+def _tflite_interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    name = "tflite"
+
+    def __init__(self, path, num_threads=1):
+        self.interpreter = _tflite_interpreter_class()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        self.input_index = input_details["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.input_shape = tuple(int(d) for d in input_details["shape"][1:])
+        self.batch_size = int(input_details["shape"][0])
+        # Mô hình export với batch cố định (LSTM, xem export_models.py) không đổi được kích thước batch
+        self.dynamic_batch = int(input_details.get("shape_signature", input_details["shape"])[0]) == -1
+        # Interpreter không an toàn giữa các thread
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    def __call__(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        with self.lock:
+            if not self.dynamic_batch:
+                return np.concatenate([self._invoke(x[start:start + self.batch_size])
+                                       for start in range(0, len(x), self.batch_size)])
+            if x.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, x.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = x.shape[0]
+            return self._invoke(x)
+
+    def _invoke(self, x):
+        self.interpreter.set_tensor(self.input_index, x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class ONNXBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(int(d) for d in model_input.shape[1:])
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    def __call__(self, x):
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(x, dtype=np.float32)})[0]
+
+
+class NumpyBackend(InferenceBackend):
+    name = "numpy"
+
+    def __init__(self, model):
+        self.model = model
+        self.input_shape = model.input_shape
+        # Buffer trạng thái của mô hình được dùng lại giữa các lần gọi
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        from numpy_inference import NumpySequentialModel
+        return cls(NumpySequentialModel.load(path))
+
+    def __call__(self, x):
+        with self.lock:
+            return self.model(x)
+
+
+BACKEND_CLASSES = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+    "numpy": NumpyBackend,
+}
+
+
+def exported_model_path(keras_path, backend, export_dir=EXPORT_DIR):
+    """Đường dẫn mô hình của backend: file .keras gốc, hoặc <export_dir>/<tên>.tflite|.onnx cạnh nó"""
+    if backend in ("keras", "numpy"):
+        return keras_path
+    stem = os.path.splitext(os.path.basename(keras_path))[0]
+    return os.path.join(os.path.dirname(keras_path), export_dir, f"{stem}.{backend}")
+
+
+def load_backend(backend, keras_path, export_dir=EXPORT_DIR):
+    """Tải mô hình tương ứng với keras_path bằng backend đã chọn"""
+    if backend not in BACKEND_CLASSES:
+        raise ValueError(f"Backend không hợp lệ: {backend} (chọn một trong {INFERENCE_BACKENDS})")
+    path = exported_model_path(keras_path, backend, export_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Không tìm thấy {path}; chạy python export_models.py để tạo mô hình {backend}")
+    return BACKEND_CLASSES[backend].load(path)
+
+
+def as_backend(model, device="/CPU:0"):
+    """Dùng trực tiếp nếu model đã là backend, ngược lại coi là mô hình Keras"""
+    if isinstance(model, InferenceBackend):
+        return model
+    return KerasBackend(model, device=device)
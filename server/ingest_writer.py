@@ -0,0 +1,245 @@
+import csv
+import io
+import threading
+import time
+import traceback
+
+
+MAX_RETRY_DELAY = 30.0  # Giây chờ tối đa giữa hai lần thử lại khi flush lỗi liên tiếp
+
+
+def is_data_error(error):
+    """Lỗi do nội dung dòng (giá trị sai kiểu, vi phạm ràng buộc): thử lại nguyên lô cũng không thành công"""
+    import psycopg2
+    return isinstance(error, (psycopg2.DataError, psycopg2.IntegrityError))
+
+
+def split_batch(rows_by_table):
+    """Chia đôi lô (mỗi bảng chia đôi danh sách dòng), giữ thứ tự dòng"""
+    first, second = {}, {}
+    for table, rows in rows_by_table.items():
+        half = len(rows) // 2
+        if rows[:half]:
+            first[table] = rows[:half]
+        if rows[half:]:
+            second[table] = rows[half:]
+    if not first:
+        # Chỉ còn một dòng ở mỗi bảng: tách theo bảng
+        tables = list(second)
+        first = {table: second.pop(table) for table in tables[:len(tables) // 2]}
+    return first, second
+
+
+def count_rows(rows_by_table):
+    return sum(len(rows) for rows in rows_by_table.values())
+
+
+class BulkIngestWriter:
+    """
+    Ghi dữ liệu cảm biến theo kiểu write-behind.
+
+    Các dòng được gom trong bộ nhớ theo từng bảng và được ghi định kỳ (hoặc khi
+    đủ max_rows) bằng PostgreSQL COPY FROM STDIN, tất cả các bảng trong một
+    transaction cho mỗi lần flush. Nếu COPY thất bại, riêng lần flush đó được thử
+    lại bằng INSERT nhiều dòng (psycopg2.extras.execute_values); lần sau vẫn dùng COPY.
+
+    Khi lỗi:
+    - lỗi dữ liệu (is_data_error): lô được chia đôi đến khi tìm ra dòng lỗi; chỉ dòng đó bị bỏ.
+    - lỗi khác (mất kết nối, DB không sẵn sàng): các dòng chưa ghi được đưa lại vào đầu bộ
+      đệm và thử lại sau thời gian chờ tăng dần (tối đa MAX_RETRY_DELAY); mỗi bảng giữ tối
+      đa max_pending_rows dòng, dòng cũ nhất bị bỏ khi vượt quá.
+    """
+
+    def __init__(self, engine, table_columns, flush_interval=1.0, max_rows=5000, on_flush=None, on_error=None,
+                 notifications=None, max_pending_rows=None):
+        """
+        Parameters:
+            engine: SQLAlchemy engine (driver psycopg2).
+            table_columns: Dict tên bảng -> tuple tên cột (không gồm id).
+            flush_interval: Số giây tối đa giữa hai lần flush.
+            max_rows: Số dòng đang chờ để flush sớm.
+            on_flush: Callback on_flush(rows_by_table, duration) sau khi commit thành công.
+            on_error: Callback on_error(exception) khi flush thất bại, một dòng bị bỏ, on_flush
+                      lỗi hoặc thread ghi gặp lỗi ngoài dự kiến.
+            notifications: Hàm notifications(rows_by_table) trả về các cặp (channel, payload)
+                           được gửi bằng pg_notify trong cùng transaction với dữ liệu.
+            max_pending_rows: Số dòng tối đa mỗi bảng được giữ trong bộ đệm khi DB lỗi
+                              (mặc định 20 * max_rows).
+        """
+        self.engine = engine
+        self.table_columns = dict(table_columns)
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_pending_rows = max_pending_rows or 20 * max_rows
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.notifications = notifications
+        self.pending = {table: [] for table in self.table_columns}
+        self.pending_rows = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        self.copy_fallbacks = 0
+        self.dropped_rows = 0
+        self.thread = None
+
+    def add(self, table, row):
+        """Thêm một dòng (tuple theo thứ tự table_columns[table]) vào bộ đệm"""
+        with self.lock:
+            self.pending[table].append(row)
+            self.pending_rows += 1
+            if self.pending_rows >= self.max_rows:
+                self.wakeup.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="ingest-writer")
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                # Đang chờ thử lại sau lỗi: không flush sớm dù bộ đệm đầy
+                delay = self.retry_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.flush()
+            except Exception as e:
+                # Lỗi ngoài dự kiến không được làm dừng thread: nếu không, mọi lần ingest sau đó chỉ đầy bộ đệm
+                print(f"[ERROR] Lỗi trong thread ghi ingest: {e}")
+                traceback.print_exc()
+                self._report_error(e)
+
+    def _report_error(self, error):
+        if self.on_error:
+            try:
+                self.on_error(error)
+            except Exception as e:
+                print(f"[ERROR] Callback on_error của ingest writer lỗi: {e}")
+
+    def _take_pending(self):
+        with self.lock:
+            rows_by_table = {table: rows for table, rows in self.pending.items() if rows}
+            self.pending = {table: [] for table in self.table_columns}
+            self.pending_rows = 0
+        return rows_by_table
+
+    def _requeue(self, batches):
+        """Đưa các lô chưa ghi trở lại đầu bộ đệm (trước các dòng mới đến), giữ thứ tự"""
+        with self.lock:
+            for table in self.table_columns:
+                returned = [row for batch in batches for row in batch.get(table, [])]
+                rows = returned + self.pending[table]
+                overflow = len(rows) - self.max_pending_rows
+                if overflow > 0:
+                    print(f"[ERROR] Bộ đệm ingest của {table} vượt {self.max_pending_rows} dòng, "
+                          f"bỏ {overflow} dòng cũ nhất")
+                    rows = rows[overflow:]
+                    self.dropped_rows += overflow
+                self.pending_rows += len(rows) - len(self.pending[table])
+                self.pending[table] = rows
+
+    def flush(self):
+        """Ghi toàn bộ dòng đang chờ; trả về số dòng đã ghi (dòng chưa ghi được sẽ được thử lại)"""
+        with self.flush_lock:
+            rows_by_table = self._take_pending()
+            if not rows_by_table:
+                return 0
+
+            start_time = time.time()
+            written = {}
+            work = [rows_by_table]  # stack: lô ở cuối được ghi trước
+            while work:
+                batch = work.pop()
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    if is_data_error(e) and count_rows(batch) > 1:
+                        first, second = split_batch(batch)
+                        work += [second, first]
+                        continue
+                    if is_data_error(e):
+                        (table, rows), = batch.items()
+                        print(f"[ERROR] Bỏ dòng lỗi của {table}: {rows[0]!r} ({e})")
+                        self.dropped_rows += 1
+                        self._report_error(e)
+                        continue
+                    remaining = [batch] + work[::-1]
+                    self._requeue(remaining)
+                    self.consecutive_failures += 1
+                    retry_delay = min(self.flush_interval * 2 ** self.consecutive_failures, MAX_RETRY_DELAY)
+                    self.retry_at = time.monotonic() + retry_delay
+                    print(f"[ERROR] Flush ingest thất bại ({sum(count_rows(b) for b in remaining)} dòng giữ lại, "
+                          f"thử lại sau {retry_delay:.1f}s): {e}")
+                    self._report_error(e)
+                    break
+                else:
+                    for table, rows in batch.items():
+                        written.setdefault(table, []).extend(rows)
+            else:
+                self.consecutive_failures = 0
+                self.retry_at = 0.0
+
+            if written and self.on_flush:
+                # Dữ liệu đã commit: lỗi của callback chỉ được ghi log, không ảnh hưởng tới các dòng đã ghi
+                try:
+                    self.on_flush(written, time.time() - start_time)
+                except Exception as e:
+                    print(f"[ERROR] Callback on_flush của ingest writer lỗi: {e}")
+                    traceback.print_exc()
+                    self._report_error(e)
+            return count_rows(written)
+
+    def _write(self, rows_by_table):
+        """Ghi một lô bằng COPY; nếu thất bại thì thử lại chính lô đó bằng INSERT trên kết nối mới"""
+        try:
+            self._write_with(rows_by_table, self._copy_rows)
+            return
+        except Exception as e:
+            self.copy_fallbacks += 1
+            print(f"[WARNING] COPY thất bại, ghi lần này bằng INSERT nhiều dòng: {e}")
+        self._write_with(rows_by_table, self._insert_rows)
+
+    def _write_with(self, rows_by_table, write_table):
+        connection = self.engine.raw_connection()
+        try:
+            self._write_transaction(connection, rows_by_table, write_table)
+        except Exception:
+            # Kết nối có thể đã hỏng: không trả lại pool
+            connection.invalidate()
+            raise
+        finally:
+            connection.close()
+
+    def _write_transaction(self, connection, rows_by_table, write_table):
+        try:
+            cursor = connection.cursor()
+            for table, rows in rows_by_table.items():
+                write_table(cursor, table, self.table_columns[table], rows)
+            if self.notifications:
+                # NOTIFY chỉ được gửi tới listener khi transaction commit
+                for channel, payload in self.notifications(rows_by_table):
+                    cursor.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+            cursor.close()
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    @staticmethod
+    def _copy_rows(cursor, table, columns, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # None -> ô rỗng không đặt trong ngoặc kép, COPY CSV hiểu là NULL
+            writer.writerow(["" if value is None else value for value in row])
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    @staticmethod
+    def _insert_rows(cursor, table, columns, rows):
+        from psycopg2.extras import execute_values
+        execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=1000)
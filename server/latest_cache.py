@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LatestReadingsCache:
+    """
+    Cache trong bộ nhớ cho dữ liệu mới nhất theo location.
+
+    Khóa có dạng (kind, location); location None là truy vấn không lọc location.
+    Giới hạn bởi TTL và số mục tối đa (LRU). invalidate(location) tăng thế hệ
+    của location đó để kết quả của các lần tải đang chạy dở không ghi đè dữ
+    liệu mới hơn.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.generations = {}  # location -> số lần invalidate
+        self.epoch = 0  # tăng mỗi lần clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def generation(self, location):
+        with self.lock:
+            return self.epoch, self.generations.get(location, 0)
+
+    def put(self, key, value, generation=None):
+        """Lưu giá trị; bỏ qua nếu location đã bị invalidate kể từ khi bắt đầu tải (generation)"""
+        with self.lock:
+            if generation is not None and (self.epoch, self.generations.get(key[1], 0)) != generation:
+                return False
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    async def get_or_load(self, key, loader):
+        """Trả về giá trị trong cache, hoặc gọi loader() (coroutine) khi miss và lưu kết quả"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self.generation(key[1])
+        value = await loader()
+        self.put(key, value, generation)
+        return value
+
+    def invalidate(self, location, kinds=None):
+        """
+        Xóa các mục của location (và các mục không lọc location) thuộc các kind cho trước.
+
+        Returns:
+            Danh sách khóa đã bị xóa (để có thể tải lại ngay).
+        """
+        with self.lock:
+            self.invalidations += 1
+            for loc in {location, None}:
+                self.generations[loc] = self.generations.get(loc, 0) + 1
+            removed = [
+                key for key in self.entries
+                if key[1] in (location, None) and (kinds is None or key[0] in kinds)
+            ]
+            for key in removed:
+                del self.entries[key]
+            return removed
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.epoch += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,151 @@
+import numpy as np
+
+from inference_backends import as_backend
+from scaler_utils import scaler_affine
+from time_features import epoch_seconds, horizon_features
+
+
+def hourly_means(base_timestamp, predictions, time_step=15 * 60):
+    """
+    Trung bình theo giờ đồng hồ của chuỗi dự báo, giống resample("H").mean().
+
+    Bước dự báo thứ i ứng với base_timestamp + (i + 1) * time_step. Chuỗi được đệm NaN
+    cho khớp đầu giờ rồi reshape thành (số giờ, số bước mỗi giờ) để lấy nanmean.
+
+    Returns:
+        (hours, means): mảng datetime64[s] đầu mỗi giờ và mảng float64 giá trị trung bình.
+    """
+    if 3600 % time_step:
+        raise ValueError(f"time_step={time_step} không chia hết một giờ")
+    predictions = np.asarray(predictions, dtype=np.float64)
+    steps_per_hour = 3600 // time_step
+
+    first_second = int(round(float(epoch_seconds(base_timestamp)))) + time_step
+    first_hour = first_second - first_second % 3600
+    offset = (first_second - first_hour) // time_step
+
+    n_padded = -(-(offset + len(predictions)) // steps_per_hour) * steps_per_hour
+    padded = np.full(n_padded, np.nan)
+    padded[offset:offset + len(predictions)] = predictions
+    means = np.nanmean(padded.reshape(-1, steps_per_hour), axis=1)
+
+    hours = (first_hour + 3600 * np.arange(len(means), dtype=np.int64)).astype("datetime64[s]")
+    return hours, means
+
+
+class LSTMForecastEngine:
+    """
+    Dự báo nhiệt độ nhiều bước (autoregressive) bằng mô hình LSTM.
+
+    - Cửa sổ đầu vào được giữ trong ring buffer cấp phát sẵn (ghi đôi, nên
+      cửa sổ hiện tại luôn là một slice liên tục, không cần np.vstack).
+    - Mô hình được gọi qua một backend suy luận (Keras qua tf.function, TFLite hoặc ONNX)
+      thay vì model.predict.
+    - Đặc trưng sin/cos của toàn bộ chân trời dự báo được tính một lần.
+    - Nhiệt độ dự đoán được chuẩn hóa bằng phép tính affine thay vì scaler.transform.
+    """
+
+    def __init__(self, model, scaler, window_size=6, time_step=15 * 60, device="/CPU:0"):
+        """
+        Parameters:
+            model: Mô hình Keras hoặc một InferenceBackend (inference_backends.py).
+        """
+        # Backend Keras chỉ import TensorFlow khi được tạo; các hàm NumPy của module không cần đến nó
+        self.backend = as_backend(model, device=device)
+        self.window_size = window_size
+        self.time_step = time_step
+        self.n_features = int(self.backend.input_shape[-1])
+
+        scale, offset = scaler_affine(scaler)
+        self.temperature_scale = float(scale[0])
+        self.temperature_offset = float(offset[0])
+
+    def scale_temperature(self, temperature):
+        """Chuẩn hóa nhiệt độ (scalar hoặc mảng) giống scaler.transform."""
+        return np.asarray(temperature, dtype=np.float64) * self.temperature_scale + self.temperature_offset
+
+    def horizon_time_features(self, last_timestamps, n_steps):
+        """Đặc trưng thời gian float32 (N, n_steps, 4) cho toàn bộ chân trời dự báo"""
+        return horizon_features(last_timestamps, n_steps, self.time_step)
+
+    def forecast_batch(self, windows, last_timestamps, n_steps):
+        """
+        Dự báo n_steps bước cho nhiều cửa sổ cùng lúc.
+
+        Parameters:
+            windows: Mảng (N, window_size, n_features) đã chuẩn hóa.
+            last_timestamps: N timestamp của điểm cuối cùng trong mỗi cửa sổ.
+            n_steps: Số bước dự báo (mỗi bước cách nhau time_step giây).
+
+        Returns:
+            predictions: Mảng float64 (N, n_steps) nhiệt độ dự đoán (chưa chuẩn hóa).
+        """
+        windows = np.asarray(windows, dtype=np.float32)
+        n_windows, window_size = windows.shape[0], self.window_size
+        time_features = self.horizon_time_features(last_timestamps, n_steps)
+
+        # Ring buffer ghi đôi: ring[:, head:head + window_size] luôn là cửa sổ theo đúng thứ tự thời gian
+        ring = np.empty((n_windows, 2 * window_size, self.n_features), dtype=np.float32)
+        ring[:, :window_size] = windows
+        ring[:, window_size:] = windows
+        predictions = np.empty((n_windows, n_steps), dtype=np.float64)
+
+        for step in range(n_steps):
+            head = step % window_size
+            predicted = self.backend(ring[:, head:head + window_size])[:, 0]
+            predictions[:, step] = predicted
+
+            # Thay điểm cũ nhất bằng điểm vừa dự đoán (ở cả hai bản sao)
+            new_row = ring[:, head]
+            new_row[:, 0] = self.scale_temperature(predicted)
+            new_row[:, 1:] = time_features[:, step]
+            ring[:, head + window_size] = new_row
+
+        return predictions
+
+    def forecast(self, window, last_timestamp, n_steps):
+        """Dự báo cho một cửa sổ (window_size, n_features); trả về list nhiệt độ dự đoán."""
+        return self.forecast_batch(np.asarray(window)[None], [last_timestamp], n_steps)[0].tolist()
+
+
+class DirectForecastEngine(LSTMForecastEngine):
+    """
+    Dự báo bằng mô hình direct (training_pipeline.py --models direct): mỗi lần gọi mô hình trả về
+    horizon bước 15 phút liên tiếp thay vì một bước.
+
+    Nếu n_steps lớn hơn horizon, dự báo được ghép từ nhiều đoạn: window_size điểm cuối
+    của đoạn vừa dự báo trở thành cửa sổ đầu vào của đoạn tiếp theo. Với horizon = 96
+    (24 giờ), 7 ngày chỉ cần 7 lần gọi thay vì 672.
+    """
+
+    def __init__(self, model, scaler, window_size=6, time_step=15 * 60, device="/CPU:0"):
+        super().__init__(model, scaler, window_size=window_size, time_step=time_step, device=device)
+        # Số bước mỗi lần gọi = số đầu ra của mô hình
+        probe = np.zeros((1, *self.backend.input_shape), dtype=np.float32)
+        self.horizon = int(self.backend(probe).shape[-1])
+
+    def forecast_batch(self, windows, last_timestamps, n_steps):
+        windows = np.asarray(windows, dtype=np.float32)
+        n_windows, window_size = windows.shape[0], self.window_size
+        time_features = self.horizon_time_features(last_timestamps, n_steps)
+        predictions = np.empty((n_windows, n_steps), dtype=np.float64)
+
+        for start in range(0, n_steps, self.horizon):
+            stop = min(start + self.horizon, n_steps)
+            chunk = self.backend(windows)[:, :stop - start]
+            predictions[:, start:stop] = chunk
+            if stop < n_steps:
+                new_rows = np.empty((n_windows, stop - start, self.n_features), dtype=np.float32)
+                new_rows[..., 0] = self.scale_temperature(chunk)
+                new_rows[..., 1:] = time_features[:, start:stop]
+                windows = np.concatenate([windows, new_rows], axis=1)[:, -window_size:]
+
+        return predictions
+
+
+# Chế độ dự báo -> engine: "autoregressive" dùng modelLSTM.keras (một bước mỗi lần gọi),
+# "direct" dùng mô hình nhiều đầu ra do training_pipeline.py --models direct tạo
+FORECAST_ENGINES = {
+    "autoregressive": LSTMForecastEngine,
+    "direct": DirectForecastEngine,
+}
@@ -0,0 +1,120 @@
+import threading
+
+import numpy as np
+
+from scaler_utils import scaler_affine
+from time_features import naive_utc
+
+
+class _Window:
+    """Ring buffer ghi đôi (2W, F): cửa sổ hiện tại luôn là slice liên tục ring[head:head+W]"""
+
+    def __init__(self, window_size, n_features):
+        self.window_size = window_size
+        self.ring = np.zeros((2 * window_size, n_features), dtype=np.float64)
+        self.head = 0  # Vị trí ghi tiếp theo = dòng cũ nhất khi cửa sổ đã đầy
+        self.count = 0
+        self.last_timestamp = None
+
+    def push(self, timestamp, row):
+        # Bỏ qua mẫu đến muộn hoặc trùng thời điểm với mẫu mới nhất
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+        self.ring[self.head] = row
+        self.ring[self.head + self.window_size] = row
+        self.head = (self.head + 1) % self.window_size
+        self.count = min(self.count + 1, self.window_size)
+        self.last_timestamp = timestamp
+        return True
+
+    def current(self):
+        return self.ring[self.head:self.head + self.window_size].copy()
+
+
+class LSTMWindowStore:
+    """
+    Cửa sổ đầu vào LSTM (window_size dòng đặc trưng gần nhất) của từng location, giữ trong bộ nhớ.
+
+    Mỗi dòng là [nhiệt độ đã chuẩn hóa, day_sin, day_cos, year_sin, year_cos]; nhiệt độ được
+    chuẩn hóa một lần khi dòng được thêm vào, timestamp được giữ ở giờ UTC không múi giờ.
+    Location chưa có trong bộ nhớ được nạp từ DB (loader) khi khởi động hoặc lần đầu cần dự
+    báo; các dòng đến trong lúc đang nạp được giữ lại và gộp vào sau.
+    """
+
+    def __init__(self, scaler, loader, window_size=6):
+        """
+        Parameters:
+            scaler: Bộ chuẩn hóa nhiệt độ của mô hình LSTM.
+            loader: Hàm loader(locations) -> dict location -> danh sách dict (timestamp, temperature,
+                    day_sin, day_cos, year_sin, year_cos) theo thứ tự thời gian; locations None là tất cả.
+            window_size: Số bước thời gian của cửa sổ đầu vào.
+        """
+        scale, offset = scaler_affine(scaler)
+        self.temperature_scale = float(scale[0])
+        self.temperature_offset = float(offset[0])
+        self.loader = loader
+        self.window_size = window_size
+        self.buffers = {}  # location -> _Window
+        self.pending = {}  # location -> [(timestamp, row)] nhận được khi location chưa được nạp
+        self.lock = threading.Lock()
+
+    def feature_row(self, temperature, day_sin, day_cos, year_sin, year_cos):
+        return np.array([temperature * self.temperature_scale + self.temperature_offset,
+                         day_sin, day_cos, year_sin, year_cos], dtype=np.float64)
+
+    def append(self, location, timestamp, temperature, day_sin, day_cos, year_sin, year_cos):
+        """Thêm một mẫu mới (đã được ghi vào air_quality_predict) vào cửa sổ của location"""
+        row = self.feature_row(temperature, day_sin, day_cos, year_sin, year_cos)
+        # Timestamp từ DB không có múi giờ (UTC); so sánh với timestamp có múi giờ sẽ gây TypeError
+        timestamp = naive_utc(timestamp)
+        with self.lock:
+            window = self.buffers.get(location)
+            if window is not None:
+                window.push(timestamp, row)
+            else:
+                pending = self.pending.setdefault(location, [])
+                pending.append((timestamp, row))
+                del pending[:-self.window_size]
+
+    def warm(self, locations=None):
+        """Nạp cửa sổ từ DB cho các location (None: tất cả location có trong DB); trả về số location đã nạp"""
+        loaded = self.loader(locations)
+        with self.lock:
+            # Location được yêu cầu nhưng chưa có dữ liệu trong DB cũng được tạo cửa sổ (rỗng)
+            for location in set(loaded) | set(locations or []):
+                if location in self.buffers:
+                    continue
+                entries = loaded.get(location, [])
+                rows = [
+                    (naive_utc(entry['timestamp']), self.feature_row(entry['temperature'], entry['day_sin'], entry['day_cos'],
+                                                          entry['year_sin'], entry['year_cos']))
+                    for entry in entries
+                ]
+                rows.extend(self.pending.pop(location, []))
+                window = _Window(self.window_size, 5)
+                for timestamp, row in sorted(rows, key=lambda item: item[0]):
+                    window.push(timestamp, row)
+                self.buffers[location] = window
+        return len(loaded)
+
+    def windows(self, locations):
+        """
+        Returns:
+            Dict location -> (cửa sổ (window_size, 5) theo thứ tự thời gian, timestamp mới nhất).
+            Location có ít hơn window_size mẫu bị bỏ qua.
+        """
+        with self.lock:
+            cold = [location for location in locations if location not in self.buffers]
+        if cold:
+            self.warm(cold)
+
+        result = {}
+        with self.lock:
+            for location in locations:
+                window = self.buffers.get(location)
+                count = window.count if window is not None else len(self.pending.get(location, []))
+                if window is None or count < self.window_size:
+                    print(f"[WARNING] Chỉ có {count} mẫu dữ liệu có sẵn cho location {location}, cần ít nhất {self.window_size} mẫu để dự đoán LSTM.")
+                    continue
+                result[location] = (window.current(), window.last_timestamp)
+        return result
@@ -0,0 +1,105 @@
+"""
+Các bảng riêng theo thông số (temperature_data, humidity_data, ...) dưới dạng view
+trên air_quality_data, thay vì ghi mỗi bản tin thêm 7 lần.
+"""
+from sqlalchemy import text
+
+
+def per_metric_view_sql(table, column, source="air_quality_data"):
+    """View có cùng các cột (id, timestamp, location, value) với bảng riêng cũ"""
+    return f"CREATE OR REPLACE VIEW {table} AS SELECT id, timestamp, location, {column} AS value FROM {source}"
+
+
+def relation_kind(conn, name):
+    """pg_class.relkind của bảng/view ('r' bảng, 'p' bảng phân vùng, 'v' view) hoặc None"""
+    return conn.execute(text(
+        "SELECT c.relkind FROM pg_class c WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": name}).scalar()
+
+
+def count_missing_rows(conn, table, column, source="air_quality_data"):
+    """Số dòng (timestamp, location, value) của bảng riêng không có trong cột tương ứng của source"""
+    return conn.execute(text(f"""
+        SELECT count(*) FROM (
+            SELECT timestamp, location, value FROM {table}
+            EXCEPT ALL
+            SELECT timestamp, location, {column} FROM {source}
+        ) missing
+    """)).scalar()
+
+
+def convert_tables_to_views(engine, metrics, source="air_quality_data"):
+    """
+    Migration: thay các bảng riêng đang tồn tại bằng view trên source.
+
+    Các mốc (location, timestamp) chỉ có trong bảng riêng được bổ sung vào source,
+    sau đó mỗi bảng được kiểm tra từng dòng có mặt trong view tương ứng rồi mới bị
+    xóa. Tất cả chạy trong một transaction; nếu kiểm tra thất bại thì không có gì
+    thay đổi.
+
+    Parameters:
+        metrics: Danh sách (tên bảng, cột trong source).
+
+    Returns:
+        Danh sách bảng đã được chuyển thành view.
+    """
+    with engine.begin() as conn:
+        tables = [(table, column) for table, column in metrics if relation_kind(conn, table) in ("r", "p")]
+        if not tables:
+            return []
+
+        print(f"[INFO] Chuyển {len(tables)} bảng riêng thành view trên {source}...")
+        columns = [column for _, column in tables]
+        unioned = " UNION ALL ".join(
+            f"SELECT timestamp, location, '{column}' AS metric, value FROM {table}" for table, column in tables
+        )
+        pivoted = ", ".join(f"max(value) FILTER (WHERE metric = '{column}')" for column in columns)
+        backfilled = conn.execute(text(f"""
+            INSERT INTO {source} (timestamp, location, {', '.join(columns)})
+            SELECT timestamp, location, {pivoted}
+            FROM ({unioned}) m
+            WHERE timestamp IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM {source} d
+                WHERE d.timestamp = m.timestamp AND d.location IS NOT DISTINCT FROM m.location
+            )
+            GROUP BY timestamp, location
+        """)).rowcount
+        if backfilled:
+            print(f"[INFO] Đã bổ sung {backfilled} dòng vào {source} từ các bảng riêng")
+
+        for table, column in tables:
+            missing = count_missing_rows(conn, table, column, source)
+            if missing:
+                raise RuntimeError(f"{table}: {missing} dòng không khớp với {source}.{column}, hủy migration")
+
+        for table, column in tables:
+            conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text(per_metric_view_sql(table, column, source)))
+    return [table for table, _ in tables]
+
+
+def ensure_views(engine, metrics, source="air_quality_data"):
+    with engine.begin() as conn:
+        for table, column in metrics:
+            conn.execute(text(per_metric_view_sql(table, column, source)))
+
+
+def drop_views(engine, metrics):
+    """Xóa các view (khi quay lại chế độ ghi bảng riêng); trả về các (bảng, cột) đã xóa"""
+    dropped = []
+    with engine.begin() as conn:
+        for table, column in metrics:
+            if relation_kind(conn, table) == "v":
+                conn.execute(text(f"DROP VIEW {table}"))
+                dropped.append((table, column))
+    return dropped
+
+
+def backfill_tables(engine, metrics, source="air_quality_data"):
+    """Chép dữ liệu từ source vào các bảng riêng vừa được tạo lại"""
+    with engine.begin() as conn:
+        for table, column in metrics:
+            conn.execute(text(
+                f"INSERT INTO {table} (timestamp, location, value) "
+                f"SELECT timestamp, location, {column} FROM {source}"
+            ))
@@ -1,21 +1,38 @@
+import math
+import time
+IMPORT_STARTED_AT = time.perf_counter()  # Mốc đo thời gian từ lúc import module đến khi service sẵn sàng
+
 import pickle
 import paho.mqtt.client as mqtt
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-from sqlalchemy import create_engine, Column, Integer, Float, TIMESTAMP, String
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, Column, Integer, Float, TIMESTAMP, String, Index, func
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.sql import text
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-import gc
-import time
 import threading
+import queue
 from collections import deque
 import statistics
 import signal
 import sys
 
+from air_quality_classifier import FEATURE_NAMES, AirQualityClassifier
+from inference_backends import load_backend
+from ingest_writer import BulkIngestWriter
+from lstm_forecast import FORECAST_ENGINES, hourly_means
+from lstm_windows import LSTMWindowStore
+from metric_views import backfill_tables, convert_tables_to_views, drop_views, ensure_views
+from partitioning import (
+    drop_expired_partitions,
+    ensure_monthly_partitions,
+    migrate_to_partitioned,
+    refresh_rollups,
+)
+from time_features import naive_utc, sin_cos_features
+
 # Performance monitoring class
 class PerformanceMonitor:
     def __init__(self, max_history=100):
@@ -23,11 +40,19 @@ class PerformanceMonitor:
         self.processing_times = deque(maxlen=max_history)
         self.prediction_times = deque(maxlen=max_history)
         self.lstm_prediction_times = deque(maxlen=max_history)
-        self.db_save_times = deque(maxlen=max_history)
+        self.db_save_times = deque(maxlen=max_history)  # Thời gian mỗi lần flush ingest
+        self.rows_per_flush = deque(maxlen=max_history)
+        self.forecast_queue_wait_times = deque(maxlen=max_history)
         self.total_messages_processed = 0
         self.total_predictions_made = 0
         self.total_lstm_predictions = 0
         self.total_db_operations = 0
+        self.total_rows_written = 0
+        self.forecast_queue_depth = 0
+        self.max_forecast_queue_depth = 0
+        self.forecast_jobs_submitted = 0
+        self.forecast_jobs_dropped = 0
+        self.forecast_requests_coalesced = 0
         self.error_count = 0
         self.start_time = time.time()
         self.lock = threading.Lock()
@@ -37,20 +62,41 @@ class PerformanceMonitor:
             self.processing_times.append(duration)
             self.total_messages_processed += 1
     
-    def record_prediction_time(self, duration):
+    def record_prediction_time(self, duration, count=1):
         with self.lock:
             self.prediction_times.append(duration)
-            self.total_predictions_made += 1
+            self.total_predictions_made += count
     
     def record_lstm_prediction_time(self, duration):
         with self.lock:
             self.lstm_prediction_times.append(duration)
             self.total_lstm_predictions += 1
     
-    def record_db_save_time(self, duration):
+    def record_ingest_flush(self, duration, rows):
         with self.lock:
             self.db_save_times.append(duration)
+            self.rows_per_flush.append(rows)
             self.total_db_operations += 1
+            self.total_rows_written += rows
+    
+    def record_forecast_job_submitted(self, queue_depth):
+        with self.lock:
+            self.forecast_jobs_submitted += 1
+            self.forecast_queue_depth = queue_depth
+            self.max_forecast_queue_depth = max(self.max_forecast_queue_depth, queue_depth)
+
+    def record_forecast_job_started(self, wait_time, queue_depth):
+        with self.lock:
+            self.forecast_queue_wait_times.append(wait_time)
+            self.forecast_queue_depth = queue_depth
+
+    def record_forecast_job_dropped(self):
+        with self.lock:
+            self.forecast_jobs_dropped += 1
+
+    def record_forecast_coalesced(self):
+        with self.lock:
+            self.forecast_requests_coalesced += 1
     
     def record_error(self):
         with self.lock:
@@ -71,7 +117,8 @@ class PerformanceMonitor:
                 'timestamp': datetime.now().isoformat(),
                 'performance_stats': stats,
                 'system_resources': resources,
-                'alerts': alerts
+                'alerts': alerts,
+                'startup': service.readiness()
             }
             
             with open(filename, 'w') as f:
@@ -95,10 +142,16 @@ class PerformanceMonitor:
                 'total_predictions_made': self.total_predictions_made,
                 'total_lstm_predictions': self.total_lstm_predictions,
                 'total_db_operations': self.total_db_operations,
+                'total_rows_written': self.total_rows_written,
                 'error_count': self.error_count,
                 'error_rate': self.error_count / max(1, self.total_messages_processed) * 100,
                 'messages_per_hour': self.total_messages_processed / max(1, uptime) * 3600,
-                'predictions_per_hour': self.total_predictions_made / max(1, uptime) * 3600
+                'predictions_per_hour': self.total_predictions_made / max(1, uptime) * 3600,
+                'forecast_queue_depth': self.forecast_queue_depth,
+                'max_forecast_queue_depth': self.max_forecast_queue_depth,
+                'forecast_jobs_submitted': self.forecast_jobs_submitted,
+                'forecast_jobs_dropped': self.forecast_jobs_dropped,
+                'forecast_requests_coalesced': self.forecast_requests_coalesced
             }
             
             # Processing time stats
@@ -125,6 +178,13 @@ class PerformanceMonitor:
                 stats['avg_db_save_time'] = statistics.mean(self.db_save_times)
                 stats['max_db_save_time'] = max(self.db_save_times)
                 stats['min_db_save_time'] = min(self.db_save_times)
+                stats['avg_rows_per_flush'] = statistics.mean(self.rows_per_flush)
+                stats['max_rows_per_flush'] = max(self.rows_per_flush)
+
+            # Forecast queue wait time stats
+            if self.forecast_queue_wait_times:
+                stats['avg_forecast_queue_wait_time'] = statistics.mean(self.forecast_queue_wait_times)
+                stats['max_forecast_queue_wait_time'] = max(self.forecast_queue_wait_times)
             
             return stats
     def check_performance_alerts(self):
@@ -144,6 +204,10 @@ class PerformanceMonitor:
         # Kiểm tra thời gian LSTM prediction quá cao
         if self.lstm_prediction_times and statistics.mean(self.lstm_prediction_times) > 300:
             alerts.append("WARNING: LSTM prediction time > 5 minutes")
+
+        # Kiểm tra hàng đợi dự báo bị nghẽn
+        if self.forecast_jobs_dropped > 0:
+            alerts.append(f"WARNING: {self.forecast_jobs_dropped} forecast jobs dropped (queue full)")
         
         # Kiểm tra tài nguyên hệ thống
         resources = self.get_system_resources()
@@ -273,9 +337,18 @@ class PerformanceMonitor:
             print(f"Avg LSTM Prediction Time: {stats['avg_lstm_prediction_time']:.3f}s")
             print(f"Max LSTM Prediction Time: {stats['max_lstm_prediction_time']:.3f}s")
         
+        print(f"Total Rows Written: {stats['total_rows_written']}")
         if 'avg_db_save_time' in stats:
-            print(f"Avg DB Save Time: {stats['avg_db_save_time']:.3f}s")
-            print(f"Max DB Save Time: {stats['max_db_save_time']:.3f}s")
+            print(f"Avg Ingest Flush Time: {stats['avg_db_save_time']:.3f}s")
+            print(f"Max Ingest Flush Time: {stats['max_db_save_time']:.3f}s")
+            print(f"Avg Rows per Flush: {stats['avg_rows_per_flush']:.1f} (max {stats['max_rows_per_flush']})")
+
+        print(f"Forecast Queue Depth: {stats['forecast_queue_depth']} (max {stats['max_forecast_queue_depth']})")
+        print(f"Forecast Jobs Submitted/Dropped: {stats['forecast_jobs_submitted']}/{stats['forecast_jobs_dropped']}")
+        print(f"Forecast Requests Coalesced: {stats['forecast_requests_coalesced']}")
+        if 'avg_forecast_queue_wait_time' in stats:
+            print(f"Avg Forecast Queue Wait: {stats['avg_forecast_queue_wait_time']:.3f}s")
+            print(f"Max Forecast Queue Wait: {stats['max_forecast_queue_wait_time']:.3f}s")
         
         resources = self.get_system_resources()
         if 'error' not in resources:
@@ -293,10 +366,17 @@ class PerformanceMonitor:
             self.prediction_times.clear()
             self.lstm_prediction_times.clear()
             self.db_save_times.clear()
+            self.rows_per_flush.clear()
+            self.forecast_queue_wait_times.clear()
             self.total_messages_processed = 0
             self.total_predictions_made = 0
             self.total_lstm_predictions = 0
             self.total_db_operations = 0
+            self.total_rows_written = 0
+            self.max_forecast_queue_depth = 0
+            self.forecast_jobs_submitted = 0
+            self.forecast_jobs_dropped = 0
+            self.forecast_requests_coalesced = 0
             self.error_count = 0
             self.start_time = time.time()
             print("[INFO] Performance statistics have been reset")	
@@ -314,9 +394,21 @@ def periodic_stats_saver():
         time.sleep(1800)  # Lưu thống kê mỗi 30 phút
         performance_monitor.save_stats_to_db(engine)
 
+def periodic_partition_maintenance():
+    """Thread function để bảo trì partition và bảng tổng hợp định kỳ"""
+    while True:
+        try:
+            maintain_partitions(engine)
+        except Exception as e:
+            print(f"[ERROR] Bảo trì partition thất bại: {e}")
+        time.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
 def signal_handler(signum, frame):
     """Handler để xử lý tín hiệu thoát"""
     print(f"\n[INFO] Received signal {signum}, shutting down gracefully...")
+
+    # Ghi nốt dữ liệu còn trong bộ đệm ingest
+    service.ingest_writer.flush()
     
     # Hiển thị thống kê cuối cùng
     performance_monitor.print_stats()
@@ -345,16 +437,38 @@ def log_memory_usage():
     except ImportError:
         print("[MEMORY] psutil module not available. Install with 'pip install psutil' to enable memory monitoring.")
 
-# Load model DNN
-model = tf.keras.models.load_model("modelDNN.keras")
-# Load model LSTM
-modelLstm = tf.keras.models.load_model("modelLSTM.keras")
-
-# Load scaler từ file đã lưu
-with open("scalerDNN.pkl", "rb") as f:
-    scaler = pickle.load(f)
-with open("scalerLSTM.pkl", "rb") as f:
-    scaler_lstm = pickle.load(f)
+# Mô hình và scaler (được SubscriberService tải khi cần, không tải lúc import)
+DNN_MODEL_PATH = "modelDNN.keras"
+LSTM_MODEL_PATH = "modelLSTM.keras"
+LSTM_DIRECT_MODEL_PATH = "modelLSTM_direct.keras"  # Tạo bằng python training_pipeline.py --models direct --install
+DNN_SCALER_PATH = "scalerDNN.pkl"
+LSTM_SCALER_PATH = "scalerLSTM.pkl"
+
+# Backend suy luận: "keras" (TensorFlow đầy đủ), "tflite", "onnx" hoặc "numpy" (đọc trực tiếp .keras).
+# Mô hình tflite/onnx được tạo bằng python export_models.py
+INFERENCE_BACKEND = "keras"
+# Backend riêng cho vòng dự báo LSTM 672 bước, nơi overhead mỗi lần gọi chiếm phần lớn thời gian
+LSTM_INFERENCE_BACKEND = INFERENCE_BACKEND
+
+def load_scaler(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+# Cấu hình micro-batch phân loại DNN
+DNN_BATCH_MAX_LATENCY = 0.05  # Thời gian tối đa (giây) một payload chờ để gom batch
+DNN_BATCH_MAX_SIZE = 256  # Số payload tối đa trong một batch
+
+# Cấu hình dự báo LSTM
+FORECAST_DAYS = 7  # Số ngày dự báo
+# "autoregressive": modelLSTM.keras, 672 lần gọi mô hình cho 7 ngày;
+# "direct": LSTM_DIRECT_MODEL_PATH, mỗi lần gọi trả về cả một đoạn (vd. 96 bước = 24 giờ)
+LSTM_FORECAST_MODE = "autoregressive"
+FORECAST_SCHEDULER_INTERVAL = 30  # Số giây giữa hai lần gom các location cần dự báo
+FORECAST_MAX_BATCH_SIZE = 64  # Số location tối đa trong một batch LSTM
+FORECAST_WORKERS = 2  # Số worker thread chạy dự báo, mỗi worker giữ một bản sao modelLSTM.keras
+FORECAST_QUEUE_MAXSIZE = 16  # Số job tối đa trong hàng đợi dự báo, vượt quá sẽ bị bỏ
+FORECAST_MIN_REFRESH_INTERVAL = 300  # Số giây tối thiểu giữa hai lần dự báo của cùng một location
+FORECAST_MIN_REFRESH_INTERVALS = {}  # Ghi đè khoảng làm mới theo location, ví dụ {"thu_duc": 600}
 
 # Kết nối đến PostgreSQL
 DB_USER = "user"
@@ -368,12 +482,24 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Index (location, timestamp DESC) cho các truy vấn "mới nhất theo location"
+def location_timestamp_index(table_name, location, timestamp):
+    return Index(f"ix_{table_name}_location_timestamp", location, timestamp.desc())
+
+# Bảng lịch sử cảm biến được phân vùng theo tháng trên cột timestamp (PostgreSQL range partitioning).
+# Khóa chính phải chứa cột phân vùng nên là (id, timestamp).
+def partitioned_table_args(table_name, location, timestamp):
+    return (
+        location_timestamp_index(table_name, location, timestamp),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
 # Định nghĩa bảng chính - thêm trường location
 class AirQualityData(Base):
     __tablename__ = "air_quality_data"
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     temperature = Column(Float)
     humidity = Column(Float)
@@ -384,58 +510,74 @@ class AirQualityData(Base):
     co = Column(Float)
     air_quality = Column(Integer)  # Giá trị do model AI dự đoán
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 
 
 # Định nghĩa các bảng riêng cho từng loại dữ liệu theo dạng timestamp + value - thêm trường location
 class TemperatureData(Base):
     __tablename__ = "temperature_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class HumidityData(Base):
     __tablename__ = "humidity_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class PM25Data(Base):
     __tablename__ = "pm25_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class PM10Data(Base):
     __tablename__ = "pm10_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class NO2Data(Base):
     __tablename__ = "no2_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class SO2Data(Base):
     __tablename__ = "so2_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 class COData(Base):
     __tablename__ = "co_data"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(TIMESTAMP)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    timestamp = Column(TIMESTAMP, primary_key=True)
     location = Column(String(255))  # Thêm trường location
     value = Column(Float)
 
+    __table_args__ = partitioned_table_args(__tablename__, location, timestamp)
+
 # Định nghĩa bảng air_quality_predict - thêm trường location
 class AirQualityPredict(Base):
     __tablename__ = "air_quality_predict"
@@ -449,6 +591,8 @@ class AirQualityPredict(Base):
     year_sin = Column(Float)
     year_cos = Column(Float)
 
+    __table_args__ = (location_timestamp_index(__tablename__, location, timestamp),)
+
 # Định nghĩa bảng air_quality_predict_data - thêm trường location
 class AirQualityPredictData(Base):
     __tablename__ = "air_quality_predict_data"
@@ -462,6 +606,44 @@ class AirQualityPredictData(Base):
     year_sin = Column(Float)
     year_cos = Column(Float)
 
+    # Mỗi location chỉ có một dự báo cho mỗi giờ (đích của INSERT ... ON CONFLICT)
+    __table_args__ = (
+        Index(f"ux_{__tablename__}_location_timestamp", location, timestamp, unique=True),
+    )
+
+# Bảng tổng hợp theo giờ / theo ngày của air_quality_data cho các truy vấn khoảng thời gian dài
+class AirQualityHourly(Base):
+    __tablename__ = "air_quality_hourly"
+
+    location = Column(String(255), primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)  # Đầu giờ
+    samples = Column(Integer)
+    temperature = Column(Float)
+    humidity = Column(Float)
+    pm25 = Column(Float)
+    pm10 = Column(Float)
+    no2 = Column(Float)
+    so2 = Column(Float)
+    co = Column(Float)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+
+class AirQualityDaily(Base):
+    __tablename__ = "air_quality_daily"
+
+    location = Column(String(255), primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)  # Đầu ngày
+    samples = Column(Integer)
+    temperature = Column(Float)
+    humidity = Column(Float)
+    pm25 = Column(Float)
+    pm10 = Column(Float)
+    no2 = Column(Float)
+    so2 = Column(Float)
+    co = Column(Float)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+
 # Thêm sau class AirQualityPredictData
 class PerformanceStats(Base):
     __tablename__ = "performance_stats"
@@ -486,242 +668,533 @@ class PerformanceStats(Base):
     max_lstm_prediction_time = Column(Float)
     max_db_save_time = Column(Float)
 
-# Tạo tất cả các bảng nếu chưa tồn tại
-Base.metadata.create_all(bind=engine)
-
-def calculate_sin_cos_features(timestamp):
-    day = 60 * 60 * 24
-    year = 365.2425 * day
-    seconds = timestamp.timestamp()
-
-    day_sin = np.sin(seconds * (2 * np.pi / day))
-    day_cos = np.cos(seconds * (2 * np.pi / day))
-    year_sin = np.sin(seconds * (2 * np.pi / year))
-    year_cos = np.cos(seconds * (2 * np.pi / year))
-
-    return day_sin, day_cos, year_sin, year_cos
-
-def preprocess_for_lstm(data, scaler_lstm):
+# Các bảng riêng theo dạng (timestamp, location, value) và khóa tương ứng trong payload
+INDIVIDUAL_SENSOR_TABLES = [
+    (TemperatureData.__tablename__, "temperature"),
+    (HumidityData.__tablename__, "humidity"),
+    (PM25Data.__tablename__, "pm25"),
+    (PM10Data.__tablename__, "pm10"),
+    (NO2Data.__tablename__, "no2"),
+    (SO2Data.__tablename__, "so2"),
+    (COData.__tablename__, "co"),
+]
+
+# Cách lưu các bảng riêng:
+#   "view":  temperature_data, humidity_data, ... là view trên air_quality_data (mỗi bản tin ghi 1 dòng)
+#   "table": ghi thêm một dòng vào từng bảng riêng như trước (mỗi bản tin ghi 8 dòng)
+PER_METRIC_STORAGE = "view"
+PER_METRIC_TABLE_NAMES = [table_name for table_name, _ in INDIVIDUAL_SENSOR_TABLES]
+
+# Các bảng thực sự được lưu trong database
+STORED_TABLES = [
+    table for table in Base.metadata.sorted_tables
+    if PER_METRIC_STORAGE == "table" or table.name not in PER_METRIC_TABLE_NAMES
+]
+
+# Các bảng được phân vùng theo tháng
+PARTITIONED_TABLES = [
+    table.name for table in STORED_TABLES
+    if table.dialect_options["postgresql"]["partition_by"]
+]
+
+# Cấu hình phân vùng và lưu trữ
+PARTITION_MONTHS_AHEAD = 2  # Số tháng tiếp theo được tạo partition trước
+RETENTION_MONTHS = 12  # Số tháng dữ liệu thô được giữ lại; None = giữ vĩnh viễn
+PARTITION_MAINTENANCE_INTERVAL = 3600  # Số giây giữa hai lần bảo trì partition / cập nhật bảng tổng hợp
+
+# Migration: tạo index (location, timestamp DESC) cho các bảng đã tồn tại trước khi có index.
+# create_all chỉ tạo index cho bảng mới, nên bảng cũ được bổ sung bằng CREATE INDEX CONCURRENTLY
+# (không khóa ghi trong lúc tạo). Bảng phân vùng không hỗ trợ CONCURRENTLY; index trên bảng cha
+# được tạo cho từng partition.
+def ensure_location_timestamp_indexes(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in STORED_TABLES:
+            for index in table.indexes:
+                if index.name and index.name.endswith("_location_timestamp") and not index.unique:
+                    concurrently = "" if table.name in PARTITIONED_TABLES else "CONCURRENTLY "
+                    conn.execute(text(
+                        f"CREATE INDEX {concurrently}IF NOT EXISTS {index.name} "
+                        f"ON {table.name} (location, timestamp DESC)"
+                    ))
+
+# Migration: khóa duy nhất (location, timestamp) cho air_quality_predict_data. Các dòng trùng
+# (cách lưu cũ có thể ghi hai nửa của cùng một giờ) được gộp lại, giữ dòng ghi sau cùng.
+def ensure_forecast_unique_index(engine):
+    table = AirQualityPredictData.__tablename__
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            DELETE FROM {table} a USING {table} b
+            WHERE a.location = b.location AND a.timestamp = b.timestamp AND a.id < b.id
+        """))
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_location_timestamp ON {table} (location, timestamp)"))
+        # Index (location, timestamp DESC) cũ không còn cần thiết
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_{table}_location_timestamp"))
+
+def maintain_partitions(engine):
+    """Tạo trước partition các tháng tới, xóa partition hết hạn và cập nhật bảng tổng hợp"""
+    for table in PARTITIONED_TABLES:
+        ensure_monthly_partitions(engine, table, months_ahead=PARTITION_MONTHS_AHEAD)
+    # Cập nhật bảng tổng hợp trước khi xóa dữ liệu thô của tháng hết hạn
+    refresh_rollups(engine, AirQualityData.__tablename__, AirQualityHourly.__tablename__,
+                    AirQualityDaily.__tablename__)
+    for table in PARTITIONED_TABLES:
+        drop_expired_partitions(engine, table, RETENTION_MONTHS)
+
+def prepare_database(engine):
+    """Chuyển bảng cũ sang phân vùng, tạo bảng còn thiếu, partition, view các bảng riêng và index"""
+    for table in PARTITIONED_TABLES:
+        migrate_to_partitioned(engine, table)
+    restored_tables = []
+    if PER_METRIC_STORAGE == "table":
+        restored_tables = drop_views(engine, INDIVIDUAL_SENSOR_TABLES)
+    Base.metadata.create_all(bind=engine, tables=STORED_TABLES)
+    for table in PARTITIONED_TABLES:
+        ensure_monthly_partitions(engine, table, months_ahead=PARTITION_MONTHS_AHEAD)
+    if PER_METRIC_STORAGE == "view":
+        convert_tables_to_views(engine, INDIVIDUAL_SENSOR_TABLES)
+        ensure_views(engine, INDIVIDUAL_SENSOR_TABLES)
+    else:
+        backfill_tables(engine, restored_tables)
+    ensure_location_timestamp_indexes(engine)
+    ensure_forecast_unique_index(engine)
+
+# Các cột (không gồm id) của từng bảng được ghi bởi ingest writer
+AIR_QUALITY_DATA_COLUMNS = tuple(c.name for c in AirQualityData.__table__.columns if c.name != "id")
+INGEST_TABLE_COLUMNS = {
+    AirQualityData.__tablename__: AIR_QUALITY_DATA_COLUMNS,
+    **{
+        table_name: ("timestamp", "location", "value")
+        for table_name, _ in INDIVIDUAL_SENSOR_TABLES if PER_METRIC_STORAGE == "table"
+    },
+    AirQualityPredict.__tablename__: tuple(c.name for c in AirQualityPredict.__table__.columns if c.name != "id"),
+}
+
+# Kênh PostgreSQL NOTIFY báo cho API khi có dữ liệu mới (payload là tên location)
+NOTIFY_CHANNEL_INGEST = "air_quality_ingest"
+NOTIFY_CHANNEL_FORECAST = "air_quality_forecast"
+
+# Cấu hình ingest writer
+INGEST_FLUSH_INTERVAL = 1.0  # Số giây tối đa dữ liệu nằm trong bộ đệm trước khi ghi
+INGEST_FLUSH_MAX_ROWS = 5000  # Flush sớm khi bộ đệm đạt số dòng này
+INGEST_MAX_PENDING_ROWS = 100000  # Số dòng tối đa mỗi bảng giữ lại để thử ghi lại khi DB lỗi
+
+# Hàm đưa dữ liệu sensor vào bộ đệm ghi của các bảng riêng biệt
+def save_sensor_data_to_individual_tables(writer, timestamp, location, sensor_data):
+    # Mỗi bảng riêng có dạng (timestamp, location, value); ghi thực sự diễn ra khi writer flush
+    for table_name, key in INDIVIDUAL_SENSOR_TABLES:
+        writer.add(table_name, (timestamp, location, sensor_data[key]))
+
+# Ghi dự báo theo giờ của một location trong một câu lệnh: upsert các giờ mới, xóa các giờ không còn
+# trong dự báo và gửi NOTIFY cho API. Người đọc luôn thấy trọn bản dự báo cũ hoặc mới.
+FORECAST_UPSERT_SQL = text("""
+    WITH new_rows AS (
+        SELECT * FROM unnest(
+            CAST(:timestamps AS timestamp[]), CAST(:temperatures AS float8[]),
+            CAST(:day_sin AS float8[]), CAST(:day_cos AS float8[]),
+            CAST(:year_sin AS float8[]), CAST(:year_cos AS float8[])
+        ) AS t(timestamp, temperature, day_sin, day_cos, year_sin, year_cos)
+    ), stale AS (
+        DELETE FROM air_quality_predict_data d
+        WHERE d.location = :location AND NOT (d.timestamp = ANY(CAST(:timestamps AS timestamp[])))
+    ), upserted AS (
+        INSERT INTO air_quality_predict_data (timestamp, location, temperature, day_sin, day_cos, year_sin, year_cos)
+        SELECT timestamp, :location, temperature, day_sin, day_cos, year_sin, year_cos FROM new_rows
+        ON CONFLICT (location, timestamp) DO UPDATE SET
+            temperature = EXCLUDED.temperature,
+            day_sin = EXCLUDED.day_sin, day_cos = EXCLUDED.day_cos,
+            year_sin = EXCLUDED.year_sin, year_cos = EXCLUDED.year_cos
+        RETURNING 1
+    )
+    SELECT count(*), pg_notify(:channel, :location) FROM upserted
+""")
+
+# Hàm lưu kết quả dự báo (trung bình theo giờ) vào air_quality_predict_data cho một location
+def save_forecast_predictions(session, location, base_timestamp, predictions, time_step=15*60):
+    hours, temperatures = hourly_means(base_timestamp, predictions, time_step)
+    features = sin_cos_features(hours)
+
+    saved, _ = session.execute(FORECAST_UPSERT_SQL, {
+        "location": location,
+        "channel": NOTIFY_CHANNEL_FORECAST,
+        "timestamps": hours.astype("datetime64[us]").tolist(),
+        "temperatures": temperatures.tolist(),
+        "day_sin": features[:, 0].tolist(),
+        "day_cos": features[:, 1].tolist(),
+        "year_sin": features[:, 2].tolist(),
+        "year_cos": features[:, 3].tolist(),
+    }).one()
+    session.commit()
+
+    print(f"[INFO] Đã lưu {saved} mẫu dữ liệu dự đoán theo giờ cho location {location}.")
+    return saved
+
+# Lấy cửa sổ 6 điểm gần nhất của nhiều location từ air_quality_predict trong một truy vấn
+def load_lstm_windows(session, locations, window_size=6, min_rows=None):
     """
-    Tiền xử lý dữ liệu LSTM dựa trên danh sách 6 timestamp.
-
     Parameters:
-        data: Danh sách các điểm dữ liệu (list of dict), mỗi điểm gồm 'temperature', 'day_sin', 'day_cos', 'year_sin', 'year_cos'.
-        scaler_lstm: Bộ chuẩn hóa dữ liệu nhiệt độ.
+        locations: Danh sách location; None để lấy tất cả location có trong bảng.
+        min_rows: Số mẫu tối thiểu để giữ một location (mặc định window_size).
 
     Returns:
-        processed_data: Mảng numpy gồm các đặc trưng đã chuẩn hóa cho LSTM.
+        windows: Dict location -> danh sách dữ liệu (list of dict) theo đúng thứ tự thời gian.
+                 Location có ít hơn min_rows mẫu bị bỏ qua.
     """
-    processed_data = []
-
-    for entry in data:
-        # Chuẩn hóa nhiệt độ
-        temperature_reshaped = np.array([[entry['temperature']]])
-        temperature_scaled = scaler_lstm.transform(temperature_reshaped)[0][0]
-        
-        # Tạo mảng chứa tất cả các đặc trưng (không tính lại thời gian)
-        processed_data.append([
-            temperature_scaled,       # Nhiệt độ đã chuẩn hóa
-            entry['day_sin'],         # Giá trị đã lấy trực tiếp
-            entry['day_cos'],         # Giá trị đã lấy trực tiếp
-            entry['year_sin'],        # Giá trị đã lấy trực tiếp
-            entry['year_cos']         # Giá trị đã lấy trực tiếp
-        ])
-
-    # Chuyển danh sách thành mảng numpy
-    return np.array(processed_data)
-
-# Hàm xử lý dữ liệu và dự đoán DNN - đã thêm performance monitoring
-def predict_air_quality(data):
-    start_time = time.time()
-    
+    min_rows = window_size if min_rows is None else min_rows
+    row_number = func.row_number().over(
+        partition_by=AirQualityPredict.location,
+        order_by=AirQualityPredict.timestamp.desc()
+    ).label("rn")
+    latest = session.query(
+        AirQualityPredict.location,
+        AirQualityPredict.timestamp,
+        AirQualityPredict.temperature,
+        AirQualityPredict.day_sin,
+        AirQualityPredict.day_cos,
+        AirQualityPredict.year_sin,
+        AirQualityPredict.year_cos,
+        row_number
+    )
+    if locations is not None:
+        latest = latest.filter(AirQualityPredict.location.in_(locations))
+    latest = latest.subquery()
+    rows = session.query(latest).filter(
+        latest.c.rn <= window_size
+    ).order_by(latest.c.location, latest.c.timestamp).all()
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.location, []).append({
+            'timestamp': row.timestamp,
+            'temperature': row.temperature,
+            'day_sin': row.day_sin,
+            'day_cos': row.day_cos,
+            'year_sin': row.year_sin,
+            'year_cos': row.year_cos
+        })
+
+    windows = {}
+    for location in (grouped if locations is None else locations):
+        entries = grouped.get(location, [])
+        if len(entries) < min_rows:
+            print(f"[WARNING] Chỉ có {len(entries)} mẫu dữ liệu có sẵn cho location {location}, cần ít nhất {window_size} mẫu để dự đoán LSTM.")
+            continue
+        windows[location] = entries
+    return windows
+
+# Nạp cửa sổ (có thể chưa đủ 6 mẫu) cho LSTMWindowStore bằng một session riêng
+def load_lstm_windows_from_db(locations):
+    session = SessionLocal()
     try:
-        # Chuyển dữ liệu thành mảng numpy
-        features = np.array([[data["temperature"], data["humidity"], data["pm25"],
-                              data["pm10"], data["no2"], data["so2"], data["co"]]])
-
-        # Chuẩn hóa dữ liệu bằng scaler đã load
-        features_scaled = scaler.transform(features)
-
-        # Dự đoán chất lượng không khí
-        prediction = model.predict(features_scaled, verbose=0)
-        air_quality_class = np.argmax(prediction)  # Lấy nhãn có xác suất cao nhất
-        
-        # Giải phóng tài nguyên
-        tf.keras.backend.clear_session()
-        
-        # Record successful prediction time
-        prediction_time = time.time() - start_time
-        performance_monitor.record_prediction_time(prediction_time)
-        
-        return int(air_quality_class)
-    
-    except Exception as e:
-        # Record error
-        performance_monitor.record_error()
-        print(f"[ERROR] Error in predict_air_quality: {e}")
-        raise
-
-# Hàm dự đoán nhiệt độ sử dụng LSTM
-def predict_temperature_lstm(model_lstm, data, scaler_lstm, n_days=7, time_step=15*60):
-    """
-    Dự đoán nhiệt độ trong n_days (mỗi 15 phút) sử dụng mô hình LSTM.
+        return load_lstm_windows(session, locations, min_rows=0)
+    finally:
+        session.close()
 
-    Parameters:
-        model_lstm: Mô hình LSTM đã được huấn luyện.
-        data: Danh sách 6 điểm dữ liệu gần nhất (list of dict).
-        scaler_lstm: Bộ chuẩn hóa dữ liệu.
-        n_days: Số ngày dự đoán (mặc định: 7).
-        time_step: Khoảng thời gian giữa các điểm dữ liệu (mặc định: 15 phút).
+# Pool worker chạy dự báo LSTM ngoài thread callback MQTT, nhận job từ hàng đợi có giới hạn
+class ForecastWorkerPool:
+    def __init__(self, model_path, scaler_lstm, window_store, n_workers=FORECAST_WORKERS,
+                 queue_maxsize=FORECAST_QUEUE_MAXSIZE, n_days=FORECAST_DAYS, forecast_mode=LSTM_FORECAST_MODE):
+        if forecast_mode not in FORECAST_ENGINES:
+            raise ValueError(f"LSTM_FORECAST_MODE không hợp lệ: {forecast_mode} (chọn một trong {list(FORECAST_ENGINES)})")
+        self.model_path = model_path
+        self.forecast_mode = forecast_mode
+        self.scaler_lstm = scaler_lstm
+        self.window_store = window_store
+        self.n_workers = n_workers
+        self.n_days = n_days
+        self.jobs = queue.Queue(maxsize=queue_maxsize)
+        self.workers = []
+        self.loaded = []  # Event cho mỗi worker, được set khi worker tải xong mô hình (hoặc lỗi)
+        self.load_errors = []
+
+    def start(self):
+        for i in range(self.n_workers):
+            loaded = threading.Event()
+            worker = threading.Thread(target=self._worker_loop, args=(i, loaded), daemon=True, name=f"forecast-worker-{i}")
+            worker.start()
+            self.workers.append(worker)
+            self.loaded.append(loaded)
+        print(f"[INFO] Đã khởi động {self.n_workers} forecast worker (queue tối đa {self.jobs.maxsize} job)")
+
+    def wait_until_loaded(self):
+        """Chờ tất cả worker tải xong mô hình; báo lỗi nếu có worker không tải được"""
+        for loaded in self.loaded:
+            loaded.wait()
+        if self.load_errors:
+            raise RuntimeError(f"Không thể tải mô hình {self.model_path}: {self.load_errors[0]}")
+
+    def submit(self, locations, on_done=None):
+        """
+        Đưa một batch location vào hàng đợi; trả về False nếu hàng đợi đầy (job bị bỏ).
+        on_done(locations) được gọi khi job kết thúc (thành công hay lỗi).
+        """
+        try:
+            self.jobs.put_nowait((time.time(), locations, on_done))
+        except queue.Full:
+            performance_monitor.record_forecast_job_dropped()
+            print(f"[WARNING] Hàng đợi dự báo đầy, bỏ job cho {len(locations)} location")
+            return False
+        performance_monitor.record_forecast_job_submitted(self.jobs.qsize())
+        return True
+
+    def _worker_loop(self, worker_id, loaded):
+        # Mỗi worker giữ bản sao mô hình LSTM và engine riêng
+        try:
+            model_lstm = load_backend(LSTM_INFERENCE_BACKEND, self.model_path)
+            engine_lstm = FORECAST_ENGINES[self.forecast_mode](model_lstm, self.scaler_lstm)
+        except Exception as e:
+            self.load_errors.append(e)
+            print(f"[ERROR] Forecast worker {worker_id} không thể tải mô hình {self.model_path}: {e}")
+            return
+        finally:
+            loaded.set()
+        print(f"[INFO] Forecast worker {worker_id} đã tải mô hình {self.model_path} (chế độ {self.forecast_mode})")
+
+        while True:
+            enqueued_at, locations, on_done = self.jobs.get()
+            performance_monitor.record_forecast_job_started(time.time() - enqueued_at, self.jobs.qsize())
+            try:
+                self.forecast_locations(engine_lstm, locations)
+            except Exception as e:
+                performance_monitor.record_error()
+                print(f"[ERROR] Lỗi khi dự báo LSTM cho {locations}: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                if on_done:
+                    on_done(locations)
+                self.jobs.task_done()
+
+    def forecast_locations(self, engine_lstm, locations):
+        """Dự báo n_days cho danh sách location trong một lần chạy batch và lưu kết quả theo giờ"""
+        # Cửa sổ đã chuẩn hóa lấy từ bộ nhớ, không truy vấn lại air_quality_predict
+        windows = self.window_store.windows(locations)
+        if not windows:
+            return 0
 
-    Returns:
-        predictions: Danh sách nhiệt độ dự đoán.
-    """
-    # Log memory usage at start
-    log_memory_usage()
-    # Thêm vào đầu hàm predict_temperature_lstm, sau dòng log_memory_usage()
-    lstm_start_time = time.time()
-    # Tiền xử lý dữ liệu (chuẩn hóa)
-    print("[INFO] Bắt đầu tiền xử lý dữ liệu cho LSTM...")
-    input_data = preprocess_for_lstm(data, scaler_lstm)  # (6, features)
-    print(f"[INFO] Dữ liệu đã được chuẩn hóa. Kích thước: {input_data.shape}")
+        session = SessionLocal()
+        try:
+            batch_locations = list(windows)
+            lstm_start_time = time.time()
+            input_batch = np.stack([windows[loc][0] for loc in batch_locations])
+            last_timestamps = [windows[loc][1] for loc in batch_locations]
+            total_steps = self.n_days * 24 * 4
+
+            print(f"[INFO] Dự đoán LSTM batch cho {len(batch_locations)} location, input {input_batch.shape}, {total_steps} bước...")
+            predictions = engine_lstm.forecast_batch(input_batch, last_timestamps, total_steps)
+            lstm_total_time = time.time() - lstm_start_time
+            performance_monitor.record_lstm_prediction_time(lstm_total_time)
+            print(f"[INFO] LSTM batch prediction completed in {lstm_total_time:.2f} seconds")
+
+            for location, base_timestamp, location_predictions in zip(batch_locations, last_timestamps, predictions):
+                save_forecast_predictions(session, location, base_timestamp, location_predictions, engine_lstm.time_step)
+            return len(batch_locations)
+        finally:
+            session.close()
 
-    # Định dạng input cho LSTM (batch_size=1, time_steps=6, features)
-    current_input = np.reshape(input_data, (1, 6, -1))
-    print(f"[INFO] Dữ liệu đầu vào định dạng cho LSTM: {current_input.shape}")
+# Scheduler gom các location cần làm mới dự báo và gửi sang worker pool theo batch.
+# Mỗi location có tối đa một yêu cầu đang chờ: mẫu mới thay thế yêu cầu cũ thay vì tạo job mới,
+# và một location chỉ được dự báo lại sau khoảng làm mới tối thiểu.
+class ForecastScheduler:
+    def __init__(self, worker_pool, interval=FORECAST_SCHEDULER_INTERVAL,
+                 max_batch_size=FORECAST_MAX_BATCH_SIZE,
+                 min_refresh_interval=FORECAST_MIN_REFRESH_INTERVAL,
+                 min_refresh_intervals=None):
+        self.worker_pool = worker_pool
+        self.interval = interval
+        self.max_batch_size = max_batch_size
+        self.min_refresh_interval = min_refresh_interval
+        self.min_refresh_intervals = dict(FORECAST_MIN_REFRESH_INTERVALS if min_refresh_intervals is None else min_refresh_intervals)
+        self.pending = {}  # location -> timestamp của mẫu mới nhất đang chờ dự báo
+        self.in_flight = set()  # location đang nằm trong hàng đợi hoặc đang chạy
+        self.last_dispatched = {}  # location -> thời điểm gửi job gần nhất
+        self.lock = threading.Lock()
 
-    predictions = []
-    current_timestamp = data[-1]['timestamp']  # Bắt đầu từ thời điểm cuối cùng trong dữ liệu gốc
+    def refresh_interval_for(self, location):
+        return self.min_refresh_intervals.get(location, self.min_refresh_interval)
 
-    print(f"[INFO] Bắt đầu dự đoán nhiệt độ cho {n_days} ngày tiếp theo...")
-    
-    
-    # Giảm số lượng log và tối ưu vòng lặp
-    total_steps = n_days * 24 * 4
-    for i in range(total_steps):  # 7 ngày, mỗi 15 phút/lần => 7 * 24 * 4
-        # Dự đoán nhiệt độ
-        with tf.device('/CPU:0'):  # Force CPU usage to reduce GPU memory consumption
-            predicted_temperature = float(model_lstm.predict(current_input, verbose=0)[0][0])
-        
-        # Clear TensorFlow session to free memory
-        if i % 10 == 0:  # Clear session every 10 predictions
-            tf.keras.backend.clear_session()
-        
-        # Chỉ log mỗi giờ để giảm việc ghi log
-        if i % 4 == 0:
-            print(f"[INFO] Dự đoán giờ thứ {i//4}: {predicted_temperature:.2f}°C")
-            if i % 24 == 0 and i > 0:  # Log memory every 6 hours
-                log_memory_usage()
-
-        # Lưu kết quả
-        predictions.append(predicted_temperature)
-
-        # Tính toán timestamp tiếp theo (cộng thêm 15 phút)
-        current_timestamp += timedelta(seconds=time_step)
-        current_timestamp_pd = pd.to_datetime(current_timestamp)
-        # Tính toán các đặc trưng thời gian mới (không cần logging mỗi lần)
-        day_sin, day_cos, year_sin, year_cos = calculate_sin_cos_features(current_timestamp_pd)
-
-        predicted_temperature_reshaped = np.array([[predicted_temperature]])
-        predicted_temperature_scaler = scaler_lstm.transform(predicted_temperature_reshaped)[0][0]
-        
-        # Tạo dữ liệu mới cho input
-        new_input = np.array([
-            predicted_temperature_scaler,  # Dự đoán nhiệt độ mới
-            day_sin,
-            day_cos,
-            year_sin,
-            year_cos
-        ])
-
-        # Cập nhật dữ liệu đầu vào bằng cách loại bỏ điểm đầu và thêm điểm mới
-        input_data = np.vstack([input_data[1:], new_input])  # Loại bỏ điểm đầu tiên, thêm điểm mới
-        current_input = np.reshape(input_data, (1, 6, -1))  # Cập nhật input cho LSTM
-        
-        # Free up memory every 50 predictions
-        if i % 50 == 0 and i > 0:
-            gc.collect()  # Force garbage collection
-            
-        # Progress update
-        if i % 96 == 0 and i > 0:  # Every day (96 = 4*24 predictions)
-            print(f"[INFO] Progress: {i}/{total_steps} predictions completed ({i/total_steps*100:.1f}%)")
+    def mark_due(self, location, sample_timestamp=None):
+        """Đánh dấu location cần được dự báo lại; mẫu mới thay thế yêu cầu đang chờ"""
+        with self.lock:
+            if location in self.pending or location in self.in_flight:
+                performance_monitor.record_forecast_coalesced()
+            self.pending[location] = sample_timestamp
 
-    print(f"[INFO] Hoàn thành dự đoán {len(predictions)} giá trị nhiệt độ.")
-    
-    # Final cleanup
-    tf.keras.backend.clear_session()
-    gc.collect()
-    
-    # Log final memory usage
-    log_memory_usage()
-    # Thêm vào cuối hàm predict_temperature_lstm, trước return predictions
-    lstm_total_time = time.time() - lstm_start_time
-    performance_monitor.record_lstm_prediction_time(lstm_total_time)
-    print(f"[INFO] LSTM prediction completed in {lstm_total_time:.2f} seconds")
-    return predictions
-
-# Hàm lưu dữ liệu sensor vào các bảng riêng biệt - đã thêm performance monitoring
-def save_sensor_data_to_individual_tables(session, timestamp, location, sensor_data):
-    start_time = time.time()
-    
-    print("[INFO] Lưu dữ liệu sensor vào các bảng riêng...")
-    try:
-        # Lưu nhiệt độ
-        temp_entry = TemperatureData(timestamp=timestamp, location=location, value=sensor_data["temperature"])
-        session.add(temp_entry)
-        
-        # Lưu độ ẩm
-        humidity_entry = HumidityData(timestamp=timestamp, location=location, value=sensor_data["humidity"])
-        session.add(humidity_entry)
-        
-        # Lưu PM2.5
-        pm25_entry = PM25Data(timestamp=timestamp, location=location, value=sensor_data["pm25"])
-        session.add(pm25_entry)
-        
-        # Lưu PM10
-        pm10_entry = PM10Data(timestamp=timestamp, location=location, value=sensor_data["pm10"])
-        session.add(pm10_entry)
-        
-        # Lưu NO2
-        no2_entry = NO2Data(timestamp=timestamp, location=location, value=sensor_data["no2"])
-        session.add(no2_entry)
-        
-        # Lưu SO2
-        so2_entry = SO2Data(timestamp=timestamp, location=location, value=sensor_data["so2"])
-        session.add(so2_entry)
-        
-        # Lưu CO
-        co_entry = COData(timestamp=timestamp, location=location, value=sensor_data["co"])
-        session.add(co_entry)
-        
-        # Commit được thực hiện bởi hàm gọi
-        
-        # Record successful DB operation time
-        db_save_time = time.time() - start_time
-        performance_monitor.record_db_save_time(db_save_time)
-        
-        print("[INFO] Đã lưu tất cả các sensor vào các bảng riêng.")
-        
-    except Exception as e:
-        performance_monitor.record_error()
-        print(f"[ERROR] Lỗi khi lưu dữ liệu sensor: {e}")
-        session.rollback()
-        raise
+    def collect_due(self):
+        """Lấy các location đang chờ, không có job đang chạy và đã qua khoảng làm mới tối thiểu"""
+        now = time.time()
+        with self.lock:
+            locations = sorted(
+                location for location in self.pending
+                if location not in self.in_flight
+                and now - self.last_dispatched.get(location, 0) >= self.refresh_interval_for(location)
+            )
+            for location in locations:
+                del self.pending[location]
+                self.in_flight.add(location)
+                self.last_dispatched[location] = now
+        return locations
+
+    def mark_done(self, locations):
+        """Callback của worker pool khi job kết thúc"""
+        with self.lock:
+            self.in_flight.difference_update(locations)
+
+    def run_due(self):
+        """Gửi các location đến hạn sang worker pool, chia thành các batch tối đa max_batch_size"""
+        locations = self.collect_due()
+        for start in range(0, len(locations), self.max_batch_size):
+            batch = locations[start:start + self.max_batch_size]
+            if not self.worker_pool.submit(batch, on_done=self.mark_done):
+                # Hàng đợi đầy: trả các location về trạng thái chờ để thử lại ở lần chạy sau
+                with self.lock:
+                    self.in_flight.difference_update(batch)
+                    for location in batch:
+                        self.pending.setdefault(location, None)
+                        self.last_dispatched.pop(location, None)
+
+    def run_forever(self):
+        """Thread function: định kỳ gom các location cần dự báo và gửi đi"""
+        while True:
+            time.sleep(self.interval)
+            self.run_due()
+
+# Đưa một batch payload đã phân loại vào ingest writer; forecast được lên lịch sau khi flush commit
+def persist_classified_payloads(payloads):
+    # Đặc trưng thời gian của cả batch trong một lần tính
+    features = sin_cos_features([payload["timestamp"] for payload in payloads]).tolist()
+    for payload, (day_sin, day_cos, year_sin, year_cos) in zip(payloads, features):
+        # Bảng chính
+        service.ingest_writer.add("air_quality_data", tuple(payload[column] for column in AIR_QUALITY_DATA_COLUMNS))
+
+        # Các bảng riêng biệt (ở chế độ "view" chúng được đọc trực tiếp từ air_quality_data)
+        if PER_METRIC_STORAGE == "table":
+            save_sensor_data_to_individual_tables(service.ingest_writer, payload["timestamp"], payload["location"], payload)
+
+        # Bảng air_quality_predict cùng các đặc trưng thời gian
+        service.ingest_writer.add("air_quality_predict", (
+            payload["timestamp"], payload["location"], payload["temperature"],
+            day_sin, day_cos, year_sin, year_cos
+        ))
+
+# Callback của ingest writer sau mỗi lần flush thành công
+def on_ingest_flush(rows_by_table, duration):
+    total_rows = sum(len(rows) for rows in rows_by_table.values())
+    performance_monitor.record_ingest_flush(duration, total_rows)
+    print(f"[INFO] Ingest flush: {total_rows} dòng vào {len(rows_by_table)} bảng trong {duration:.3f}s")
+
+    # Cập nhật cửa sổ LSTM trong bộ nhớ và đánh dấu location cần làm mới dự báo;
+    # scheduler sẽ gom các location và dự báo theo batch
+    for timestamp, location, temperature, day_sin, day_cos, year_sin, year_cos in rows_by_table.get("air_quality_predict", []):
+        service.lstm_window_store.append(location, timestamp, temperature, day_sin, day_cos, year_sin, year_cos)
+        service.forecast_scheduler.mark_due(location, timestamp)
+
+# Thông báo cho API các location vừa có dữ liệu mới
+def ingest_notifications(rows_by_table):
+    locations = {row[1] for row in rows_by_table.get(AirQualityData.__tablename__, [])}
+    return [(NOTIFY_CHANNEL_INGEST, location) for location in sorted(locations)]
+
+# Stage gom payload trong một khoảng trễ ngắn rồi phân loại DNN cả batch trong một lần gọi mô hình
+class ClassificationStage:
+    def __init__(self, classifier, handler, max_latency=DNN_BATCH_MAX_LATENCY, max_batch_size=DNN_BATCH_MAX_SIZE):
+        self.classifier = classifier
+        self.handler = handler
+        self.max_latency = max_latency
+        self.max_batch_size = max_batch_size
+        self.inbox = queue.Queue()
+        self.thread = None
+
+    def submit(self, payload):
+        self.inbox.put(payload)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="dnn-classification")
+        self.thread.start()
+
+    def _collect_batch(self):
+        """Chờ payload đầu tiên, sau đó gom thêm đến khi hết ngân sách trễ hoặc đủ max_batch_size"""
+        batch = [self.inbox.get()]
+        deadline = time.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.inbox.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _classify(self, batch):
+        """Phân loại cả batch; nếu lỗi thì phân loại từng payload và chỉ bỏ các payload lỗi"""
+        try:
+            return batch, self.classifier.classify_payloads(batch)
+        except Exception as e:
+            print(f"[WARNING] Lỗi khi phân loại batch {len(batch)} payload, phân loại từng payload: {e}")
+        classified, labels = [], []
+        for payload in batch:
+            try:
+                labels.append(self.classifier.classify_payloads([payload])[0])
+                classified.append(payload)
+            except Exception as e:
+                performance_monitor.record_error()
+                print(f"[ERROR] Bỏ payload không phân loại được {payload}: {e}")
+        return classified, labels
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            start_time = time.time()
+            batch, labels = self._classify(batch)
+            if not batch:
+                continue
+            performance_monitor.record_prediction_time(time.time() - start_time, count=len(batch))
+            for payload, label in zip(batch, labels):
+                payload["air_quality"] = label
+            print(f"[INFO] Đã phân loại {len(batch)} payload, nhãn: {labels}")
+            try:
+                self.handler(batch)
+            except Exception as e:
+                # Lỗi lưu / lên lịch dự báo không được dừng thread phân loại
+                performance_monitor.record_error()
+                print(f"[ERROR] Lỗi khi xử lý {len(batch)} payload đã phân loại: {e}")
+                import traceback
+                traceback.print_exc()
+
+# Kiểm tra các thông số cảm biến trước khi đưa vào hàng đợi phân loại
+def coerce_sensor_values(payload):
+    """Chuyển các thông số FEATURE_NAMES của payload thành float hữu hạn; ValueError nếu thiếu hoặc không phải số"""
+    for name in FEATURE_NAMES:
+        value = payload.get(name)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"thông số {name} thiếu hoặc không phải số: {value!r}")
+        if not math.isfinite(value):
+            raise ValueError(f"thông số {name} không hữu hạn: {value!r}")
+        payload[name] = value
 
 # Callback khi nhận được dữ liệu từ MQTT
 def on_message(client, userdata, msg, properties=None, reason_code=None):
     # Log initial memory usage
     log_memory_usage()
     message_start_time = time.time()
-    session = None
     try:
         # Nhận dữ liệu từ MQTT và giải mã
         payload = json.loads(msg.payload.decode())
         print("[INFO] Received data:", payload)
+        if not isinstance(payload, dict):
+            raise ValueError(f"payload phải là object JSON, nhận được {type(payload).__name__}")
+        try:
+            coerce_sensor_values(payload)
+        except ValueError as e:
+            performance_monitor.record_error()
+            print(f"[WARNING] Bỏ payload không hợp lệ: {e}")
+            return
 
         # Chuẩn hóa timestamp sử dụng Pandas
         if "timestamp" in payload:
-            payload["timestamp"] = pd.to_datetime(payload["timestamp"])
+            # Giờ UTC không múi giờ, giống cột timestamp without time zone và timestamp mặc định bên dưới
+            payload["timestamp"] = naive_utc(pd.to_datetime(payload["timestamp"]))
             print("[INFO] Timestamp chuẩn hóa từ payload:", payload["timestamp"])
         else:
             payload["timestamp"] = pd.to_datetime(datetime.utcnow().isoformat())
@@ -734,170 +1207,13 @@ def on_message(client, userdata, msg, properties=None, reason_code=None):
         else:
             print("[INFO] Location từ payload:", payload["location"])
         
-        # Dự đoán chất lượng không khí
-        print("[INFO] Bắt đầu dự đoán chất lượng không khí...")
-        payload["air_quality"] = predict_air_quality(payload)
-        print("[INFO] Chất lượng không khí dự đoán:", payload["air_quality"])
-
-        # Tạo phiên làm việc với cơ sở dữ liệu
-        session = SessionLocal()
-        
-        # Lưu vào PostgreSQL (bảng chính)
-        print("[INFO] Lưu dữ liệu vào bảng air_quality_data...")
-        new_entry = AirQualityData(**payload)
-        session.add(new_entry)
-        
-        # Lưu dữ liệu vào các bảng riêng biệt
-        save_sensor_data_to_individual_tables(session, payload["timestamp"], payload["location"], payload)
-        
-        session.commit()
-        print("[INFO] Lưu thành công dữ liệu vào tất cả các bảng.")
-
-        # Tính toán các đặc trưng thời gian
-        print("[INFO] Tính toán các đặc trưng thời gian từ timestamp...")
-        day_sin, day_cos, year_sin, year_cos = map(float, calculate_sin_cos_features(payload["timestamp"]))
-        print(f"[INFO] Đặc trưng thời gian: day_sin={day_sin:.4f}, day_cos={day_cos:.4f}, year_sin={year_sin:.4f}, year_cos={year_cos:.4f}")
-
-        # Lưu vào bảng air_quality_predict
-        print("[INFO] Lưu dự đoán vào bảng air_quality_predict...")
-        predict_entry = AirQualityPredict(
-            timestamp=payload["timestamp"],
-            location=payload["location"],
-            temperature=payload["temperature"],
-            day_sin=day_sin,
-            day_cos=day_cos,
-            year_sin=year_sin,
-            year_cos=year_cos
-        )
-        session.add(predict_entry)
-        session.commit()
-        print("[INFO] Lưu thành công dự đoán vào air_quality_predict.")
-
-        # Lấy 6 dữ liệu gần nhất từ air_quality_predict cho location hiện tại để dự đoán
-        print(f"[INFO] Lấy 6 dữ liệu gần nhất cho location {payload['location']} từ bảng air_quality_predict...")
-        last_6_entries = session.query(AirQualityPredict).filter(
-            AirQualityPredict.location == payload["location"]
-        ).order_by(AirQualityPredict.timestamp.desc()).limit(6).all()
-        last_6_entries.reverse()  # Đảm bảo đúng thứ tự thời gian
-       
-       # Thêm log chi tiết cho 6 điểm dữ liệu đầu vào
-        print("\n[INFO] === CHI TIẾT 6 DỮ LIỆU ĐẦU VÀO CHO LSTM ===")
-        for i, entry in enumerate(last_6_entries):
-             print(f"[INFO] Dữ liệu #{i+1}: timestamp={entry.timestamp}, temperature={entry.temperature:.2f}°C, "
-                  f"day_sin={entry.day_sin:.4f}, day_cos={entry.day_cos:.4f}, "
-                  f"year_sin={entry.year_sin:.4f}, year_cos={entry.year_cos:.4f}")
-        
-        if len(last_6_entries) < 6:
-            print(f"[WARNING] Chỉ có {len(last_6_entries)} mẫu dữ liệu có sẵn cho location {payload['location']}, cần ít nhất 6 mẫu để dự đoán LSTM.")
-            if len(last_6_entries) > 0:
-                print("[INFO] Dữ liệu có sẵn:", last_6_entries)
-            if session:
-                session.close()
-            return
-            
-        print("[INFO] 6 dữ liệu gần nhất đã được lấy.")
-
-        # Chuyển dữ liệu thành định dạng cho LSTM
-        print("[INFO] Chuyển dữ liệu thành định dạng cho LSTM...")
-        data_for_lstm = [
-            {
-                'timestamp': entry.timestamp,
-                'temperature': entry.temperature,
-                'day_sin': entry.day_sin,
-                'day_cos': entry.day_cos,
-                'year_sin': entry.year_sin,
-                'year_cos': entry.year_cos
-            } for entry in last_6_entries
-        ]
-        print("[INFO] Dữ liệu LSTM đã được chuẩn bị.")
-
-        # Log memory usage before prediction
-        log_memory_usage()
-        
-        # Dự đoán nhiệt độ cho n ngày tiếp theo
-        print("[INFO] Bắt đầu dự đoán nhiệt độ...")
-        n_days = 7  # Có thể điều chỉnh số ngày dự đoán ở đây
-        predictions = predict_temperature_lstm(modelLstm, data_for_lstm, scaler_lstm, n_days=n_days)
-        print(f"[INFO] Dự đoán hoàn thành với {len(predictions)} giá trị nhiệt độ.")
+        # Chuyển sang stage phân loại theo micro-batch; lưu DB và lên lịch dự báo diễn ra sau khi phân loại
+        service.classification_stage.submit(payload)
 
-        # Log memory after prediction
-        log_memory_usage()
-        
-        # Xóa toàn bộ bảng air_quality_predict_data cho location hiện tại trước khi cập nhật dữ liệu mới
-        print(f"[INFO] Xóa dữ liệu cho location {payload['location']} từ bảng air_quality_predict_data trước khi thêm dữ liệu mới...")
-        session.query(AirQualityPredictData).filter(
-            AirQualityPredictData.location == payload["location"]
-        ).delete()
-        session.commit()
-        print(f"[INFO] Đã xóa dữ liệu cho location {payload['location']} từ bảng air_quality_predict_data.")
-        
-        # Lưu kết quả dự đoán vào air_quality_predict_data - xử lý theo batch
-        print("[INFO] Lưu kết quả dự đoán vào bảng air_quality_predict_data...")
-        current_timestamp = pd.to_datetime(payload["timestamp"])
-        current_location = payload["location"]
-
-        # Xử lý dữ liệu theo từng batch để giảm sử dụng bộ nhớ
-        batch_size = 96  # Xử lý 24 giờ mỗi lần (4 mẫu/giờ * 24 giờ)
-        total_predictions = len(predictions)
-        total_saved = 0
-        
-        for batch_start in range(0, total_predictions, batch_size):
-            batch_end = min(batch_start + batch_size, total_predictions)
-            batch_predictions = predictions[batch_start:batch_end]
-            
-            # Tạo thời gian cho batch này
-            batch_times = [current_timestamp + timedelta(minutes=(i+1) * 15) 
-                         for i in range(batch_start, batch_end)]
-            
-            # Tạo DataFrame cho batch
-            batch_data = pd.DataFrame({
-                "timestamp": batch_times,
-                "temperature": batch_predictions
-            })
-            
-            # Tính trung bình theo giờ để giảm kích thước dữ liệu
-            df_hourly = batch_data.set_index("timestamp").resample("H").mean().reset_index()
-            
-            # Tạo các mục nhập cơ sở dữ liệu
-            predict_entries = []
-            for _, row in df_hourly.iterrows():
-                day_sin, day_cos, year_sin, year_cos = calculate_sin_cos_features(row["timestamp"])
-                predict_entries.append(
-                    AirQualityPredictData(
-                        timestamp=row["timestamp"],
-                        location=current_location,  # Sử dụng location từ payload
-                        temperature=float(row["temperature"]),
-                        day_sin=float(day_sin),
-                        day_cos=float(day_cos),
-                        year_sin=float(year_sin),
-                        year_cos=float(year_cos)
-                    )
-                )
-            
-            # Lưu batch vào cơ sở dữ liệu
-            if predict_entries:
-                session.add_all(predict_entries)
-                session.commit()
-                total_saved += len(predict_entries)
-                print(f"[INFO] Đã lưu batch {batch_start//batch_size + 1}: {len(predict_entries)} mẫu dữ liệu dự đoán.")
-            
-            # Giải phóng bộ nhớ sau mỗi batch
-            del batch_data, df_hourly, predict_entries, batch_predictions, batch_times
-            gc.collect()
-        
-        print(f"[INFO] Tổng cộng đã lưu {total_saved} mẫu dữ liệu dự đoán theo giờ.")
-        
-        # Đóng phiên làm việc với cơ sở dữ liệu
-        session.close()
-        session = None
         total_processing_time = time.time() - message_start_time
         performance_monitor.record_processing_time(total_processing_time)
         print(f"[INFO] Đã xử lý xong payload: {payload}.")
         print(f"[INFO] Total processing time: {total_processing_time:.2f} seconds")
-        # Giải phóng bộ nhớ cuối cùng
-        del predictions, data_for_lstm, last_6_entries, payload
-        gc.collect()
-        tf.keras.backend.clear_session()
         
         # Log memory at end
         log_memory_usage()
@@ -907,14 +1223,6 @@ def on_message(client, userdata, msg, properties=None, reason_code=None):
         print("[ERROR] Error processing message:", e)
         import traceback
         traceback.print_exc()
-        
-        # Đảm bảo đóng phiên làm việc với cơ sở dữ liệu nếu xảy ra lỗi
-        if session:
-            session.close()
-        
-        # Giải phóng tài nguyên khi có lỗi
-        tf.keras.backend.clear_session()
-        gc.collect()
 
 # MQTT Setup
 def setup_mqtt_client():
@@ -941,37 +1249,195 @@ def setup_mqtt_client():
         import sys
         sys.exit(1)
 
-# Main function
-def main():
-    print("[INFO] Khởi động hệ thống dự đoán chất lượng không khí...")
-    
-    # Tạo bảng nếu chưa tồn tại
-    print("[INFO] Đảm bảo rằng các bảng cơ sở dữ liệu tồn tại...")
-    Base.metadata.create_all(bind=engine)
-    
-    # Kiểm tra kết nối đến cơ sở dữ liệu
-    try:
+# Service gom toàn bộ tài nguyên của subscriber. Import module không tải mô hình và không kết nối
+# database/MQTT: mỗi tài nguyên được tạo lười ở lần dùng đầu tiên, còn start() khởi tạo song song
+# mô hình DNN, mô hình LSTM, database và MQTT rồi mới chạy các thread nền.
+class SubscriberService:
+    def __init__(self):
+        self.state = "created"  # created -> starting -> ready | failed
+        self.error = None
+        self.timings = {}  # Tên tài nguyên / bước khởi động -> số giây
+        self.import_to_ready = None
+        self.ready = threading.Event()
+        self.mqtt_client = None
+        self.ingest_writer = BulkIngestWriter(
+            engine,
+            INGEST_TABLE_COLUMNS,
+            flush_interval=INGEST_FLUSH_INTERVAL,
+            max_rows=INGEST_FLUSH_MAX_ROWS,
+            on_flush=on_ingest_flush,
+            on_error=lambda e: performance_monitor.record_error(),
+            notifications=ingest_notifications,
+            max_pending_rows=INGEST_MAX_PENDING_ROWS,
+        )
+        self._resources = {}
+        self._resource_locks = {}
+        self._lock = threading.Lock()
+
+    def _resource(self, name, factory):
+        """Tạo tài nguyên đúng một lần (an toàn giữa các thread) và ghi lại thời gian tạo"""
+        if name in self._resources:
+            return self._resources[name]
+        with self._lock:
+            resource_lock = self._resource_locks.setdefault(name, threading.Lock())
+        with resource_lock:
+            if name not in self._resources:
+                start_time = time.perf_counter()
+                self._resources[name] = factory()
+                self.timings[name] = time.perf_counter() - start_time
+                print(f"[INFO] Đã khởi tạo {name} trong {self.timings[name]:.2f}s")
+        return self._resources[name]
+
+    @property
+    def scaler(self):
+        return self._resource("scaler", lambda: load_scaler(DNN_SCALER_PATH))
+
+    @property
+    def scaler_lstm(self):
+        return self._resource("scaler_lstm", lambda: load_scaler(LSTM_SCALER_PATH))
+
+    @property
+    def dnn_model(self):
+        return self._resource("dnn_model", lambda: load_backend(INFERENCE_BACKEND, DNN_MODEL_PATH))
+
+    @property
+    def air_quality_classifier(self):
+        # Classifier DNN dùng chung cho các batch
+        return self._resource("air_quality_classifier", lambda: AirQualityClassifier(self.dnn_model, self.scaler))
+
+    @property
+    def classification_stage(self):
+        return self._resource("classification_stage",
+                              lambda: ClassificationStage(self.air_quality_classifier, persist_classified_payloads))
+
+    @property
+    def lstm_window_store(self):
+        return self._resource("lstm_window_store", lambda: LSTMWindowStore(self.scaler_lstm, load_lstm_windows_from_db))
+
+    @property
+    def forecast_worker_pool(self):
+        model_path = LSTM_DIRECT_MODEL_PATH if LSTM_FORECAST_MODE == "direct" else LSTM_MODEL_PATH
+        return self._resource("forecast_worker_pool",
+                              lambda: ForecastWorkerPool(model_path, self.scaler_lstm, self.lstm_window_store))
+
+    @property
+    def forecast_scheduler(self):
+        return self._resource("forecast_scheduler", lambda: ForecastScheduler(self.forecast_worker_pool))
+
+    def load_models(self):
+        """Tải mô hình DNN (và chạy thử một lần để trace tf.function) cùng scaler LSTM"""
+        self.air_quality_classifier.classify(np.zeros((1, 7), dtype=np.float32))
+        return self.scaler_lstm is not None
+
+    # Các bước khởi động, chạy song song trong start()
+    def _start_classifier(self):
+        self.load_models()
+
+    def _start_forecasting(self):
+        self.forecast_worker_pool.start()
+        self.forecast_worker_pool.wait_until_loaded()
+
+    def _start_database(self):
+        print("[INFO] Đảm bảo rằng các bảng cơ sở dữ liệu tồn tại...")
+        prepare_database(engine)
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
         print("[INFO] Kết nối thành công đến cơ sở dữ liệu PostgreSQL.")
-    except Exception as e:
-        print(f"[ERROR] Không thể kết nối đến cơ sở dữ liệu: {e}")
+
+        # Nạp sẵn cửa sổ LSTM của các location đã có dữ liệu
+        print(f"[INFO] Đã nạp cửa sổ LSTM cho {self.lstm_window_store.warm()} location")
+
+    def _connect_mqtt(self):
+        self.mqtt_client = setup_mqtt_client()
+
+    def _timed_step(self, name, step):
+        start_time = time.perf_counter()
+        step()
+        self.timings[f"startup_{name}"] = time.perf_counter() - start_time
+
+    def start(self):
+        """Khởi tạo song song mô hình, database và MQTT rồi chạy các thread nền; trả về True khi sẵn sàng"""
+        self.state = "starting"
+        start_time = time.perf_counter()
+        steps = {
+            "dnn": self._start_classifier,
+            "lstm": self._start_forecasting,
+            "database": self._start_database,
+            "mqtt": self._connect_mqtt,
+        }
+        errors = {}
+        with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="startup") as executor:
+            futures = {name: executor.submit(self._timed_step, name, step) for name, step in steps.items()}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[name] = e
+                    print(f"[ERROR] Khởi động {name} thất bại: {e}")
+
+        if errors:
+            self.state = "failed"
+            self.error = "; ".join(f"{name}: {e}" for name, e in errors.items())
+            if self.mqtt_client is not None:
+                self.mqtt_client.disconnect()
+            return False
+
+        self.timings["startup"] = time.perf_counter() - start_time
+        self._start_background_threads()
+
+        self.import_to_ready = time.perf_counter() - IMPORT_STARTED_AT
+        self.state = "ready"
+        self.ready.set()
+        print(f"[INFO] Service sẵn sàng sau {self.import_to_ready:.2f}s kể từ lúc import "
+              f"(khởi động {self.timings['startup']:.2f}s)")
+        return True
+
+    def _start_background_threads(self):
+        # Thêm phần này để khởi động monitoring threads
+        print("[INFO] Khởi động performance monitoring threads...")
+
+        # Thread để hiển thị thống kê định kỳ
+        stats_thread = threading.Thread(target=periodic_stats_reporter, daemon=True)
+        stats_thread.start()
+
+        # Thread để lưu thống kê vào database
+        db_stats_thread = threading.Thread(target=periodic_stats_saver, daemon=True)
+        db_stats_thread.start()
+
+        # Thread tạo partition trước, áp dụng chính sách lưu trữ và cập nhật bảng tổng hợp
+        partition_thread = threading.Thread(target=periodic_partition_maintenance, daemon=True)
+        partition_thread.start()
+
+        # Ingest writer và stage phân loại DNN theo micro-batch
+        self.ingest_writer.start()
+        self.classification_stage.start()
+
+        # Thread scheduler gửi job dự báo LSTM theo batch
+        forecast_thread = threading.Thread(target=self.forecast_scheduler.run_forever, daemon=True)
+        forecast_thread.start()
+
+        print("[INFO] Performance monitoring threads started successfully")
+
+    def readiness(self):
+        return {
+            'state': self.state,
+            'error': self.error,
+            'import_to_ready_seconds': self.import_to_ready,
+            'timings': dict(self.timings),
+        }
+
+service = SubscriberService()
+
+# Main function
+def main():
+    print("[INFO] Khởi động hệ thống dự đoán chất lượng không khí...")
+
+    # Tải mô hình, chuẩn bị database và kết nối MQTT song song
+    if not service.start():
+        print(f"[ERROR] Không thể khởi động hệ thống: {service.error}")
         return
+    client = service.mqtt_client
 
-    # Thiết lập và chạy MQTT client
-    client = setup_mqtt_client()
-    # Thêm phần này để khởi động monitoring threads
-    print("[INFO] Khởi động performance monitoring threads...")
-    
-    # Thread để hiển thị thống kê định kỳ
-    stats_thread = threading.Thread(target=periodic_stats_reporter, daemon=True)
-    stats_thread.start()
-    
-    # Thread để lưu thống kê vào database
-    db_stats_thread = threading.Thread(target=periodic_stats_saver, daemon=True)
-    db_stats_thread.start()
-    
-    print("[INFO] Performance monitoring threads started successfully")
     # Thêm signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -0,0 +1,211 @@
+"""
+Chạy modelLSTM / modelDNN bằng NumPy thuần, không cần TensorFlow.
+
+Trọng số được đọc thẳng từ file .keras (config.json + model.weights.h5, cần h5py).
+Hỗ trợ mô hình Sequential gồm các lớp LSTM (return_sequences=False), Dense,
+BatchNormalization, Activation và Dropout:
+
+- BatchNormalization (chế độ suy luận) được gộp vào Dense đứng trước nó.
+- Dropout bị bỏ qua khi suy luận.
+- Phần x @ kernel của LSTM được tính một lần cho mọi bước thời gian; vòng lặp
+  chỉ còn h @ recurrent_kernel, trên các buffer trạng thái cấp phát sẵn theo batch.
+"""
+import io
+import json
+import re
+import zipfile
+
+import numpy as np
+
+
+def to_snake_case(name):
+    """Giống keras.src.utils.naming.to_snake_case: tên nhóm trọng số của lớp trong file .weights.h5"""
+    name = re.sub(r"\W+", "", name)
+    name = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
+    return re.sub("([a-z])([A-Z])", r"\1_\2", name).lower()
+
+
+WEIGHTED_LAYERS = ("LSTM", "Dense", "BatchNormalization")
+
+
+def read_keras_archive(path):
+    """
+    Returns:
+        (input_shape, layers, weights): kích thước đầu vào không gồm chiều batch, danh sách
+        (class_name, config) các lớp theo thứ tự (không gồm InputLayer) và danh sách mảng
+        trọng số tương ứng của từng lớp.
+    """
+    import h5py
+
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = io.BytesIO(archive.read("model.weights.h5"))
+
+    if config["class_name"] != "Sequential":
+        raise ValueError(f"{path}: chỉ hỗ trợ mô hình Sequential, không phải {config['class_name']}")
+    layers = [(layer["class_name"], layer["config"]) for layer in config["config"]["layers"]
+              if layer["class_name"] != "InputLayer"]
+
+    weights = []
+    used_names = {}
+    with h5py.File(weights_file, "r") as store:
+        for class_name, _ in layers:
+            # Keras 3 đặt tên nhóm theo tên lớp dạng snake_case, thêm _1, _2... khi trùng
+            name = to_snake_case(class_name)
+            if name in used_names:
+                used_names[name] += 1
+                name = f"{name}_{used_names[name]}"
+            else:
+                used_names[name] = 0
+
+            group = store["layers"].get(name)
+            if group is not None and "cell" in group:
+                group = group["cell"]
+            variables = group.get("vars") if group is not None else None
+            if not variables and class_name in WEIGHTED_LAYERS:
+                raise ValueError(f"{path}: không tìm thấy trọng số của lớp {class_name} (layers/{name})")
+            weights.append([np.asarray(variables[str(i)]) for i in range(len(variables))] if variables else [])
+
+    input_shape = tuple(config["config"]["layers"][0]["config"]["batch_shape"][1:])
+    return input_shape, layers, weights
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    # 1 / (1 + exp(-x)) viết qua tanh để không bị tràn số với x âm lớn
+    np.multiply(x, 0.5, out=x)
+    np.tanh(x, out=x)
+    np.add(x, 1, out=x)
+    return np.multiply(x, 0.5, out=x)
+
+
+def _softmax(x):
+    np.subtract(x, x.max(axis=-1, keepdims=True), out=x)
+    np.exp(x, out=x)
+    return np.divide(x, x.sum(axis=-1, keepdims=True), out=x)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "tanh": lambda x: np.tanh(x, out=x),
+    "softmax": _softmax,
+}
+
+
+def activation(name):
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Activation chưa được hỗ trợ: {name}")
+    return ACTIVATIONS[name]
+
+
+class NumpySequentialModel:
+    """
+    Mô hình Sequential đã được chuyển sang các bước NumPy float32.
+
+    Gọi model(x) với x (batch, *input_shape) trả về mảng (batch, số đầu ra). Buffer trạng
+    thái LSTM được cấp phát lại chỉ khi kích thước batch thay đổi; một instance không
+    dùng chung được giữa các thread (NumpyBackend giữ lock).
+    """
+
+    def __init__(self, layers, weights, input_shape):
+        self.input_shape = tuple(input_shape)
+        self.lstm = None
+        self.dense = []  # [(kernel, bias, activation)] sau khi đã gộp BatchNormalization
+
+        for (class_name, config), variables in zip(layers, weights):
+            if class_name == "LSTM":
+                if self.lstm is not None or self.dense:
+                    raise ValueError("Chỉ hỗ trợ một lớp LSTM ở đầu mô hình")
+                if config.get("return_sequences") or config.get("go_backwards"):
+                    raise ValueError("LSTM cần return_sequences=False, go_backwards=False")
+                if config["activation"] != "tanh" or config["recurrent_activation"] != "sigmoid":
+                    raise ValueError("LSTM cần activation=tanh, recurrent_activation=sigmoid")
+                kernel, recurrent_kernel = variables[0], variables[1]
+                bias = variables[2] if config.get("use_bias", True) else np.zeros(kernel.shape[1])
+                self.lstm = (kernel.astype(np.float32), recurrent_kernel.astype(np.float32),
+                             bias.astype(np.float32), int(config["units"]))
+            elif class_name == "Dense":
+                kernel = variables[0].astype(np.float64)
+                bias = variables[1].astype(np.float64) if config.get("use_bias", True) else np.zeros(kernel.shape[1])
+                self.dense.append([kernel, bias, activation(config["activation"])])
+            elif class_name == "BatchNormalization":
+                if not self.dense or self.dense[-1][2] is not ACTIVATIONS["linear"]:
+                    raise ValueError("BatchNormalization chỉ được hỗ trợ ngay sau Dense không có activation")
+                variables = list(variables)
+                gamma = variables.pop(0) if config.get("scale", True) else 1.0
+                beta = variables.pop(0) if config.get("center", True) else 0.0
+                moving_mean, moving_variance = variables
+                factor = gamma / np.sqrt(moving_variance + config["epsilon"])
+                self.dense[-1][0] = self.dense[-1][0] * factor
+                self.dense[-1][1] = (self.dense[-1][1] - moving_mean) * factor + beta
+            elif class_name == "Activation":
+                if not self.dense or self.dense[-1][2] is not ACTIVATIONS["linear"]:
+                    raise ValueError("Activation chỉ được hỗ trợ ngay sau Dense không có activation")
+                self.dense[-1][2] = activation(config["activation"])
+            elif class_name == "Dropout":
+                continue
+            else:
+                raise ValueError(f"Lớp chưa được hỗ trợ: {class_name}")
+
+        self.dense = [(kernel.astype(np.float32), bias.astype(np.float32), fn) for kernel, bias, fn in self.dense]
+        self.output_size = self.dense[-1][0].shape[1] if self.dense else self.lstm[3]
+        self._state = None
+
+    @classmethod
+    def load(cls, path):
+        input_shape, layers, weights = read_keras_archive(path)
+        return cls(layers, weights, input_shape)
+
+    def _lstm_state(self, batch_size):
+        """Buffer h, c, z và các cổng cho batch_size; chỉ cấp phát lại khi batch đổi"""
+        if self._state is None or self._state["h"].shape[0] != batch_size:
+            units = self.lstm[3]
+            self._state = {
+                "h": np.empty((batch_size, units), dtype=np.float32),
+                "c": np.empty((batch_size, units), dtype=np.float32),
+                "z": np.empty((batch_size, 4 * units), dtype=np.float32),
+                "tmp": np.empty((batch_size, units), dtype=np.float32),
+            }
+        return self._state
+
+    def _run_lstm(self, x):
+        kernel, recurrent_kernel, bias, units = self.lstm
+        state = self._lstm_state(x.shape[0])
+        h, c, z, tmp = state["h"], state["c"], state["z"], state["tmp"]
+
+        # Phần đầu vào của mọi bước thời gian trong một phép nhân: (batch, T, 4 * units)
+        inputs = x @ kernel
+        inputs += bias
+        h.fill(0)
+        c.fill(0)
+        for t in range(x.shape[1]):
+            np.matmul(h, recurrent_kernel, out=z)
+            z += inputs[:, t]
+            # Thứ tự cổng của Keras: i, f, c, o
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units], out=z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            c *= f
+            np.multiply(i, g, out=tmp)
+            c += tmp
+            np.tanh(c, out=h)
+            h *= o
+        return h
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if self.lstm is not None:
+            x = self._run_lstm(x)
+            if not self.dense:
+                return x.copy()  # h là buffer dùng lại cho lần gọi sau
+        for kernel, bias, fn in self.dense:
+            x = x @ kernel
+            x += bias
+            x = fn(x)
+        return x
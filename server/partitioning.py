@@ -0,0 +1,178 @@
+"""
+Phân vùng theo tháng (PostgreSQL range partitioning trên cột timestamp),
+chính sách lưu trữ (xóa partition cũ thay vì DELETE hàng loạt) và bảng tổng
+hợp theo giờ/ngày cho dữ liệu cảm biến.
+"""
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+ROLLUP_METRICS = ["temperature", "humidity", "pm25", "pm10", "no2", "so2", "co"]
+ROLLUP_LOOKBACK = timedelta(days=1)  # Dữ liệu đến trễ trong khoảng này vẫn được tổng hợp lại
+
+
+def month_start(value, offset=0):
+    """Ngày đầu tháng của value, dịch offset tháng"""
+    month_index = value.year * 12 + (value.month - 1) + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": table}).first() is not None
+
+
+def table_exists(conn, table):
+    return conn.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar() is not None
+
+
+def list_monthly_partitions(conn, table):
+    """Trả về dict tên partition -> tháng bắt đầu, chỉ gồm các partition dạng <table>_YYYY_MM"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table}).all()
+    pattern = re.compile(rf"^{re.escape(table)}_(\d{{4}})_(\d{{2}})$")
+    partitions = {}
+    for (name,) in rows:
+        match = pattern.match(name)
+        if match:
+            partitions[name] = datetime(int(match.group(1)), int(match.group(2)), 1)
+    return partitions
+
+
+def create_monthly_partition(conn, table, month):
+    start, end = month_start(month), month_start(month, 1)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    ))
+
+
+def ensure_monthly_partitions(engine, table, months_ahead=2, now=None):
+    """Tạo trước partition cho tháng hiện tại và months_ahead tháng tiếp theo, cùng partition DEFAULT"""
+    now = now or datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    for offset in range(months_ahead + 1):
+        try:
+            with engine.begin() as conn:
+                create_monthly_partition(conn, table, month_start(now, offset))
+        except Exception as e:
+            # Ví dụ: partition DEFAULT đã chứa dữ liệu thuộc tháng này
+            print(f"[ERROR] Không thể tạo partition {partition_name(table, month_start(now, offset))}: {e}")
+
+
+def drop_expired_partitions(engine, table, retention_months, now=None):
+    """
+    Xóa các partition tháng đã hết hạn lưu trữ (toàn bộ tháng cũ hơn retention_months) và
+    các dòng hết hạn nằm trong partition DEFAULT (tháng chưa có partition riêng).
+    """
+    if retention_months is None:
+        return []
+    cutoff = month_start(now or datetime.utcnow(), -retention_months)
+    dropped = []
+    with engine.begin() as conn:
+        for name, month in sorted(list_monthly_partitions(conn, table).items(), key=lambda item: item[1]):
+            if month_start(month, 1) <= cutoff:
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        default_rows = 0
+        if table_exists(conn, f"{table}_default"):
+            default_rows = conn.execute(text(
+                f"DELETE FROM {table}_default WHERE timestamp < :cutoff"
+            ), {"cutoff": cutoff}).rowcount
+    if dropped:
+        print(f"[INFO] Đã xóa {len(dropped)} partition hết hạn của {table}: {dropped}")
+    if default_rows:
+        print(f"[INFO] Đã xóa {default_rows} dòng hết hạn trong {table}_default")
+    return dropped
+
+
+def migrate_to_partitioned(engine, table):
+    """
+    Chuyển một bảng thường (id SERIAL PRIMARY KEY) đã có dữ liệu thành bảng phân vùng theo tháng.
+
+    Bảng cũ được đổi tên thành <table>_legacy, bảng mới cùng cấu trúc được tạo với
+    PARTITION BY RANGE (timestamp) và khóa chính (id, timestamp), dữ liệu được chép
+    sang (bỏ các dòng không có timestamp) rồi bảng cũ bị xóa, tất cả trong một transaction.
+    Không làm gì nếu bảng chưa tồn tại hoặc đã được phân vùng.
+    """
+    with engine.begin() as conn:
+        if not table_exists(conn, table) or is_partitioned(conn, table):
+            return False
+
+        print(f"[INFO] Chuyển bảng {table} sang phân vùng theo tháng...")
+        legacy = f"{table}_legacy"
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        conn.execute(text(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN timestamp SET NOT NULL"))
+        conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, timestamp)"))
+        conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+        # Partition cho toàn bộ khoảng thời gian của dữ liệu cũ
+        first, last = conn.execute(text(f"SELECT min(timestamp), max(timestamp) FROM {legacy}")).one()
+        if first is not None:
+            month = month_start(first)
+            while month <= last:
+                create_monthly_partition(conn, table, month)
+                month = month_start(month, 1)
+
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy} WHERE timestamp IS NOT NULL"))
+
+        # Giữ sequence của cột id khi xóa bảng cũ
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": legacy}).scalar()
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    return True
+
+
+def refresh_rollups(engine, source_table="air_quality_data",
+                    hourly_table="air_quality_hourly", daily_table="air_quality_daily", lookback=ROLLUP_LOOKBACK):
+    """
+    Cập nhật bảng tổng hợp theo giờ từ dữ liệu thô và theo ngày từ bảng theo giờ.
+
+    Mỗi location được tính lại từ bucket mới nhất của chính location đó lùi thêm lookback
+    (bucket mới nhất có thể chưa đủ dữ liệu, dữ liệu có thể đến trễ); location chưa có bucket
+    nào được tính từ đầu. Trạm chậm hơn các trạm khác vì vậy không bị bỏ sót.
+    """
+    averages = ", ".join(f"avg({m})" for m in ROLLUP_METRICS)
+    updates = ", ".join(f"{m} = EXCLUDED.{m}" for m in ROLLUP_METRICS)
+    columns = ", ".join(ROLLUP_METRICS)
+    weighted = ", ".join(f"sum({m} * samples) / NULLIF(sum(samples), 0)" for m in ROLLUP_METRICS)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO {hourly_table} (location, bucket, samples, {columns}, temperature_min, temperature_max)
+            SELECT s.location, date_trunc('hour', s.timestamp), count(*), {averages}, min(temperature), max(temperature)
+            FROM {source_table} s
+            LEFT JOIN (SELECT location, max(bucket) AS bucket FROM {hourly_table} GROUP BY location) w
+                ON w.location = s.location
+            WHERE s.timestamp >= date_trunc('hour', COALESCE(w.bucket - :lookback, '-infinity'))
+            GROUP BY 1, 2
+            ON CONFLICT (location, bucket) DO UPDATE SET samples = EXCLUDED.samples, {updates},
+                temperature_min = EXCLUDED.temperature_min, temperature_max = EXCLUDED.temperature_max
+        """), {"lookback": lookback})
+        conn.execute(text(f"""
+            INSERT INTO {daily_table} (location, bucket, samples, {columns}, temperature_min, temperature_max)
+            SELECT h.location, date_trunc('day', h.bucket), sum(samples), {weighted}, min(temperature_min), max(temperature_max)
+            FROM {hourly_table} h
+            LEFT JOIN (SELECT location, max(bucket) AS bucket FROM {daily_table} GROUP BY location) w
+                ON w.location = h.location
+            WHERE h.bucket >= date_trunc('day', COALESCE(w.bucket - :lookback, '-infinity'))
+            GROUP BY 1, 2
+            ON CONFLICT (location, bucket) DO UPDATE SET samples = EXCLUDED.samples, {updates},
+                temperature_min = EXCLUDED.temperature_min, temperature_max = EXCLUDED.temperature_max
+        """), {"lookback": lookback})
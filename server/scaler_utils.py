@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def scaler_affine(scaler):
+    """
+    Chuyển một scaler sklearn đã fit thành dạng affine x * scale + offset.
+
+    Hỗ trợ StandardScaler và MinMaxScaler, cho phép chuẩn hóa bằng phép tính
+    numpy trực tiếp thay vì gọi scaler.transform cho từng giá trị.
+
+    Parameters:
+        scaler: Scaler đã được fit (StandardScaler hoặc MinMaxScaler).
+
+    Returns:
+        (scale, offset): Hai mảng numpy float64 có kích thước (n_features,).
+    """
+    if hasattr(scaler, "min_") and hasattr(scaler, "data_min_"):
+        # MinMaxScaler: x * scale_ + min_
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+        offset = np.asarray(scaler.min_, dtype=np.float64)
+        return scale, offset
+
+    if hasattr(scaler, "mean_") or hasattr(scaler, "with_mean"):
+        # StandardScaler: (x - mean_) / scale_
+        n_features = int(scaler.n_features_in_)
+        mean = scaler.mean_ if getattr(scaler, "with_mean", True) and scaler.mean_ is not None else np.zeros(n_features)
+        std = scaler.scale_ if getattr(scaler, "with_std", True) and scaler.scale_ is not None else np.ones(n_features)
+        scale = 1.0 / np.asarray(std, dtype=np.float64)
+        offset = -np.asarray(mean, dtype=np.float64) * scale
+        return scale, offset
+
+    raise TypeError(f"Không hỗ trợ chuẩn hóa affine cho scaler kiểu {type(scaler).__name__}")
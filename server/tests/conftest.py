@@ -0,0 +1,51 @@
+import functools
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+MODELS = {
+    "dnn": os.path.join(SERVER_DIR, "modelDNN.keras"),
+    "lstm": os.path.join(SERVER_DIR, "modelLSTM.keras"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def dataset_inputs(name):
+    """
+    Mọi đầu vào đã chuẩn hóa lấy từ dataset, float32:
+    - dnn: 7 đặc trưng của updated_pollution_dataset.csv, chuẩn hóa bằng scalerDNN.pkl.
+    - lstm: mọi cửa sổ 6 điểm của temperature_data_test.csv, mỗi điểm [nhiệt độ chuẩn hóa bằng
+      scalerLSTM.pkl (StandardScaler), day_sin, day_cos, year_sin, year_cos].
+    """
+    pytest.importorskip("pandas")
+    pytest.importorskip("sklearn")
+    import numpy as np
+    from benchmark import load_scaler, lstm_test_windows, read_pollution_features
+    from scaler_utils import scaler_affine
+
+    if name == "dnn":
+        scale, offset = scaler_affine(load_scaler("scalerDNN.pkl"))
+        return (read_pollution_features() * scale + offset).astype(np.float32)
+    scale, offset = scaler_affine(load_scaler("scalerLSTM.pkl"))
+    windows, _ = lstm_test_windows()
+    windows[..., 0] = windows[..., 0] * scale[0] + offset[0]
+    return windows.astype(np.float32)
+
+
+def model_inputs(name, batch_size, seed=0):
+    """batch_size đầu vào của mô hình name chọn ngẫu nhiên (cố định theo seed) từ dataset_inputs"""
+    import numpy as np
+
+    inputs = dataset_inputs(name)
+    return inputs[np.random.default_rng(seed).choice(len(inputs), size=batch_size, replace=False)]
+
+
+@pytest.fixture(scope="session")
+def keras_models():
+    """Mô hình Keras gốc, dùng làm kết quả chuẩn"""
+    tf = pytest.importorskip("tensorflow")
+    return {name: tf.keras.models.load_model(path) for name, path in MODELS.items()}
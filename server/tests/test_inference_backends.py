@@ -0,0 +1,76 @@
+"""
+Parity của các backend tflite / onnx / numpy với mô hình Keras gốc.
+
+Backend nào chưa có runtime (tflite_runtime hoặc TensorFlow, onnxruntime, h5py) hoặc chưa
+có mô hình export (python export_models.py) thì test tương ứng bị bỏ qua.
+"""
+import importlib.util
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from conftest import MODELS, model_inputs
+
+ATOL = 1e-4
+BACKEND_RUNTIMES = {
+    "tflite": ("tflite_runtime", "tensorflow"),
+    "onnx": ("onnxruntime",),
+    "numpy": ("h5py",),
+}
+
+
+def require_runtime(backend):
+    if not any(importlib.util.find_spec(module) for module in BACKEND_RUNTIMES[backend]):
+        pytest.skip(f"backend {backend} cần một trong {BACKEND_RUNTIMES[backend]}")
+
+
+@pytest.fixture(scope="module")
+def loaded_backends():
+    return {}
+
+
+def backend_for(loaded_backends, backend, model):
+    from inference_backends import exported_model_path, load_backend
+
+    require_runtime(backend)
+    path = exported_model_path(MODELS[model], backend)
+    if not os.path.exists(path):
+        pytest.skip(f"chưa có {path}; chạy python export_models.py --formats {backend}")
+    if (backend, model) not in loaded_backends:
+        loaded_backends[(backend, model)] = load_backend(backend, MODELS[model])
+    return loaded_backends[(backend, model)]
+
+
+@pytest.mark.parametrize("model", ["dnn", "lstm"])
+@pytest.mark.parametrize("backend", ["tflite", "onnx", "numpy"])
+@pytest.mark.parametrize("batch_size", [1, 64])
+def test_backend_matches_keras(keras_models, loaded_backends, backend, model, batch_size):
+    candidate = backend_for(loaded_backends, backend, model)
+    x = model_inputs(model, batch_size)
+    expected = keras_models[model](x, training=False).numpy()
+
+    result = candidate(x)
+
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=ATOL)
+
+
+@pytest.mark.parametrize("backend", ["tflite", "onnx", "numpy"])
+def test_backend_handles_batch_size_changes(keras_models, loaded_backends, backend):
+    # tflite đổi kích thước tensor, numpy cấp phát lại buffer LSTM khi batch thay đổi
+    candidate = backend_for(loaded_backends, backend, "lstm")
+    for batch_size in (8, 1, 8, 33):
+        x = model_inputs("lstm", batch_size, seed=batch_size)
+        expected = keras_models["lstm"](x, training=False).numpy()
+        np.testing.assert_allclose(candidate(x), expected, rtol=0, atol=ATOL)
+
+
+def test_keras_backend_matches_model(keras_models):
+    from inference_backends import KerasBackend
+
+    backend = KerasBackend(keras_models["lstm"])
+    x = model_inputs("lstm", 16)
+    np.testing.assert_allclose(backend(x), keras_models["lstm"](x, training=False).numpy(), rtol=0, atol=1e-6)
+    assert backend.input_shape == x.shape[1:]
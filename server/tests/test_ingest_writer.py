@@ -0,0 +1,97 @@
+"""BulkIngestWriter với engine giả (không cần PostgreSQL): thread ghi không dừng khi callback lỗi."""
+import threading
+
+from ingest_writer import BulkIngestWriter
+
+TABLES = {"temperature_data": ("timestamp", "location", "value")}
+
+
+class FakeConnection:
+    def __init__(self, copied):
+        self.copied = copied
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, buffer):
+        self.copied.append(buffer.getvalue())
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def invalidate(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self):
+        self.copied = []
+
+    def raw_connection(self):
+        return FakeConnection(self.copied)
+
+
+def test_flush_survives_failing_on_flush():
+    errors = []
+
+    def on_flush(rows_by_table, duration):
+        raise RuntimeError("on_flush lỗi")
+
+    engine = FakeEngine()
+    writer = BulkIngestWriter(engine, TABLES, on_flush=on_flush, on_error=errors.append)
+    writer.add("temperature_data", ("2025-03-01 00:00:00", "hanoi", 21.5))
+
+    assert writer.flush() == 1
+    assert engine.copied == ["2025-03-01 00:00:00,hanoi,21.5\r\n"]
+    assert [str(e) for e in errors] == ["on_flush lỗi"]
+
+
+def test_writer_thread_keeps_running_after_errors():
+    flushed = []
+    calls = threading.Semaphore(0)
+
+    def on_flush(rows_by_table, duration):
+        flushed.append(rows_by_table)
+        calls.release()
+        if len(flushed) == 1:
+            raise RuntimeError("on_flush lỗi")
+
+    def on_error(error):
+        raise RuntimeError("on_error cũng lỗi")
+
+    writer = BulkIngestWriter(FakeEngine(), TABLES, flush_interval=0.01, on_flush=on_flush, on_error=on_error)
+    writer.start()
+    for value in (1.0, 2.0):
+        writer.add("temperature_data", ("2025-03-01 00:00:00", "hanoi", value))
+        assert calls.acquire(timeout=5)
+
+    assert writer.thread.is_alive()
+    assert [rows["temperature_data"][0][2] for rows in flushed] == [1.0, 2.0]
+
+
+def test_unexpected_flush_error_does_not_stop_thread(monkeypatch):
+    errors = []
+    flushed = threading.Event()
+    writer = BulkIngestWriter(FakeEngine(), TABLES, flush_interval=0.01, on_error=errors.append,
+                              on_flush=lambda rows_by_table, duration: flushed.set())
+    original_take = writer._take_pending
+    failures = iter([True])
+
+    def take_pending():
+        if next(failures, False):
+            raise RuntimeError("lỗi ngoài dự kiến")
+        return original_take()
+
+    monkeypatch.setattr(writer, "_take_pending", take_pending)
+    writer.add("temperature_data", ("2025-03-01 00:00:00", "hanoi", 21.5))
+    writer.start()
+
+    assert flushed.wait(timeout=5)
+    assert writer.thread.is_alive()
+    assert [str(e) for e in errors] == ["lỗi ngoài dự kiến"]
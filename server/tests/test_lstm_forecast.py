@@ -0,0 +1,50 @@
+"""LSTMForecastEngine so với vòng lặp dự báo cũ (benchmark.legacy_predict_temperature_lstm)."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+from benchmark import legacy_predict_temperature_lstm, load_scaler, sample_lstm_window
+ATOL = 1e-4  # °C
+
+
+@pytest.fixture(scope="module")
+def scaler_lstm():
+    return load_scaler("scalerLSTM.pkl")
+
+
+def engine_window(engine, data):
+    return np.array([
+        [engine.scale_temperature(e['temperature']), e['day_sin'], e['day_cos'], e['year_sin'], e['year_cos']]
+        for e in data
+    ])
+
+
+@pytest.mark.parametrize("offset", [0, 500])
+def test_forecast_matches_legacy_loop(keras_models, scaler_lstm, offset):
+    from lstm_forecast import LSTMForecastEngine
+
+    data = sample_lstm_window(offset)
+    engine = LSTMForecastEngine(keras_models["lstm"], scaler_lstm)
+
+    predictions = engine.forecast(engine_window(engine, data), data[-1]['timestamp'], 96)
+    expected = legacy_predict_temperature_lstm(keras_models["lstm"], data, scaler_lstm, n_days=1)
+
+    assert len(predictions) == 96
+    np.testing.assert_allclose(predictions, expected, rtol=0, atol=ATOL)
+
+
+def test_forecast_batch_matches_single_forecasts(keras_models, scaler_lstm):
+    from lstm_forecast import LSTMForecastEngine
+
+    engine = LSTMForecastEngine(keras_models["lstm"], scaler_lstm)
+    samples = [sample_lstm_window(offset) for offset in (0, 96, 1000)]
+    windows = np.stack([engine_window(engine, data) for data in samples])
+    timestamps = [data[-1]['timestamp'] for data in samples]
+
+    batch = engine.forecast_batch(windows, timestamps, 96)
+
+    for row, window, timestamp in zip(batch, windows, timestamps):
+        np.testing.assert_allclose(row, engine.forecast(window, timestamp, 96), rtol=0, atol=ATOL)
+
@@ -0,0 +1,68 @@
+"""LSTMWindowStore: cửa sổ theo location với timestamp có / không có múi giờ."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from lstm_windows import LSTMWindowStore
+
+
+class IdentityScaler:
+    # StandardScaler với mean 0, std 1: nhiệt độ chuẩn hóa bằng chính nó
+    n_features_in_ = 1
+    mean_ = np.zeros(1)
+    scale_ = np.ones(1)
+
+
+BASE = datetime(2025, 3, 1, 0, 0)  # UTC, như cột timestamp without time zone
+UTC7 = timezone(timedelta(hours=7))
+
+
+def entry(timestamp, temperature):
+    return {'timestamp': timestamp, 'temperature': temperature,
+            'day_sin': 0.0, 'day_cos': 1.0, 'year_sin': 0.0, 'year_cos': 1.0}
+
+
+def store_with(loaded):
+    return LSTMWindowStore(IdentityScaler(), lambda locations: loaded)
+
+
+def test_aware_payload_after_naive_warm():
+    store = store_with({"hanoi": [entry(BASE + timedelta(minutes=15 * i), float(i)) for i in range(6)]})
+    store.warm()
+
+    # 07:30+07:00 = 00:30 UTC: đã có trong cửa sổ, bị bỏ qua
+    store.append("hanoi", pd.Timestamp("2025-03-01 07:30", tz=UTC7), 99.0, 0.0, 1.0, 0.0, 1.0)
+    # 08:30+07:00 = 01:30 UTC: mẫu mới
+    store.append("hanoi", datetime(2025, 3, 1, 8, 30, tzinfo=UTC7), 6.0, 0.0, 1.0, 0.0, 1.0)
+
+    window, last_timestamp = store.windows(["hanoi"])["hanoi"]
+    assert last_timestamp == BASE + timedelta(minutes=90)
+    assert last_timestamp.tzinfo is None
+    np.testing.assert_array_equal(window[:, 0], [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+
+
+def test_pending_aware_rows_merge_with_naive_rows():
+    store = store_with({"hanoi": [entry(BASE + timedelta(minutes=15 * i), float(i)) for i in range(4)]})
+    # Đến trước khi location được nạp: giữ trong pending, gộp và sắp xếp cùng các dòng từ DB
+    for i in (4, 5):
+        aware = (BASE + timedelta(minutes=15 * i)).replace(tzinfo=timezone.utc).astimezone(UTC7)
+        store.append("hanoi", aware, float(i), 0.0, 1.0, 0.0, 1.0)
+    store.warm(["hanoi"])
+
+    window, last_timestamp = store.windows(["hanoi"])["hanoi"]
+    assert last_timestamp == BASE + timedelta(minutes=75)
+    np.testing.assert_array_equal(window[:, 0], [0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+def test_aware_rows_from_loader():
+    aware = [entry((BASE + timedelta(minutes=15 * i)).replace(tzinfo=timezone.utc), float(i)) for i in range(6)]
+    store = store_with({"hanoi": aware})
+    store.warm()
+    store.append("hanoi", BASE + timedelta(minutes=90), 6.0, 0.0, 1.0, 0.0, 1.0)
+
+    window, last_timestamp = store.windows(["hanoi"])["hanoi"]
+    assert last_timestamp == BASE + timedelta(minutes=90)
+    np.testing.assert_array_equal(window[:, 0], [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
@@ -0,0 +1,63 @@
+"""NumpySequentialModel so với model.predict của Keras trên modelLSTM.keras / modelDNN.keras."""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("h5py")
+
+from conftest import MODELS, model_inputs
+
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def numpy_models():
+    from numpy_inference import NumpySequentialModel
+
+    return {name: NumpySequentialModel.load(path) for name, path in MODELS.items()}
+
+
+@pytest.mark.parametrize("model", ["dnn", "lstm"])
+@pytest.mark.parametrize("batch_size", [1, 7, 256])
+def test_matches_keras_predict(keras_models, numpy_models, model, batch_size):
+    x = model_inputs(model, batch_size)
+    expected = keras_models[model].predict(x, verbose=0)
+
+    result = numpy_models[model](x)
+
+    assert result.dtype == np.float32
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=ATOL)
+
+
+def test_lstm_state_buffers_follow_batch_size(keras_models, numpy_models):
+    # Buffer trạng thái chỉ cấp phát lại khi batch đổi; kết quả trước đó không bị ghi đè
+    model = numpy_models["lstm"]
+    results = []
+    for batch_size in (64, 64, 1, 64, 5):
+        x = model_inputs("lstm", batch_size, seed=len(results))
+        results.append((x, model(x)))
+
+    for x, result in results:
+        np.testing.assert_allclose(result, keras_models["lstm"].predict(x, verbose=0), rtol=0, atol=ATOL)
+
+
+def test_input_shape_matches_keras(keras_models, numpy_models):
+    for name, model in numpy_models.items():
+        assert model.input_shape == tuple(keras_models[name].input_shape[1:])
+
+
+def test_rollout_matches_keras(keras_models, numpy_models):
+    # Sai số một bước cộng dồn qua 96 bước tự hồi quy
+    pytest.importorskip("sklearn")
+    from benchmark import load_scaler
+    from inference_backends import NumpyBackend
+    from lstm_forecast import LSTMForecastEngine
+
+    scaler_lstm = load_scaler("scalerLSTM.pkl")
+    windows = model_inputs("lstm", 8)
+    timestamps = np.datetime64("2025-03-01T00:00") + np.arange(8) * np.timedelta64(15, "m")
+    expected = LSTMForecastEngine(keras_models["lstm"], scaler_lstm).forecast_batch(windows, timestamps, 96)
+
+    result = LSTMForecastEngine(NumpyBackend(numpy_models["lstm"]), scaler_lstm).forecast_batch(windows, timestamps, 96)
+
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-3)
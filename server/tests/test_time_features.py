@@ -0,0 +1,49 @@
+"""time_features so với hàm calculate_sin_cos_features cũ (benchmark.legacy_calculate_sin_cos_features)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from benchmark import legacy_calculate_sin_cos_features
+from time_features import epoch_seconds, horizon_features, sin_cos_features
+
+ATOL = 1e-5
+BASES = [datetime(2024, 12, 6, 2, 53), datetime(2025, 3, 1, 0, 0), datetime(2025, 6, 30, 23, 45, 30)]
+INPUT_KINDS = {
+    "datetime": lambda ts: ts,
+    "datetime_utc+7": lambda ts: ts.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=7))),
+    "pd.Timestamp": pd.Timestamp,
+    "datetime64": lambda ts: np.datetime64(ts, "ns"),
+}
+
+
+def legacy_features(timestamps):
+    # pd.Timestamp không có múi giờ được coi là UTC, như trong vòng lặp dự báo cũ
+    return np.array([legacy_calculate_sin_cos_features(pd.Timestamp(ts)) for ts in timestamps])
+
+
+@pytest.mark.parametrize("kind", INPUT_KINDS)
+def test_epoch_seconds(kind):
+    timestamps = [INPUT_KINDS[kind](ts) for ts in BASES]
+    expected = [ts.replace(tzinfo=timezone.utc).timestamp() for ts in BASES]
+    np.testing.assert_array_equal(epoch_seconds(timestamps), expected)
+    assert epoch_seconds(INPUT_KINDS[kind](BASES[0])) == 1733453580.0
+
+
+@pytest.mark.parametrize("kind", INPUT_KINDS)
+def test_sin_cos_features_matches_legacy(kind):
+    timestamps = [INPUT_KINDS[kind](ts) for ts in BASES]
+    np.testing.assert_allclose(sin_cos_features(timestamps), legacy_features(BASES), rtol=0, atol=ATOL)
+
+
+@pytest.mark.parametrize("kind", INPUT_KINDS)
+def test_horizon_features_matches_legacy(kind):
+    n_steps = 7 * 24 * 4
+    features = horizon_features([INPUT_KINDS[kind](ts) for ts in BASES], n_steps)
+
+    assert features.shape == (len(BASES), n_steps, 4)
+    for base, result in zip(BASES, features):
+        expected = legacy_features([base + timedelta(minutes=15 * (k + 1)) for k in range(n_steps)])
+        np.testing.assert_allclose(result, expected, rtol=0, atol=ATOL)
@@ -0,0 +1,102 @@
+"""
+Đặc trưng thời gian day_sin, day_cos, year_sin, year_cos dùng chung cho ingest,
+dự báo LSTM, lưu dự báo và huấn luyện.
+
+Công thức giống calculate_sin_cos_features cũ: góc = giây epoch * 2π / chu kỳ, với chu kỳ
+một ngày và 365.2425 ngày; timestamp không có múi giờ được coi là UTC (như pd.Timestamp.timestamp()).
+"""
+import functools
+from datetime import timezone
+
+import numpy as np
+import pandas as pd
+
+DAY_SECONDS = 60 * 60 * 24
+YEAR_SECONDS = 365.2425 * DAY_SECONDS
+DAY_FREQUENCY = 2 * np.pi / DAY_SECONDS
+YEAR_FREQUENCY = 2 * np.pi / YEAR_SECONDS
+GRID_TIME_STEP = 15 * 60
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def epoch_seconds(timestamps):
+    """
+    Chuyển timestamp (datetime64, datetime/pd.Timestamp, danh sách của chúng, hoặc số giây)
+    thành mảng float64 giây epoch có cùng kích thước.
+    """
+    values = np.asarray(timestamps)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.float64)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    # datetime / pd.Timestamp / chuỗi: timestamp có múi giờ được đổi về UTC, không có múi giờ giữ nguyên.
+    # Không dùng .asi8: đơn vị của nó theo độ phân giải của index (datetime -> "us" từ pandas 2)
+    seconds = (pd.to_datetime(values.ravel(), utc=True) - EPOCH) / pd.Timedelta(seconds=1)
+    return np.asarray(seconds, dtype=np.float64).reshape(values.shape)
+
+
+def naive_utc(timestamp):
+    """
+    datetime / pd.Timestamp có múi giờ -> giờ UTC không múi giờ, như các cột timestamp without
+    time zone trong DB; timestamp không có múi giờ (đã là UTC) và datetime64 giữ nguyên.
+    """
+    if getattr(timestamp, "tzinfo", None) is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def sin_cos_features(timestamps):
+    """
+    Parameters:
+        timestamps: Mảng timestamp kích thước bất kỳ (xem epoch_seconds).
+
+    Returns:
+        Mảng float32 kích thước (*timestamps.shape, 4): day_sin, day_cos, year_sin, year_cos.
+    """
+    seconds = epoch_seconds(timestamps)
+    day_angle = seconds * DAY_FREQUENCY
+    year_angle = seconds * YEAR_FREQUENCY
+    features = np.empty((*seconds.shape, 4), dtype=np.float32)
+    np.sin(day_angle, out=features[..., 0], casting="same_kind")
+    np.cos(day_angle, out=features[..., 1], casting="same_kind")
+    np.sin(year_angle, out=features[..., 2], casting="same_kind")
+    np.cos(year_angle, out=features[..., 3], casting="same_kind")
+    return features
+
+
+@functools.lru_cache(maxsize=16)
+def offset_tables(n_steps, time_step=GRID_TIME_STEP):
+    """
+    cos/sin của góc lệch k * time_step (k = 1..n_steps) cho chu kỳ ngày và năm, float64 (n_steps, 2).
+
+    Bảng chỉ phụ thuộc vào (n_steps, time_step) nên được tính một lần cho lưới 15 phút
+    và dùng lại cho mọi lần dự báo.
+    """
+    offsets = np.arange(1, n_steps + 1, dtype=np.float64) * time_step
+    angles = np.stack([offsets * DAY_FREQUENCY, offsets * YEAR_FREQUENCY], axis=-1)
+    cos, sin = np.cos(angles), np.sin(angles)
+    cos.flags.writeable = False
+    sin.flags.writeable = False
+    return cos, sin
+
+
+def horizon_features(base_timestamps, n_steps, time_step=GRID_TIME_STEP):
+    """
+    Đặc trưng thời gian của n_steps điểm base + k * time_step (k = 1..n_steps) cho mỗi base.
+
+    Dùng công thức cộng góc sin(a + b) = sin a cos b + cos a sin b với bảng offset_tables đã
+    cache: chỉ cần sin/cos của các base, không tính lại sin/cos cho từng bước.
+
+    Returns:
+        Mảng float32 (N, n_steps, 4).
+    """
+    base_seconds = np.atleast_1d(epoch_seconds(base_timestamps))
+    base_angles = np.stack([base_seconds * DAY_FREQUENCY, base_seconds * YEAR_FREQUENCY], axis=-1)
+    base_sin = np.sin(base_angles)[:, None, :]  # (N, 1, 2)
+    base_cos = np.cos(base_angles)[:, None, :]
+    offset_cos, offset_sin = offset_tables(n_steps, time_step)  # (n_steps, 2)
+
+    features = np.empty((len(base_seconds), n_steps, 4), dtype=np.float32)
+    features[..., 0::2] = base_sin * offset_cos + base_cos * offset_sin  # day_sin, year_sin
+    features[..., 1::2] = base_cos * offset_cos - base_sin * offset_sin  # day_cos, year_cos
+    return features
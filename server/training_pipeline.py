@@ -0,0 +1,471 @@
+"""
+Pipeline huấn luyện offline cho modelDNN / modelLSTM (và mô hình direct tùy chọn).
+
+Chạy từ thư mục server:
+    python training_pipeline.py                              # dnn + lstm
+    python training_pipeline.py --models dnn lstm direct --version 2025-06-01
+    python training_pipeline.py --models direct --horizon-steps 672   # 7 ngày trong một lần gọi
+    python training_pipeline.py --install                    # chép artifact vào server/
+
+Mỗi lần chạy ghi một thư mục artifacts/<version>/ gồm mô hình .keras, scaler .pkl và
+manifest.json (tham số, seed, checksum dữ liệu đầu vào và artifact, metric, phiên bản thư viện).
+
+Dữ liệu nhiệt độ:
+- Các CSV được đọc theo chunk; header Timestamp,Value / timestamp,value được chuẩn hóa,
+  timestamp dạng M/D/YYYY H:MM, dòng lỗi bị bỏ.
+- Mỗi chunk được cộng dồn vào các ô 15 phút (tổng, số mẫu), nên thứ tự dòng trong file
+  không quan trọng và không cần giữ toàn bộ dòng gốc trong bộ nhớ.
+- Chuỗi đều 15 phút được nội suy ở các khoảng trống ngắn; cửa sổ chạm khoảng trống dài bị bỏ.
+- Dữ liệu train chỉ gồm các dòng trước ô 15 phút đầu tiên của temperature_data_test.csv
+  (temperature_data_2025.csv chứa cả giai đoạn test); đoạn validation là phần cuối của dữ
+  liệu train nên cũng nằm hẳn trước giai đoạn test.
+- Cửa sổ huấn luyện được tạo trong tf.data từ chỉ số bắt đầu (tf.gather trên chuỗi đặc
+  trưng), không tạo sẵn mảng tất cả cửa sổ.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from scaler_utils import scaler_affine
+from time_features import sin_cos_features
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(SERVER_DIR, "..", "Dataset", "temperature")
+ARTIFACTS_DIR = os.path.join(SERVER_DIR, "artifacts")
+
+# Các dòng từ đầu giai đoạn test trở đi bị loại khỏi dữ liệu train (xem load_temperature_series(before=...))
+TEMPERATURE_TRAIN_FILES = ["temperature_data.csv", "temperature_data_train.csv", "temperature_data_2025.csv"]
+TEMPERATURE_TEST_FILE = "temperature_data_test.csv"
+POLLUTION_FILE = "updated_pollution_dataset.csv"
+# Thứ tự đặc trưng giống AirQualityClassifier.FEATURE_NAMES
+POLLUTION_COLUMNS = ["Temperature", "Humidity", "PM2.5", "PM10", "NO2", "SO2", "CO"]
+# Chỉ số lớp theo thứ tự chữ cái (LabelEncoder), khớp với ứng dụng Android: 0 GOOD, 1 HAZARDOUS, ...
+AIR_QUALITY_LABELS = ["Good", "Hazardous", "Moderate", "Poor"]
+
+TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M"
+TIME_STEP = 15 * 60
+WINDOW_SIZE = 6
+MAX_GAP_STEPS = 4  # Khoảng trống tối đa (số bước 15 phút) được nội suy khi resample
+CSV_CHUNK_SIZE = 20000
+MODEL_FILES = {
+    "dnn": ("modelDNN.keras", "scalerDNN.pkl"),
+    "lstm": ("modelLSTM.keras", "scalerLSTM.pkl"),
+    "direct": ("modelLSTM_direct.keras", "scalerLSTM.pkl"),
+}
+
+
+def read_temperature_chunks(path, chunksize=CSV_CHUNK_SIZE, before=None):
+    """
+    Đọc CSV nhiệt độ theo chunk; before (giây epoch) bỏ các dòng có timestamp >= before.
+
+    Yields:
+        (seconds, values): mảng int64 giây epoch và float64 nhiệt độ của các dòng hợp lệ trong chunk.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str):
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        timestamps = pd.to_datetime(chunk["timestamp"].str.strip(), format=TIMESTAMP_FORMAT, errors="coerce")
+        values = pd.to_numeric(chunk["value"], errors="coerce")
+        valid = timestamps.notna() & values.notna()
+        seconds = timestamps[valid].to_numpy().astype("datetime64[s]").astype(np.int64)
+        values = values[valid].to_numpy(dtype=np.float64)
+        if before is not None:
+            keep = seconds < before
+            seconds, values = seconds[keep], values[keep]
+        yield seconds, values
+
+
+def load_temperature_series(paths, time_step=TIME_STEP, max_gap_steps=MAX_GAP_STEPS, chunksize=CSV_CHUNK_SIZE,
+                            stats=None, before=None):
+    """
+    Gộp các CSV nhiệt độ thành một chuỗi đều time_step giây (trung bình các mẫu trong mỗi ô).
+
+    Parameters:
+        stats: Dict tùy chọn; nhận số dòng hợp lệ được dùng của từng file (stats[path]).
+        before: pd.Timestamp tùy chọn; chỉ dùng các dòng có timestamp nhỏ hơn.
+
+    Returns:
+        pd.Series float64 với DatetimeIndex đều; khoảng trống dài hơn max_gap_steps bước giữ NaN.
+    """
+    sums = {}
+    counts = {}
+    before_seconds = None if before is None else int(pd.Timestamp(before).value // 10**9)
+    for path in paths:
+        n_rows = 0
+        for seconds, values in read_temperature_chunks(path, chunksize, before_seconds):
+            buckets, inverse = np.unique(seconds // time_step, return_inverse=True)
+            chunk_sums = np.bincount(inverse, weights=values)
+            chunk_counts = np.bincount(inverse)
+            for bucket, total, count in zip(buckets.tolist(), chunk_sums.tolist(), chunk_counts.tolist()):
+                sums[bucket] = sums.get(bucket, 0.0) + total
+                counts[bucket] = counts.get(bucket, 0) + count
+            n_rows += len(values)
+        if stats is not None:
+            stats[path] = n_rows
+    if not sums:
+        raise ValueError(f"Không có dòng nhiệt độ hợp lệ trong {paths}")
+
+    buckets = np.fromiter(sums, dtype=np.int64, count=len(sums))
+    first, last = buckets.min(), buckets.max()
+    grid = np.full(last - first + 1, np.nan)
+    grid[buckets - first] = [sums[b] / counts[b] for b in buckets.tolist()]
+
+    index = pd.to_datetime((first + np.arange(len(grid), dtype=np.int64)) * time_step, unit="s")
+    series = pd.Series(grid, index=index)
+    return series.interpolate(limit=max_gap_steps, limit_area="inside")
+
+
+def temperature_features(series, scaler):
+    """
+    Đặc trưng đầu vào LSTM cho từng điểm của chuỗi: [nhiệt độ chuẩn hóa, day_sin, day_cos,
+    year_sin, year_cos] (time_features.sin_cos_features), float32 (T, 5).
+    """
+    scale, offset = scaler_affine(scaler)
+    values = series.to_numpy(dtype=np.float64)
+    features = np.empty((len(values), 5), dtype=np.float32)
+    features[:, 0] = values * scale[0] + offset[0]
+    features[:, 1:] = sin_cos_features(series.index.to_numpy())
+    return features
+
+
+def valid_window_starts(values, window_size, horizon_steps):
+    """Chỉ số bắt đầu của các đoạn window_size + horizon_steps điểm liên tiếp không chứa NaN"""
+    span = window_size + horizon_steps
+    missing = np.concatenate([[0], np.cumsum(np.isnan(values))])
+    starts = np.arange(len(values) - span + 1)
+    return starts[missing[starts + span] == missing[starts]]
+
+
+def window_dataset(features, values, starts, window_size, horizon_steps, batch_size, shuffle=False, seed=0):
+    """
+    tf.data.Dataset các batch (cửa sổ (B, window_size, 5), horizon_steps nhiệt độ tiếp theo (B, horizon_steps)).
+
+    Chỉ mảng đặc trưng (T, 5) và danh sách chỉ số bắt đầu được giữ; cửa sổ được cắt bằng
+    tf.gather khi đọc từng batch.
+    """
+    import tensorflow as tf
+
+    features = tf.constant(features, dtype=tf.float32)
+    targets = tf.constant(np.nan_to_num(values), dtype=tf.float32)
+    window_offsets = tf.range(window_size, dtype=tf.int64)
+    target_offsets = tf.range(window_size, window_size + horizon_steps, dtype=tf.int64)
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(starts, dtype=np.int64))
+    if shuffle:
+        dataset = dataset.shuffle(len(starts), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(
+        lambda s: (tf.gather(features, s[:, None] + window_offsets), tf.gather(targets, s[:, None] + target_offsets)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def make_direct_samples(series, scaler, window_size=WINDOW_SIZE, horizon_steps=96, stride=1):
+    """
+    Các cặp (cửa sổ đầu vào, horizon_steps nhiệt độ tiếp theo) dạng mảng, cho việc đánh giá
+    (benchmark.py forecast-eval); huấn luyện dùng window_dataset.
+
+    Returns:
+        (windows, targets, last_timestamps): windows float32 (N, window_size, 5) với nhiệt độ
+        đã chuẩn hóa như đầu vào của LSTMForecastEngine, targets float32 (N, horizon_steps)
+        nhiệt độ chưa chuẩn hóa, last_timestamps datetime64 (N,) của điểm cuối mỗi cửa sổ.
+    """
+    features = temperature_features(series, scaler)
+    values = series.to_numpy(dtype=np.float64)
+    starts = valid_window_starts(values, window_size, horizon_steps)[::stride]
+    windows = features[starts[:, None] + np.arange(window_size)]
+    targets = values[starts[:, None] + window_size + np.arange(horizon_steps)].astype(np.float32)
+    last_timestamps = series.index.to_numpy()[starts + window_size - 1]
+    return windows, targets, last_timestamps
+
+
+def build_dnn_model(n_features=len(POLLUTION_COLUMNS), n_classes=len(AIR_QUALITY_LABELS)):
+    """Cùng kiến trúc với modelDNN.keras: 3 khối Dense -> BatchNorm -> ReLU -> Dropout"""
+    import tensorflow as tf
+
+    layers = [tf.keras.Input(shape=(n_features,))]
+    for units in (256, 128, 64):
+        layers += [
+            tf.keras.layers.Dense(units),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.Activation("relu"),
+            tf.keras.layers.Dropout(0.3),
+        ]
+    layers.append(tf.keras.layers.Dense(n_classes, activation="softmax"))
+    return tf.keras.Sequential(layers)
+
+
+def build_lstm_model(window_size=WINDOW_SIZE, n_features=5):
+    """Cùng kiến trúc với modelLSTM.keras: LSTM(64) -> Dense(32) -> Dense(16) -> Dense(1)"""
+    import tensorflow as tf
+
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(window_size, n_features)),
+        tf.keras.layers.LSTM(64),
+        tf.keras.layers.Dense(32, activation="relu"),
+        tf.keras.layers.Dense(16, activation="relu"),
+        tf.keras.layers.Dense(1),
+    ])
+
+
+def build_direct_model(window_size=WINDOW_SIZE, n_features=5, horizon_steps=96, units=64):
+    """Mô hình direct: cùng khung LSTM -> Dense, lớp cuối trả về horizon_steps bước 15 phút"""
+    import tensorflow as tf
+
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(window_size, n_features)),
+        tf.keras.layers.LSTM(units),
+        tf.keras.layers.Dense(128, activation="relu"),
+        tf.keras.layers.Dense(horizon_steps),
+    ])
+
+
+def early_stopping():
+    import tensorflow as tf
+    return tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)
+
+
+def train_dnn(args, output_dir):
+    """Huấn luyện bộ phân loại chất lượng không khí; trả về (artifact, metric)"""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    df = pd.read_csv(os.path.join(DATASET_DIR, POLLUTION_FILE))
+    features = df[POLLUTION_COLUMNS].to_numpy(dtype=np.float32)
+    labels = df["Air Quality"].map({label: i for i, label in enumerate(AIR_QUALITY_LABELS)})
+    if labels.isna().any():
+        raise ValueError(f"Nhãn không hợp lệ trong {POLLUTION_FILE}: {sorted(df['Air Quality'][labels.isna()].unique())}")
+    labels = labels.to_numpy(dtype=np.int64)
+
+    x_train, x_val, y_train, y_val = train_test_split(
+        features, labels, test_size=args.validation_fraction, stratify=labels, random_state=args.seed)
+    scaler = StandardScaler().fit(x_train)
+
+    model = build_dnn_model()
+    model.compile(optimizer="adam", loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    model.fit(scaler.transform(x_train), y_train, validation_data=(scaler.transform(x_val), y_val),
+              epochs=args.epochs, batch_size=args.batch_size, callbacks=[early_stopping()], verbose=2)
+    loss, accuracy = model.evaluate(scaler.transform(x_val), y_val, verbose=0)
+
+    model_file, scaler_file = MODEL_FILES["dnn"]
+    save_artifacts(output_dir, model, model_file, scaler, scaler_file)
+    return [model_file, scaler_file], {"val_loss": float(loss), "val_accuracy": float(accuracy),
+                                       "n_train": len(x_train), "n_val": len(x_val)}
+
+
+def split_starts(starts, validation_fraction, span):
+    """Chia theo thời gian: đoạn cuối làm validation, bỏ các cửa sổ train chồng lên đoạn đó"""
+    n_val = int(len(starts) * validation_fraction)
+    val_starts = starts[len(starts) - n_val:]
+    train_starts = starts[:len(starts) - n_val]
+    if n_val:
+        train_starts = train_starts[train_starts + span <= val_starts[0]]
+    return train_starts, val_starts
+
+
+def train_forecaster(args, output_dir, name, build_model, horizon_steps, series, test_series, scaler):
+    """Huấn luyện mô hình dự báo nhiệt độ (lstm: 1 bước, direct: horizon_steps bước); trả về (artifact, metric)"""
+    features = temperature_features(series, scaler)
+    values = series.to_numpy(dtype=np.float64)
+    starts = valid_window_starts(values, WINDOW_SIZE, horizon_steps)
+    train_starts, val_starts = split_starts(starts, args.validation_fraction, WINDOW_SIZE + horizon_steps)
+    print(f"[INFO] {name}: {len(train_starts)} cửa sổ train, {len(val_starts)} cửa sổ validation")
+
+    def dataset(s, shuffle=False, feats=features, vals=values):
+        return window_dataset(feats, vals, s, WINDOW_SIZE, horizon_steps, args.batch_size, shuffle, args.seed)
+
+    model = build_model()
+    model.compile(optimizer="adam", loss="mse", metrics=["mae"])
+    model.fit(dataset(train_starts, shuffle=True), validation_data=dataset(val_starts),
+              epochs=args.epochs, callbacks=[early_stopping()], verbose=2)
+    metrics = {"n_train": len(train_starts), "n_val": len(val_starts)}
+    metrics["val_loss"], metrics["val_mae"] = (float(v) for v in model.evaluate(dataset(val_starts), verbose=0))
+
+    # Giai đoạn của temperature_data_test.csv đã bị loại khỏi series; metric một lần gọi mô hình trên toàn bộ cửa sổ hợp lệ
+    test_values = test_series.to_numpy(dtype=np.float64)
+    test_starts = valid_window_starts(test_values, WINDOW_SIZE, horizon_steps)
+    if len(test_starts):
+        test_features = temperature_features(test_series, scaler)
+        _, metrics["test_mae"] = (float(v) for v in model.evaluate(
+            dataset(test_starts, feats=test_features, vals=test_values), verbose=0))
+        metrics["n_test"] = len(test_starts)
+
+    model_file, scaler_file = MODEL_FILES[name]
+    save_artifacts(output_dir, model, model_file, scaler, scaler_file)
+    return [model_file, scaler_file], metrics
+
+
+def save_artifacts(output_dir, model, model_file, scaler, scaler_file):
+    model.save(os.path.join(output_dir, model_file))
+    with open(os.path.join(output_dir, scaler_file), "wb") as f:
+        pickle.dump(scaler, f)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_manifest(model_path):
+    """
+    manifest.json trong artifacts/ có artifact trùng checksum với model_path (kể cả bản đã
+    chép vào server/ bằng --install), hoặc None nếu mô hình không do pipeline này tạo ra.
+    """
+    if not os.path.isdir(ARTIFACTS_DIR):
+        return None
+    name, digest = os.path.basename(model_path), file_sha256(model_path)
+    for version in sorted(os.listdir(ARTIFACTS_DIR), reverse=True):
+        path = os.path.join(ARTIFACTS_DIR, version, "manifest.json")
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("artifacts", {}).get(name, {}).get("sha256") == digest:
+            return manifest
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SERVER_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def library_versions():
+    import sklearn
+    import tensorflow as tf
+    return {"tensorflow": tf.__version__, "numpy": np.__version__, "pandas": pd.__version__,
+            "scikit-learn": sklearn.__version__}
+
+
+def write_manifest(output_dir, args, data_files, series_info, artifacts, metrics):
+    manifest = {
+        "version": args.version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "seed": args.seed,
+        "parameters": {
+            "models": args.models,
+            "epochs": args.epochs,
+            "batch_size": args.batch_size,
+            "validation_fraction": args.validation_fraction,
+            "horizon_steps": args.horizon_steps,
+            "window_size": WINDOW_SIZE,
+            "time_step": TIME_STEP,
+            "max_gap_steps": MAX_GAP_STEPS,
+        },
+        "data": {
+            os.path.basename(path): {"sha256": file_sha256(path), "rows": rows}
+            for path, rows in data_files.items()
+        },
+        "temperature_series": series_info,
+        "artifacts": {
+            name: {"sha256": file_sha256(os.path.join(output_dir, name)),
+                   "bytes": os.path.getsize(os.path.join(output_dir, name))}
+            for name in sorted(set(artifacts))
+        },
+        "metrics": metrics,
+        "libraries": library_versions(),
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Huấn luyện modelDNN / modelLSTM và ghi artifact có phiên bản")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_FILES), default=["dnn", "lstm"])
+    parser.add_argument("--version", default=datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--validation-fraction", type=float, default=0.1)
+    parser.add_argument("--horizon-steps", type=int, default=96, help="Số bước mỗi lần gọi của mô hình direct")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--install", action="store_true", help="Chép mô hình và scaler vào thư mục server")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from sklearn.preprocessing import StandardScaler
+
+    output_dir = os.path.join(ARTIFACTS_DIR, args.version)
+    if os.path.exists(output_dir):
+        parser.error(f"{output_dir} đã tồn tại, chọn --version khác")
+    os.makedirs(output_dir)
+    tf.keras.utils.set_random_seed(args.seed)
+
+    data_files = {}
+    artifacts = []
+    metrics = {}
+    series_info = None
+
+    if "dnn" in args.models:
+        pollution_path = os.path.join(DATASET_DIR, POLLUTION_FILE)
+        files, metrics["dnn"] = train_dnn(args, output_dir)
+        artifacts += files
+        with open(pollution_path, encoding="utf-8") as f:
+            data_files[pollution_path] = sum(1 for _ in f) - 1
+
+    forecasters = [name for name in args.models if name in ("lstm", "direct")]
+    if forecasters:
+        train_paths = [os.path.join(DATASET_DIR, name) for name in TEMPERATURE_TRAIN_FILES]
+        test_path = os.path.join(DATASET_DIR, TEMPERATURE_TEST_FILE)
+        test_series = load_temperature_series([test_path], stats=data_files)
+        # Ô 15 phút đầu tiên của giai đoạn test: mọi dòng train từ đó trở đi bị bỏ
+        test_start = test_series.index[0]
+        series = load_temperature_series(train_paths, stats=data_files, before=test_start)
+        series_info = {
+            "start": str(series.index[0]),
+            "end": str(series.index[-1]),
+            "points": len(series),
+            "missing_points": int(series.isna().sum()),
+            "test_start": str(test_start),
+        }
+        print(f"[INFO] Chuỗi nhiệt độ {series_info['start']} -> {series_info['end']}: "
+              f"{series_info['points']} điểm 15 phút, {series_info['missing_points']} điểm thiếu "
+              f"(giai đoạn test từ {series_info['test_start']} không dùng để train)")
+
+        if "lstm" in forecasters:
+            # Scaler nhiệt độ chỉ fit trên phần train của chuỗi (trước đoạn validation)
+            values = series.to_numpy(dtype=np.float64)
+            train_values = values[:int(len(values) * (1 - args.validation_fraction))]
+            scaler = StandardScaler().fit(train_values[~np.isnan(train_values)].reshape(-1, 1))
+        else:
+            # Chỉ huấn luyện direct: giữ scalerLSTM.pkl hiện tại, dùng chung với modelLSTM.keras và LSTMWindowStore
+            with open(os.path.join(SERVER_DIR, MODEL_FILES["lstm"][1]), "rb") as f:
+                scaler = pickle.load(f)
+
+        builders = {
+            "lstm": (build_lstm_model, 1),
+            "direct": (lambda: build_direct_model(WINDOW_SIZE, 5, args.horizon_steps), args.horizon_steps),
+        }
+        for name in forecasters:
+            build_model, horizon_steps = builders[name]
+            files, metrics[name] = train_forecaster(
+                args, output_dir, name, build_model, horizon_steps, series, test_series, scaler)
+            artifacts += files
+
+    manifest = write_manifest(output_dir, args, data_files, series_info, artifacts, metrics)
+    print(f"[INFO] Đã ghi {len(manifest['artifacts'])} artifact và manifest.json vào {output_dir}")
+    print(json.dumps(metrics, indent=2))
+
+    if args.install:
+        for name in manifest["artifacts"]:
+            shutil.copy2(os.path.join(output_dir, name), os.path.join(SERVER_DIR, name))
+        print(f"[INFO] Đã chép {', '.join(manifest['artifacts'])} vào {SERVER_DIR}")
+
+
+if __name__ == "__main__":
+    main()